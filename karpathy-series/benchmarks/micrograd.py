@@ -0,0 +1,229 @@
+"""
+Benchmarks of micrograd on stacks of layers of increasing width and depth: graph
+construction time and memory per node, and forward and backward throughput of the
+graph and tape valuations, with gradients checked against torch autograd.
+
+    python -m benchmarks.micrograd --output results.json
+    python -m benchmarks.micrograd --baseline results.json --threshold 0.2
+
+Results are written as JSON, and compared against a baseline when given, failing
+when any timing is slower than the baseline by more than the threshold, and by more
+than the floor in absolute terms, as the timings of small cases are mostly noise.
+"""
+
+import gc
+import json
+import platform
+import random
+import sys
+import tracemalloc
+from argparse import ArgumentParser
+from dataclasses import asdict, dataclass
+from time import perf_counter
+from typing import Callable, Optional, Sequence, Tuple
+
+import torch
+
+from karpathy_series.micrograd.assignment import Assignment
+from karpathy_series.micrograd.calculation import GraphValuation
+from karpathy_series.micrograd.perceptron import Layer
+from karpathy_series.micrograd.tape import Tape, TapeValuation
+from karpathy_series.micrograd.value import Value, ValueGraph
+
+# The timings compared against a baseline
+TIMINGS = ("construction", "graph_forward", "graph_backward", "tape_forward", "tape_backward")
+
+
+@dataclass
+class Result:
+    width: int
+    depth: int
+    nodes: int
+    bytes_per_node: float
+    # Best times over the repeats, in seconds
+    construction: float
+    graph_forward: float
+    graph_backward: float
+    tape_forward: float
+    tape_backward: float
+    # The largest difference from the gradients of torch autograd
+    torch_error: float
+
+    def throughput(self, timing: str) -> float:
+        seconds: float = getattr(self, timing)
+        return self.nodes / seconds if seconds > 0 else float("inf")
+
+
+# A stack of `depth` layers of `width` neurons over `width` inputs
+def build(width: int, depth: int) -> Tuple[ValueGraph, Tuple[Value, ...], list[Layer]]:
+    G = ValueGraph()
+    inputs = tuple(G(f"x{k}") for k in range(width))
+    layers: list[Layer] = []
+    outputs = inputs
+    for d in range(depth):
+        layers.append(Layer(f"l{d}", G, width, outputs))
+        outputs = layers[-1].outputs
+    return G, inputs, layers
+
+
+def best(repeat: int, run: Callable[[], float]) -> float:
+    return min(run() for _ in range(repeat))
+
+
+def timed(action: Callable[[], object]) -> float:
+    start = perf_counter()
+    action()
+    return perf_counter() - start
+
+
+# The same stack in torch, with the weights of the assignment, where the sum of the outputs
+# is differentiated since every output is a root of the graph with gradient 1
+def torch_error(inputs: Tuple[Value, ...], layers: Sequence[Layer], a: Assignment, gv: GraphValuation) -> float:
+    def parameter(values: Sequence[Sequence[float]]) -> torch.Tensor:
+        return torch.tensor(values, dtype=torch.float64, requires_grad=True)
+
+    x = parameter([[a.assigned[v.node.ident] for v in inputs]])
+    h = x
+    parameters: list[Tuple[torch.Tensor, Tuple[Value, ...]]] = []
+    for layer in layers:
+        weights = [[a.assigned[w.node.ident] for w in neuron.weights] for neuron in layer.neurons]
+        biases = [[a.assigned[neuron.bias.node.ident] for neuron in layer.neurons]]
+        w, b = parameter(weights), parameter(biases)
+        parameters.append((w, tuple(p for neuron in layer.neurons for p in neuron.weights)))
+        parameters.append((b, tuple(neuron.bias for neuron in layer.neurons)))
+        h = torch.tanh(h @ w.T + b)
+    h.sum().backward()  # type: ignore[no-untyped-call]
+
+    error = 0.0
+    for tensor, values in [(x, inputs), *parameters]:
+        assert tensor.grad is not None
+        for g, v in zip(tensor.grad.flatten().tolist(), values):
+            error = max(error, abs(g - gv.assigned[v.node.ident].gradient))
+    return error
+
+
+def measure(width: int, depth: int, repeat: int, seed: int = 0) -> Result:
+    # Memory is measured on a build of its own, as tracing slows construction down
+    gc.collect()
+    tracemalloc.start()
+    G, inputs, layers = build(width, depth)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    construction = best(repeat, lambda: timed(lambda: build(width, depth)))
+    nodes = G.graph.size()
+
+    rng = random.Random(seed)
+    a = Assignment.merge(G.graph, (layer.assign_from(lambda: rng.uniform(-1, 1)) for layer in layers))
+    a = a | Assignment.create(G, {x: rng.uniform(-1, 1) for x in inputs})
+
+    def graph_forward() -> float:
+        gv = GraphValuation.initialize(a)
+        return timed(gv.forward)
+
+    def graph_backward() -> float:
+        gv = GraphValuation.initialize(a)
+        gv.forward()
+        return timed(gv.backward)
+
+    Tape.compile(G.graph)
+
+    def tape_forward() -> float:
+        tv = TapeValuation.initialize(a)
+        return timed(tv.forward)
+
+    def tape_backward() -> float:
+        tv = TapeValuation.initialize(a)
+        tv.forward()
+        return timed(tv.backward)
+
+    return Result(
+        width=width,
+        depth=depth,
+        nodes=nodes,
+        bytes_per_node=allocated / nodes,
+        construction=construction,
+        graph_forward=best(repeat, graph_forward),
+        graph_backward=best(repeat, graph_backward),
+        tape_forward=best(repeat, tape_forward),
+        tape_backward=best(repeat, tape_backward),
+        torch_error=torch_error(inputs, layers, a, GraphValuation.run(a)),
+    )
+
+
+# The timings slower than the baseline by more than the threshold and by more than the floor
+# in seconds, for the cases in both
+def regressions(
+    baseline: Sequence[Result], results: Sequence[Result], threshold: float, floor: float = 1e-3
+) -> list[str]:
+    before = {(r.width, r.depth): r for r in baseline}
+    found: list[str] = []
+    for result in results:
+        base = before.get((result.width, result.depth))
+        if base is None:
+            continue
+        for timing in TIMINGS:
+            old, new = getattr(base, timing), getattr(result, timing)
+            if new > old * (1 + threshold) and new - old > floor:
+                found.append(
+                    f"{timing} at width {result.width}, depth {result.depth}: "
+                    f"{1e3 * old:.3f} ms -> {1e3 * new:.3f} ms ({new / old - 1:+.0%})"
+                )
+    return found
+
+
+def read(path: str) -> list[Result]:
+    with open(path) as stream:
+        return [Result(**r) for r in json.load(stream)["results"]]
+
+
+def write(path: str, results: Sequence[Result]) -> None:
+    environment = {"python": platform.python_version(), "machine": platform.machine(), "torch": torch.__version__}
+    with open(path, "w") as stream:
+        json.dump({"environment": environment, "results": [asdict(r) for r in results]}, stream, indent=2)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = ArgumentParser(
+        prog="python -m benchmarks.micrograd", description="Benchmark micrograd on stacks of layers"
+    )
+    parser.add_argument("--widths", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=1e-9, help="largest accepted difference from torch")
+    parser.add_argument("--output", help="file to write the results to as JSON")
+    parser.add_argument("--baseline", help="results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="accepted slowdown against the baseline")
+    parser.add_argument("--floor", type=float, default=1e-3, help="accepted slowdown in seconds regardless")
+    args = parser.parse_args(argv)
+
+    results: list[Result] = []
+    print(
+        f"{'width':>6} {'depth':>6} {'nodes':>8} {'B/node':>8} {'build ms':>10} "
+        + " ".join(f"{t:>16}" for t in TIMINGS[1:])
+    )
+    for width in args.widths:
+        for depth in args.depths:
+            result = measure(width, depth, args.repeat)
+            results.append(result)
+            rates = " ".join(f"{result.throughput(t) / 1e3:>11.1f} kn/s" for t in TIMINGS[1:])
+            print(
+                f"{width:>6} {depth:>6} {result.nodes:>8} {result.bytes_per_node:>8.0f} "
+                f"{1e3 * result.construction:>10.3f} {rates}"
+            )
+
+    status = 0
+    inaccurate = [r for r in results if r.torch_error > args.tolerance]
+    for r in inaccurate:
+        print(f"gradients differ from torch by {r.torch_error:.3g} at width {r.width}, depth {r.depth}")
+        status = 1
+    if args.output is not None:
+        write(args.output, results)
+    if args.baseline is not None:
+        for regression in regressions(read(args.baseline), results, args.threshold, args.floor):
+            print(f"regression: {regression}")
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
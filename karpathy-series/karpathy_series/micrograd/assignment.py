@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Iterable, Mapping
 
 from typing_extensions import Self
 
@@ -6,17 +7,30 @@ from .value import Value, ValueDag, ValueGraph
 from .value_type import Variable
 
 
+# The values assigned to the variables of a graph by identity. Any mapping will do, so
+# values can be handed over without copying, as from a ParameterStore.
 @dataclass(frozen=True)
 class Assignment:
     graph: ValueDag
-    assigned: dict[int, float]
+    assigned: Mapping[int, float]
 
     def is_complete(self) -> bool:
-        return frozenset(self.assigned.keys()) == frozenset(n.ident for n in self.graph.entries())
+        # Entries which are not variables are constants
+        variables = (n.ident for n in self.graph.entries() if isinstance(n.data, Variable))
+        return frozenset(self.assigned.keys()) == frozenset(variables)
 
     def __or__(self: Self, other: Self) -> Self:
         assert self.graph == other.graph
-        return self.__class__(self.graph, self.assigned | other.assigned)
+        return self.__class__(self.graph, {**self.assigned, **other.assigned})
+
+    # Merges many assignments at once, copying each of them only once
+    @classmethod
+    def merge(cls, graph: ValueDag, assignments: Iterable["Assignment"]) -> Self:
+        assigned: dict[int, float] = {}
+        for assignment in assignments:
+            assert assignment.graph == graph
+            assigned.update(assignment.assigned)
+        return cls(graph, assigned)
 
     @classmethod
     def create(cls, graph_like: ValueDag | ValueGraph, assign: dict[Value, float]) -> Self:
@@ -0,0 +1,123 @@
+from dataclasses import dataclass
+from typing import Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.typing import ArrayLike
+from typing_extensions import Self
+
+from .assignment import Assignment
+from .valuation import ArrayValuation, FloatArray
+from .value import Value, ValueDag, ValueGraph
+from .value_type import Operator, Variable
+
+
+# Assigns each variable either an array with one entry per sample of the batch along
+# a leading dimension, or one of the shape of the variable shared by every sample
+# (e.g. the parameters of a model), which for scalar variables is a scalar
+@dataclass(frozen=True)
+class BatchAssignment:
+    graph: ValueDag
+    assigned: dict[int, FloatArray]
+
+    def shape(self, ident: int) -> Tuple[int, ...]:
+        variable = self.graph[ident].data
+        assert isinstance(variable, Variable)
+        return variable.shape
+
+    # Whether the variable is assigned one value per sample, along a leading dimension
+    def is_batched(self, ident: int) -> bool:
+        value = self.assigned.get(ident)
+        return value is not None and value.ndim > len(self.shape(ident))
+
+    def size(self) -> int:
+        sizes = frozenset(len(v) for n, v in self.assigned.items() if self.is_batched(n))
+        assert len(sizes) <= 1
+        return next(iter(sizes), 1)
+
+    def is_complete(self) -> bool:
+        variables = (n.ident for n in self.graph.entries() if isinstance(n.data, Variable))
+        return frozenset(self.assigned.keys()) == frozenset(variables)
+
+    def __or__(self: Self, other: Self) -> Self:
+        assert self.graph == other.graph
+        return self.__class__(self.graph, self.assigned | other.assigned)
+
+    @classmethod
+    def create(cls, graph_like: ValueDag | ValueGraph, assign: Mapping[Value, ArrayLike]) -> Self:
+        graph = graph_like.graph if isinstance(graph_like, ValueGraph) else graph_like
+        assigned: dict[int, FloatArray] = {}
+        for value_node, value in assign.items():
+            assert value_node.graph == graph
+            variable = value_node.node.data
+            assert isinstance(variable, Variable)
+            array = np.asarray(value, dtype=np.float64)
+            assert array.shape[array.ndim - len(variable.shape) :] == variable.shape
+            assert array.ndim <= len(variable.shape) + 1
+            assigned[value_node.node.ident] = array
+        return cls(graph, assigned)
+
+    @classmethod
+    def stack(cls, samples: Sequence[Assignment], shared: Optional[Assignment] = None) -> Self:
+        assert len(samples) != 0
+        graph = samples[0].graph
+        assert all(sample.graph == graph for sample in samples)
+        assigned = {
+            ident: np.array([sample.assigned[ident] for sample in samples], dtype=np.float64)
+            for ident in samples[0].assigned
+        }
+        if shared is not None:
+            assert shared.graph == graph
+            assigned |= {ident: np.asarray(value, dtype=np.float64) for ident, value in shared.assigned.items()}
+        return cls(graph, assigned)
+
+
+# Evaluates a whole batch in a single walk of the graph, where the values of each
+# node are arrays over the samples. Roots are seeded so that the gradients are
+# those of the sum of the roots over the batch, hence shared variables collect
+# the reduction of their per-sample gradients.
+@dataclass(frozen=True)
+class BatchValuation:
+    assignment: BatchAssignment
+    assigned: dict[int, ArrayValuation]
+
+    def forward(self) -> None:
+        for node in self.assignment.graph.topological():
+            model = node.data
+            if isinstance(model, Operator):
+                self.assigned[node.ident] = model.forward_array(tuple(self.assigned[p.ident] for p in node.pred))
+
+    def backward(self) -> None:
+        graph = self.assignment.graph
+        for node in self.assignment.graph.topological(reverse=True):
+            model = node.data
+            if graph.is_root(node):
+                root = self.assigned[node.ident]
+                root.gradient = np.ones_like(root.value)
+            if isinstance(model, Operator):
+                model.backward_array(
+                    self.assigned[node.ident],
+                    tuple(self.assigned[p.ident] for p in node.pred),
+                )
+
+    def value(self, value: Value) -> FloatArray:
+        return self.assigned[value.node.ident].value
+
+    def gradient(self, value: Value) -> FloatArray:
+        return self.assigned[value.node.ident].gradient
+
+    @classmethod
+    def initialize(cls, assignment: BatchAssignment) -> Self:
+        return cls(
+            assignment,
+            {
+                node.ident: ArrayValuation.of(assignment.assigned.get(node.ident, 0), assignment.is_batched(node.ident))
+                for node in assignment.graph.nodes()
+            },
+        )
+
+    @classmethod
+    def run(cls, assignment: BatchAssignment) -> Self:
+        bv = cls.initialize(assignment)
+        bv.forward()
+        bv.backward()
+        return bv
@@ -0,0 +1,252 @@
+from array import array
+from dataclasses import dataclass, field
+from math import exp, prod, tanh
+from typing import FrozenSet, Sequence, Tuple
+from weakref import WeakKeyDictionary
+
+from typing_extensions import Self
+
+from .assignment import Assignment
+from .tape import OpCode, Tape
+from .value import ValueDag
+
+
+def _evaluate(code: int, param: float, operands: Sequence[float]) -> float:
+    match code:
+        case OpCode.SUM:
+            return param + sum(operands)
+        case OpCode.PROD:
+            return param * prod(operands)
+        case OpCode.POW:
+            return float(operands[0] ** param)
+        case OpCode.TANH:
+            return tanh(operands[0])
+        case OpCode.EXP:
+            return exp(operands[0])
+        case OpCode.AFFINE:
+            start = len(operands) % 2
+            return (
+                param + sum(operands[:start]) + sum(a * b for a, b in zip(operands[start::2], operands[start + 1 :: 2]))
+            )
+    raise ValueError(f"Cannot evaluate op code {code}")
+
+
+def _derivatives(code: int, param: float, result: float, operands: Sequence[float]) -> Sequence[float]:
+    match code:
+        case OpCode.SUM:
+            return [1.0] * len(operands)
+        case OpCode.PROD:
+            return [param * prod(operands[:k]) * prod(operands[k + 1 :]) for k in range(len(operands))]
+        case OpCode.POW:
+            return [0.0 if param == 0 else param * operands[0] ** (param - 1)]
+        case OpCode.TANH:
+            return [1 - result * result]
+        case OpCode.EXP:
+            return [result]
+        case OpCode.AFFINE:
+            start = len(operands) % 2
+            derivatives = [1.0] * len(operands)
+            for k in range(start, len(operands), 2):
+                derivatives[k], derivatives[k + 1] = operands[k + 1], operands[k]
+            return derivatives
+    raise ValueError(f"Cannot differentiate op code {code}")
+
+
+# The kept values a value is recomputed from, found by walking back through the values
+# recomputed along with it, which are at most as many as its cost
+def _sources(tape: Tape, cost: Sequence[int], slot: int) -> set[int]:
+    sources: set[int] = set()
+    pending = [slot]
+    while pending:
+        current = pending.pop()
+        for operand in tape.operands[tape.offsets[current] : tape.offsets[current + 1]]:
+            if cost[operand] == 0:
+                sources.add(operand)
+            else:
+                pending.append(operand)
+    return sources
+
+
+def _reads_result(code: int) -> bool:
+    return code in (OpCode.PROD, OpCode.TANH, OpCode.EXP)
+
+
+def _reads_operand(code: int, param: float, position: int, arity: int) -> bool:
+    match code:
+        case OpCode.PROD:
+            return True
+        case OpCode.POW:
+            return param != 0
+        case OpCode.AFFINE:
+            return position >= arity % 2
+    return False
+
+
+# When each value of a tape can be released. Values only read by the forward pass are
+# released after their last consumer has been evaluated. Values read by the backward
+# pass are kept until the last backward step reading them, which is the lowest such
+# slot since the backward pass runs in reverse. When recomputing, a value that can be
+# recomputed by evaluating at most `recompute` nodes from other kept values is released
+# as for the forward pass instead, and the values it is recomputed from are kept for
+# at least as long in its place.
+@dataclass(frozen=True)
+class MemoryPlan:
+    tape: Tape
+    # The slots whose values are released after the forward or backward step of a slot
+    forward_release: dict[int, Tuple[int, ...]]
+    backward_release: dict[int, Tuple[int, ...]]
+    recomputed: FrozenSet[int]
+
+    @classmethod
+    def of(cls, tape: Tape, backward: bool = True, recompute: int = 0) -> Self:
+        codes, params, offsets, operands = tape.codes, tape.params, tape.offsets, tape.operands
+        successors = tape.successors
+        roots = frozenset(tape.roots)
+
+        # The backward step releasing each value, or -1 if none reads it. Slots are visited in
+        # order, so the first step found reading a value is the lowest, the last to run backward
+        release = array("q", [-1]) * len(tape)
+        if backward:
+            for slot in range(len(tape)):
+                code, start, end = codes[slot], offsets[slot], offsets[slot + 1]
+                if _reads_result(code):
+                    release[slot] = slot
+                for k in range(start, end):
+                    if release[operands[k]] < 0 and _reads_operand(code, params[slot], k - start, end - start):
+                        release[operands[k]] = slot
+
+        # The cost of recomputing each value from the kept values, as the nodes to evaluate;
+        # kept values cost nothing, while variables that are not kept and anything costing
+        # more than allowed are never recomputed, with a cost of -1
+        cost = array("q", [-1]) * len(tape)
+        recomputed: set[int] = set()
+        for slot in range(len(tape)):
+            start, end = offsets[slot], offsets[slot + 1]
+            kept = release[slot] >= 0 or slot in roots
+            if codes[slot] == OpCode.VARIABLE or any(cost[operands[k]] < 0 for k in range(start, end)):
+                if kept:
+                    cost[slot] = 0
+                continue
+            total = 1 + sum(cost[operands[k]] for k in range(start, end))
+            if kept and (slot in roots or total > recompute):
+                cost[slot] = 0
+            elif total <= recompute:
+                cost[slot] = total
+                if kept:
+                    recomputed.add(slot)
+                    for source in _sources(tape, cost, slot):
+                        release[source] = min(release[source], release[slot])
+
+        forward_release: dict[int, list[int]] = {}
+        backward_release: dict[int, list[int]] = {}
+        for slot in range(len(tape)):
+            if slot in roots:
+                continue
+            if release[slot] >= 0:
+                backward_release.setdefault(release[slot], []).append(slot)
+            if release[slot] < 0 or slot in recomputed:
+                edges = successors.edges[successors.offsets[slot] : successors.offsets[slot + 1]]
+                last = max(successors.consumers[e] for e in edges)
+                forward_release.setdefault(last, []).append(slot)
+
+        return cls(
+            tape,
+            {s: tuple(r) for s, r in forward_release.items()},
+            {s: tuple(r) for s, r in backward_release.items()},
+            frozenset(recomputed),
+        )
+
+    @classmethod
+    def compile(cls, graph: ValueDag, backward: bool = True, recompute: int = 0) -> "MemoryPlan":
+        tape = Tape.compile(graph)
+        plans = _plans.get(graph)
+        if plans is None or plans[0] is not tape:
+            plans = _plans[graph] = (tape, {})
+        plan = plans[1].get((backward, recompute))
+        if plan is None:
+            plan = plans[1][(backward, recompute)] = cls.of(tape, backward, recompute)
+        return plan
+
+
+_plans: WeakKeyDictionary[ValueDag, Tuple[Tape, dict[Tuple[bool, int], MemoryPlan]]] = WeakKeyDictionary()
+
+
+# Evaluates a tape keeping only the values and gradients still needed, as given by a
+# memory plan. Afterwards only the values of the roots and the gradients of the
+# variables remain, and `peak` is the most values and gradients held at once.
+@dataclass
+class BoundedValuation:
+    plan: MemoryPlan
+    values: dict[int, float] = field(default_factory=dict)
+    gradients: dict[int, float] = field(default_factory=dict)
+    peak: int = 0
+
+    def _track(self) -> None:
+        self.peak = max(self.peak, len(self.values) + len(self.gradients))
+
+    def _operand_values(self, slot: int) -> list[float]:
+        tape = self.plan.tape
+        return [self._value(p) for p in tape.operands[tape.offsets[slot] : tape.offsets[slot + 1]]]
+
+    # Values missing in the backward pass are recomputed from their operands, and only held
+    # on to when the plan releases them
+    def _value(self, slot: int) -> float:
+        value = self.values.get(slot)
+        if value is None:
+            value = _evaluate(self.plan.tape.codes[slot], self.plan.tape.params[slot], self._operand_values(slot))
+            if slot in self.plan.recomputed:
+                self.values[slot] = value
+                self._track()
+        return value
+
+    def forward(self, assignment: Assignment) -> None:
+        tape = self.plan.tape
+        assigned = assignment.assigned
+        for slot in range(len(tape)):
+            code = tape.codes[slot]
+            if code == OpCode.VARIABLE:
+                self.values[slot] = assigned.get(tape.idents[slot], 0)
+            else:
+                self.values[slot] = _evaluate(code, tape.params[slot], self._operand_values(slot))
+            self._track()
+            for released in self.plan.forward_release.get(slot, ()):
+                del self.values[released]
+
+    def backward(self) -> None:
+        tape = self.plan.tape
+        for root in tape.roots:
+            self.gradients[root] = 1
+        for slot in range(len(tape) - 1, -1, -1):
+            code = tape.codes[slot]
+            if code != OpCode.VARIABLE:
+                head = self.gradients.pop(slot, 0)
+                if head != 0:
+                    result = self._value(slot) if _reads_result(code) else 0
+                    start, end = tape.offsets[slot], tape.offsets[slot + 1]
+                    operands = [
+                        self._value(tape.operands[k])
+                        if _reads_operand(code, tape.params[slot], k - start, end - start)
+                        else 0
+                        for k in range(start, end)
+                    ]
+                    derivatives = _derivatives(code, tape.params[slot], result, operands)
+                    for k, derivative in zip(range(start, end), derivatives):
+                        operand = tape.operands[k]
+                        self.gradients[operand] = self.gradients.get(operand, 0) + head * derivative
+                    self._track()
+            for released in self.plan.backward_release.get(slot, ()):
+                self.values.pop(released, None)
+
+    def value(self, ident: int) -> float:
+        return self.values[self.plan.tape.slot(ident)]
+
+    def gradient(self, ident: int) -> float:
+        return self.gradients.get(self.plan.tape.slot(ident), 0)
+
+    @classmethod
+    def run(cls, assignment: Assignment, backward: bool = True, recompute: int = 0) -> Self:
+        bv = cls(MemoryPlan.compile(assignment.graph, backward, recompute))
+        bv.forward(assignment)
+        if backward:
+            bv.backward()
+        return bv
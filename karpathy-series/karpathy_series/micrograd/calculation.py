@@ -1,28 +1,84 @@
 from dataclasses import dataclass
+from time import perf_counter
+from typing import FrozenSet, Iterable, Optional, Tuple, TypeAlias
+from weakref import WeakKeyDictionary
 
 from typing_extensions import Self
 
 from .assignment import Assignment
+from .graph import Revision
+from .profiling import Phase, Profile
 from .valuation import Valuation
+from .value import Value, ValueDag, ValueNode
 from .value_type import Operator
 
+PlanKey: TypeAlias = Tuple[FrozenSet[int], Optional[FrozenSet[int]]]
 
+
+# The nodes needed to evaluate some roots and differentiate them with respect to
+# some variables: the forward pass covers the ancestors of the roots, while the
+# backward pass only covers those that also descend from the variables.
+@dataclass(frozen=True)
+class Plan:
+    roots: Tuple[int, ...]
+    forward: Tuple[int, ...]
+    backward: Tuple[int, ...]
+
+    @classmethod
+    def of(cls, graph: ValueDag, roots: FrozenSet[int], wrt: Optional[FrozenSet[int]]) -> Self:
+        ancestors = graph.ancestors(graph[n] for n in roots)
+        descendants = ancestors if wrt is None else graph.descendants(graph[n] for n in wrt)
+        forward = tuple(n.ident for n in graph.topological() if n.ident in ancestors)
+        return cls(tuple(sorted(roots)), forward, tuple(n for n in forward if n in descendants))
+
+    @classmethod
+    def compile(cls, graph: ValueDag, roots: FrozenSet[int], wrt: Optional[FrozenSet[int]]) -> "Plan":
+        cached = _plans.get(graph)
+        if cached is None or cached[0] != graph.revision:
+            cached = _plans[graph] = (graph.revision, {})
+        plans = cached[1]
+        plan = plans.get((roots, wrt))
+        if plan is None:
+            plan = plans[(roots, wrt)] = cls.of(graph, roots, wrt)
+        return plan
+
+
+# Plans are cached per graph until the graph changes
+_plans: WeakKeyDictionary[ValueDag, Tuple[Revision, dict[PlanKey, Plan]]] = WeakKeyDictionary()
+
+
+# With a profile, the time spent on each node is recorded into it, which is only
+# checked once per pass so that evaluation without one is unaffected
 @dataclass(frozen=True)
 class GraphValuation:
     assignment: Assignment
     assigned: dict[int, Valuation]
+    profile: Optional[Profile] = None
 
-    def forward(self) -> None:
-        for node in self.assignment.graph.topological():
+    def forward(self, plan: Optional[Plan] = None) -> None:
+        graph = self.assignment.graph
+        nodes = graph.topological() if plan is None else (graph[n] for n in plan.forward)
+        if self.profile is not None:
+            self._profiled("forward", nodes, self.profile, False)
+            return
+        for node in nodes:
             model = node.data
             if isinstance(model, Operator):
                 self.assigned[node.ident] = model.forward(tuple(self.assigned[p.ident] for p in node.pred))
 
-    def backward(self) -> None:
+    # With a plan, only the gradients of the nodes in its backward pass are complete
+    def backward(self, plan: Optional[Plan] = None) -> None:
         graph = self.assignment.graph
-        for node in self.assignment.graph.topological(reverse=True):
+        if plan is not None:
+            for root in plan.roots:
+                self.assigned[root].gradient = 1
+        nodes = graph.topological(reverse=True) if plan is None else (graph[n] for n in reversed(plan.backward))
+        if self.profile is not None:
+            self._profiled("backward", nodes, self.profile, plan is None)
+            return
+        for node in nodes:
             model = node.data
-            if graph.is_root(node):
+            if plan is None and graph.is_root(node):
                 self.assigned[node.ident].gradient = 1
             if isinstance(model, Operator):
                 model.backward(
@@ -30,16 +86,49 @@ class GraphValuation:
                     tuple(self.assigned[p.ident] for p in node.pred),
                 )
 
+    def _profiled(self, phase: Phase, nodes: Iterable[ValueNode], profile: Profile, seed_roots: bool) -> None:
+        graph = self.assignment.graph
+        for node in nodes:
+            model = node.data
+            start = perf_counter()
+            if phase == "forward":
+                if isinstance(model, Operator):
+                    self.assigned[node.ident] = model.forward(tuple(self.assigned[p.ident] for p in node.pred))
+            else:
+                if seed_roots and graph.is_root(node):
+                    self.assigned[node.ident].gradient = 1
+                if isinstance(model, Operator):
+                    model.backward(self.assigned[node.ident], tuple(self.assigned[p.ident] for p in node.pred))
+            profile.record(phase, node, perf_counter() - start)
+
     @classmethod
-    def initialize(cls, assignment: Assignment) -> Self:
-        return cls(
-            assignment,
-            {node.ident: Valuation(assignment.assigned.get(node.ident, 0)) for node in assignment.graph.nodes()},
-        )
+    def initialize(cls, assignment: Assignment, plan: Optional[Plan] = None, profile: Optional[Profile] = None) -> Self:
+        idents = (n.ident for n in assignment.graph.nodes()) if plan is None else plan.forward
+        return cls(assignment, {ident: Valuation(assignment.assigned.get(ident, 0)) for ident in idents}, profile)
 
     @classmethod
-    def run(cls, assignment: Assignment) -> Self:
-        gv = cls.initialize(assignment)
-        gv.forward()
-        gv.backward()
+    def run(
+        cls,
+        assignment: Assignment,
+        roots: Optional[Iterable[Value]] = None,
+        wrt: Optional[Iterable[Value]] = None,
+        profile: Optional[Profile] = None,
+    ) -> Self:
+        """
+        Evaluate and differentiate the graph, optionally restricted to what the
+        given `roots` need (all the roots of the graph by default) and to the
+        gradients with respect to the variables in `wrt`, recording the time spent
+        on each node into `profile` if given
+        """
+        plan: Optional[Plan] = None
+        if roots is not None or wrt is not None:
+            graph = assignment.graph
+            plan = Plan.compile(
+                graph,
+                frozenset(r.ident for r in graph.roots()) if roots is None else frozenset(r.node.ident for r in roots),
+                None if wrt is None else frozenset(w.node.ident for w in wrt),
+            )
+        gv = cls.initialize(assignment, plan, profile)
+        gv.forward(plan)
+        gv.backward(plan)
         return gv
@@ -0,0 +1,261 @@
+import marshal
+import sys
+from array import array
+from dataclasses import dataclass
+from hashlib import sha256
+from math import exp, isfinite, pow, tanh
+from pathlib import Path
+from types import CodeType
+from typing import Callable, Iterable, Optional, Tuple, TypeAlias, override
+from weakref import WeakKeyDictionary, WeakValueDictionary
+
+from typing_extensions import Self
+
+from .assignment import Assignment
+from .tape import OpCode, Tape, TapeValuation
+from .value import ValueDag
+
+Forward: TypeAlias = Callable[[list[float]], None]
+Backward: TypeAlias = Callable[[list[float], list[float]], None]
+
+
+# The structure of a tape, independent of the identities of the graph it was lowered from,
+# so graphs built the same way share their generated code
+def structural_key(tape: Tape) -> str:
+    digest = sha256()
+    digest.update(array("B", tape.codes).tobytes())
+    digest.update(array("d", tape.params).tobytes())
+    for part in (tape.offsets, tape.operands, tape.roots):
+        digest.update(array("q", part).tobytes())
+    return digest.hexdigest()
+
+
+_WIDTH = 16
+
+
+def _literal(x: float) -> str:
+    return repr(float(x)) if isfinite(x) else f"float('{x}')"
+
+
+# Emits the source of a forward and a backward function for a tape, as straight-line
+# code with a local per slot: `v{s}` for the value and `g{s}` for the gradient of slot
+# `s`. Both functions work on the value and gradient lists of a TapeValuation.
+class _Emitter:
+    tape: Tape
+    lines: list[str]
+
+    def __init__(self, tape: Tape) -> None:
+        self.tape = tape
+        self.lines = []
+
+    def operands(self, slot: int) -> list[int]:
+        tape = self.tape
+        return list(tape.operands[tape.offsets[slot] : tape.offsets[slot + 1]])
+
+    def emit(self, line: str) -> None:
+        self.lines.append(f"    {line}")
+
+    def source(self) -> str:
+        self.lines.append("def forward(v):")
+        self.forward()
+        self.lines.append("def backward(v, g):")
+        self.backward()
+        return "\n".join(self.lines) + "\n"
+
+    # Wide sums and products are accumulated over several statements, as deeply nested
+    # expressions can exhaust the compiler, keeping the same order of evaluation
+    def fold(self, slot: int, operator: str, terms: list[str]) -> None:
+        self.emit(f"v{slot} = {f' {operator} '.join(terms[:_WIDTH])}")
+        for k in range(_WIDTH, len(terms), _WIDTH):
+            self.emit(f"v{slot} = {f' {operator} '.join([f'v{slot}'] + terms[k : k + _WIDTH])}")
+
+    def forward(self) -> None:
+        tape = self.tape
+        computed: list[int] = []
+        for slot in range(len(tape)):
+            code, param, pred = tape.codes[slot], tape.params[slot], self.operands(slot)
+            ops = [f"v{p}" for p in pred]
+            match code:
+                case OpCode.VARIABLE:
+                    self.emit(f"v{slot} = v[{slot}]")
+                    continue
+                case OpCode.SUM:
+                    self.fold(slot, "+", [_literal(param)] + ops)
+                    computed.append(slot)
+                    continue
+                case OpCode.PROD:
+                    self.fold(slot, "*", [_literal(param)] + ops)
+                    computed.append(slot)
+                    continue
+                case OpCode.POW:
+                    expression = f"pow({ops[0]}, {_literal(param)})"
+                case OpCode.TANH:
+                    expression = f"tanh({ops[0]})"
+                case OpCode.EXP:
+                    expression = f"exp({ops[0]})"
+                case OpCode.AFFINE:
+                    start = len(ops) % 2
+                    terms = ops[:start] + [f"{a} * {b}" for a, b in zip(ops[start::2], ops[start + 1 :: 2])]
+                    self.fold(slot, "+", [_literal(param)] + terms)
+                    computed.append(slot)
+                    continue
+            self.emit(f"v{slot} = {expression}")
+            computed.append(slot)
+        for slot in computed:
+            self.emit(f"v[{slot}] = v{slot}")
+        self.emit("return None")
+
+    def backward(self) -> None:
+        tape = self.tape
+        body: list[str] = []
+        read: set[int] = set()
+        assigned: set[int] = set()
+
+        def accumulate(slot: int, expression: str) -> None:
+            body.append(f"g{slot} {'+=' if slot in assigned else '='} {expression}")
+            assigned.add(slot)
+
+        def value(slot: int) -> str:
+            read.add(slot)
+            return f"v{slot}"
+
+        for root in tape.roots:
+            accumulate(root, "1.0")
+        for slot in range(len(tape) - 1, -1, -1):
+            code, param, pred = tape.codes[slot], tape.params[slot], self.operands(slot)
+            if code == OpCode.VARIABLE or slot not in assigned:
+                continue
+            head = f"g{slot}"
+            match code:
+                case OpCode.SUM:
+                    for p in pred:
+                        accumulate(p, head)
+                case OpCode.PROD:
+                    # The product of the other operand positions, through prefix and suffix products
+                    # for wide products so this stays linear in the arity
+                    if len(pred) <= 3:
+                        for k, p in enumerate(pred):
+                            others = [_literal(param)] + [value(q) for j, q in enumerate(pred) if j != k]
+                            accumulate(p, f"{head} * {' * '.join(others)}")
+                    else:
+                        body.append(f"s = {head} * {_literal(param)}")
+                        body.append("prefix = [s]")
+                        for p in pred[:-1]:
+                            body.append(f"s *= {value(p)}")
+                            body.append("prefix.append(s)")
+                        body.append("s = 1.0")
+                        for k in range(len(pred) - 1, -1, -1):
+                            accumulate(pred[k], f"prefix[{k}] * s")
+                            if k != 0:
+                                body.append(f"s *= {value(pred[k])}")
+                case OpCode.POW:
+                    if param != 0:
+                        term = f"{head} * {_literal(param)} * {value(pred[0])} ** {_literal(param - 1)}"
+                        # Skipped without a head as the interpreter does, since 0 ** (q - 1) raises for q < 1
+                        accumulate(pred[0], term if param >= 1 else f"({term} if {head} != 0.0 else 0.0)")
+                case OpCode.TANH:
+                    accumulate(pred[0], f"{head} * (1.0 - {value(slot)} * {value(slot)})")
+                case OpCode.EXP:
+                    accumulate(pred[0], f"{head} * {value(slot)}")
+                case OpCode.AFFINE:
+                    start = len(pred) % 2
+                    if start == 1:
+                        accumulate(pred[0], head)
+                    for a, b in zip(pred[start::2], pred[start + 1 :: 2]):
+                        accumulate(a, f"{head} * {value(b)}")
+                        accumulate(b, f"{head} * {value(a)}")
+
+        for slot in sorted(read):
+            self.emit(f"v{slot} = v[{slot}]")
+        for line in body:
+            self.emit(line)
+        for slot in range(len(tape)):
+            self.emit(f"g[{slot}] = {f'g{slot}' if slot in assigned else '0.0'}")
+        self.emit("return None")
+
+
+# The forward and backward functions generated for a tape structure
+@dataclass(frozen=True)
+class Generated:
+    key: str
+    forward: Forward
+    backward: Backward
+
+    @classmethod
+    def load(cls, key: str, code: CodeType) -> Self:
+        namespace: dict[str, object] = {"tanh": tanh, "exp": exp, "pow": pow}
+        exec(code, namespace)
+        return cls(key, namespace["forward"], namespace["backward"])  # type: ignore[arg-type]
+
+    @classmethod
+    def of(cls, tape: Tape, cache: Optional[Path] = None) -> "Generated":
+        """
+        Generate the functions for a tape, reusing those already generated for
+        the same structure, in memory or in the `cache` directory when given
+        """
+        key = structural_key(tape)
+        generated = _generated.get(key)
+        if generated is not None:
+            return generated
+
+        path = None if cache is None else cache / f"{key}.{sys.implementation.cache_tag}.marshal"
+        if path is not None and path.exists():
+            code = marshal.loads(path.read_bytes())
+        else:
+            code = compile(_Emitter(tape).source(), f"<micrograd {key[:12]}>", "exec")
+            if path is not None:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(marshal.dumps(code))
+        generated = _generated[key] = cls.load(key, code)
+        return generated
+
+
+# Shared by structure for as long as a graph compiled to it is alive, so that code for the
+# graphs rebuilt over and over in training is let go of along with them
+_generated: WeakValueDictionary[str, Generated] = WeakValueDictionary()
+
+
+# A TapeValuation running generated code rather than interpreting the tape
+@dataclass(frozen=True)
+class GeneratedValuation(TapeValuation):
+    generated: Generated
+
+    # Only whole passes are generated, so partial ones are left to the interpreter
+    @override
+    def forward(self, slots: Optional[Iterable[int]] = None) -> None:
+        if slots is None:
+            self.generated.forward(self.values)
+        else:
+            super().forward(slots)
+
+    @override
+    def backward(self) -> None:
+        self.generated.backward(self.values, self.gradients)
+
+    # The structural key is only computed again when the graph has changed
+    @classmethod
+    def compile(cls, graph: ValueDag, cache: Optional[Path] = None) -> Generated:
+        tape = Tape.compile(graph)
+        compiled = _compiled.get(graph)
+        if compiled is None or compiled[0] is not tape:
+            compiled = _compiled[graph] = (tape, Generated.of(tape, cache))
+        return compiled[1]
+
+    # Code is generated into the `cache` directory when given, or loaded from it
+    @override
+    @classmethod
+    def initialize(cls, assignment: Assignment, cache: Optional[Path] = None) -> Self:
+        generated = cls.compile(assignment.graph, cache)
+        tv = TapeValuation.initialize(assignment)
+        return cls(tv.tape, tv.values, tv.gradients, generated)
+
+    @override
+    @classmethod
+    def run(cls, assignment: Assignment, cache: Optional[Path] = None) -> Self:
+        gv = cls.initialize(assignment, cache)
+        gv.forward()
+        gv.backward()
+        return gv
+
+
+_compiled: WeakKeyDictionary[ValueDag, Tuple[Tape, Generated]] = WeakKeyDictionary()
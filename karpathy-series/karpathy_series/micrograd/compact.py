@@ -0,0 +1,204 @@
+from array import array
+from collections.abc import Buffer
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Mapping, Optional, Tuple, override
+
+from typing_extensions import Self
+
+from .graph import Checkpoint, DagNode
+from .ident import IdentManager, Label
+from .tape import Tape, decode, encode
+from .value import ValueDag, ValueNode
+from .value_type import ValueType
+
+
+# A view of a node of a CompactDag, holding only its identity and graph, with the
+# data and predecessors decoded from the graph's arrays when accessed
+class CompactNode(DagNode[ValueType]):
+    __slots__ = ()
+    graph: "CompactDag"
+
+    def __init__(self, ident: int, graph: "CompactDag") -> None:
+        object.__setattr__(self, "ident", ident)
+        object.__setattr__(self, "graph", graph)
+
+    @property
+    @override
+    def data(self) -> ValueType:
+        return self.graph.data(self.ident)
+
+    @property
+    @override
+    def pred(self) -> Tuple[ValueNode, ...]:
+        return self.graph.pred(self.ident)
+
+
+# A ValueDag storing its nodes in typed arrays rather than as node objects: an op code
+# and parameter per node, and the predecessors in CSR form, where the predecessors of
+# node `n` are `operands[offsets[n]:offsets[n + 1]]`. Identities are positions in
+# these arrays. Nodes are handed out as lightweight views, and `node_table` is left
+# empty, so nodes are looked up through indexing the graph instead.
+class CompactDag(ValueDag):
+    _codes: array[int]
+    _params: array[float]
+    _offsets: array[int]
+    _operands: array[int]
+    _consumed: bytearray
+    _types: dict[Tuple[int, float], ValueType]
+    _encoded: dict[ValueType, Tuple[int, float]]
+
+    def __init__(self, identities: Optional[IdentManager] = None, hash_cons: bool = False) -> None:
+        super().__init__(identities=identities or IdentManager(), hash_cons=hash_cons)
+        assert self.identities.ident_source == 0
+        self._codes = array("B")
+        self._params = array("d")
+        self._offsets = array("q", [0])
+        self._operands = array("q")
+        self._consumed = bytearray()
+        self._types = {}
+        self._encoded = {}
+
+    # Builds a graph straight from the contents of its arrays, e.g. as read from a file,
+    # without creating any node. The nodes consumed are all those but the roots.
+    @classmethod
+    def of_arrays(
+        cls,
+        codes: Buffer,
+        params: Buffer,
+        offsets: Buffer,
+        operands: Buffer,
+        roots: Iterable[int],
+        labels: Mapping[int, str],
+    ) -> Self:
+        graph = cls()
+        graph._codes.frombytes(memoryview(codes).cast("B"))
+        graph._params.frombytes(memoryview(params).cast("B"))
+        graph._offsets = array("q")
+        graph._offsets.frombytes(memoryview(offsets).cast("B"))
+        graph._operands.frombytes(memoryview(operands).cast("B"))
+        size = len(graph._codes)
+        assert len(graph._params) == size and len(graph._offsets) == size + 1
+        assert graph._offsets[size] == len(graph._operands)
+        graph._consumed = bytearray(b"\x01") * size
+        for root in roots:
+            graph._consumed[root] = 0
+        graph.identities.ident_source = size
+        graph.identities.label_table.update(labels)
+        return graph
+
+    @override
+    def node(self, data: ValueType, *pred: ValueNode, label: Optional[Label] = None) -> ValueNode:
+        if self.hash_cons and len(pred) != 0:
+            existing = self._cons_table.get((data, tuple(p.ident for p in pred)))
+            if existing is not None:
+                if label is not None and existing.label() is None:
+                    _ = existing.set_label(label)
+                return existing
+
+        ident = self.identities.use()
+        assert ident == len(self._codes)
+        encoded = self._encoded.get(data)
+        if encoded is None:
+            encoded = self._encoded[data] = encode(data)
+        code, param = encoded
+        self._codes.append(code)
+        self._params.append(param)
+        for p in pred:
+            assert p.graph is self
+            self._operands.append(p.ident)
+            self._consumed[p.ident] = 1
+        self._offsets.append(len(self._operands))
+        self._consumed.append(0)
+
+        node = CompactNode(ident, self)
+        if label is not None:
+            _ = node.set_label(label)
+        if self.hash_cons and len(pred) != 0:
+            self._cons_table[(data, tuple(p.ident for p in pred))] = node
+        return node
+
+    # Roots are tracked in the arrays as nodes are built, so there is nothing left to
+    # do after a bulk, and nodes are only ever built through `node`
+    @override
+    def _settle(self, start: int) -> None:
+        return None
+
+    @override
+    def extend(self, items: Iterable[Tuple[ValueType, Tuple[ValueNode, ...], Optional[Label]]]) -> list[ValueNode]:
+        with self.bulk():
+            return [self.node(data, *pred, label=label) for data, pred, label in items]
+
+    # Identities are slots of the arrays here, which would have to be reused after a rollback
+    @override
+    def mark(self) -> Checkpoint:
+        raise ValueError("Compact graphs cannot be rolled back")
+
+    # Roots are the nodes without consumers here, which cannot be kept aside
+    @override
+    @contextmanager
+    def aside(self) -> Iterator[Self]:
+        raise ValueError("Compact graphs cannot keep roots aside")
+
+    def data(self, ident: int) -> ValueType:
+        key = (self._codes[ident], self._params[ident])
+        value_type = self._types.get(key)
+        if value_type is None:
+            value_type = self._types[key] = decode(*key)
+        return value_type
+
+    def pred(self, ident: int) -> Tuple[ValueNode, ...]:
+        return tuple(CompactNode(p, self) for p in self._operands[self._offsets[ident] : self._offsets[ident + 1]])
+
+    # The arrays of the graph are already laid out as a tape, with identities as slots
+    def tape(self) -> Tape:
+        roots = array("q", (n for n, consumed in enumerate(self._consumed) if consumed == 0))
+        return Tape(
+            self.revision,
+            range(self.size()),
+            array("B", self._codes),
+            array("d", self._params),
+            array("q", self._offsets),
+            array("q", self._operands),
+            roots,
+        )
+
+    @override
+    def __getitem__(self, ident: int) -> ValueNode:
+        if not 0 <= ident < len(self._codes):
+            raise KeyError(ident)
+        return CompactNode(ident, self)
+
+    @override
+    def size(self) -> int:
+        return len(self._codes)
+
+    @override
+    def is_root(self, node: ValueNode) -> bool:
+        return self._consumed[node.ident] == 0
+
+    @override
+    def roots(self) -> Iterable[ValueNode]:
+        return (CompactNode(n, self) for n, consumed in enumerate(self._consumed) if consumed == 0)
+
+    @override
+    def entries(self) -> Iterable[ValueNode]:
+        offsets = self._offsets
+        return (CompactNode(n, self) for n in range(len(self._codes)) if offsets[n] == offsets[n + 1])
+
+    @override
+    def nodes(self) -> Iterable[ValueNode]:
+        return self.topological()
+
+    @override
+    def topological(self, reverse: bool = False) -> Iterable[ValueNode]:
+        idents = range(len(self._codes))
+        return (CompactNode(n, self) for n in (reversed(idents) if reverse else idents))
+
+    # Graphs are only equal to themselves, as there is no node table to compare
+    @override
+    def __eq__(self, other: object) -> bool:
+        return self is other
+
+    @override
+    def __hash__(self) -> int:
+        return hash(self.identities)
@@ -1,11 +1,14 @@
-from typing import List, Literal, Tuple, TypeAlias, TypeVar
+from dataclasses import dataclass
+from math import log1p
+from typing import List, Literal, Optional, TextIO, Tuple, TypeAlias, TypeVar
 
 from graphviz import Digraph
 
 from .calculation import GraphValuation
 from .graph import Dag, DagNode
+from .tape import OpCode, Tape, TapeValuation, decode
 from .valuation import Valuation
-from .value import ValueGraph
+from .value import ValueDag, ValueGraph
 from .value_type import Operator, Variable
 
 DrawFormat: TypeAlias = Literal["png", "svg"]
@@ -27,7 +30,7 @@ class Drawing:
     def _nodes_and_edges(dag: Dag[D]) -> Tuple[NodeList[D], EdgeList[D]]:
         nodes: NodeList[D] = []
         edges: EdgeList[D] = []
-        for node in dag.node_table.values():
+        for node in dag.nodes():
             nodes.append(node)
             for pred in node.pred:
                 edges.append((pred, node))
@@ -90,3 +93,148 @@ class Drawing:
             dot.edge(str(n1.ident), self._op_ident(str(n2.ident)))
 
         return dot
+
+
+# A DOT string of the given lines
+def _quote(*lines: str) -> str:
+    return '"' + "\\n".join(line.replace("\\", "\\\\").replace('"', '\\"') for line in lines) + '"'
+
+
+# Writes DOT text for a ValueDag straight to a stream rather than building a Digraph,
+# drawing each node once, with its operator in its label, so it copes with large graphs.
+#  * `collapse` draws all the nodes whose labels share their first `collapse` dotted
+#    components as a single node, e.g. with 2, `layer.n3.w0` and `layer.n3.linear`
+#    become `layer.n3`, which is how a Layer labels its neurons
+#  * `focus` only draws the nodes within `depth` edges of the node with that identity
+#  * `limit` caps the number of nodes drawn, keeping those nearest the focus, or
+#    nearest the roots without a focus, and nodes with neighbours left out are dashed
+#  * with a valuation, nodes are shaded by the magnitude of their gradient
+@dataclass
+class DotWriter:
+    rankdir: RankDir = "LR"
+    collapse: int = 0
+    focus: Optional[int] = None
+    depth: Optional[int] = None
+    limit: Optional[int] = None
+
+    # Breadth first from the focus through operands and consumers, or from the roots
+    # through operands only without a focus
+    def select(self, tape: Tape) -> list[int]:
+        if self.focus is None and self.limit is None:
+            return list(range(len(tape)))
+
+        offsets, operands, successors = tape.offsets, tape.operands, tape.successors
+        frontier = list(tape.roots if self.focus is None else (tape.slot(self.focus),))[: self.limit]
+        reached = set(frontier)
+        distance = 0
+        while frontier and (self.focus is None or self.depth is None or distance < self.depth):
+            distance += 1
+            following: list[int] = []
+            for slot in frontier:
+                consumers = (
+                    ()
+                    if self.focus is None
+                    else (
+                        successors.consumers[successors.edges[k]]
+                        for k in range(successors.offsets[slot], successors.offsets[slot + 1])
+                    )
+                )
+                for neighbour in (*operands[offsets[slot] : offsets[slot + 1]], *consumers):
+                    if neighbour not in reached and (self.limit is None or len(reached) < self.limit):
+                        reached.add(neighbour)
+                        following.append(neighbour)
+            frontier = following
+        return sorted(reached)
+
+    def cluster(self, label: Optional[str]) -> Optional[str]:
+        if self.collapse <= 0 or label is None:
+            return None
+        parts = label.split(".")
+        return ".".join(parts[: self.collapse]) if len(parts) >= self.collapse else None
+
+    def write(
+        self, stream: TextIO, graph: ValueDag, valuation: Optional[GraphValuation | TapeValuation] = None
+    ) -> None:
+        tape = Tape.compile(graph)
+        identities = graph.identities
+        selected = self.select(tape)
+        drawn = frozenset(selected)
+
+        gradients: Optional[list[float]] = None
+        values: Optional[list[float]] = None
+        if isinstance(valuation, TapeValuation):
+            assert valuation.tape.revision == tape.revision
+            values, gradients = valuation.values, valuation.gradients
+        elif isinstance(valuation, GraphValuation):
+            assigned = valuation.assigned
+            empty = Valuation()
+            values = [assigned.get(n, empty).value for n in tape.idents]
+            gradients = [assigned.get(n, empty).gradient for n in tape.idents]
+        scale = log1p(max((abs(gradients[s]) for s in selected), default=0)) if gradients is not None else 0
+
+        # The drawn name of each selected slot, and the members of each cluster
+        names: dict[int, str] = {}
+        clusters: dict[str, list[int]] = {}
+        for slot in selected:
+            prefix = self.cluster(identities.label(tape.idents[slot]))
+            if prefix is None:
+                names[slot] = f"n{tape.idents[slot]}"
+            else:
+                members = clusters.setdefault(prefix, [])
+                if len(members) == 0:
+                    members.append(len(clusters))
+                members.append(slot)
+                names[slot] = f"c{members[0]}"
+
+        def partial(slots: List[int]) -> bool:
+            successors = tape.successors
+            for slot in slots:
+                neighbours = (
+                    *tape.operands[tape.offsets[slot] : tape.offsets[slot + 1]],
+                    *(
+                        successors.consumers[successors.edges[k]]
+                        for k in range(successors.offsets[slot], successors.offsets[slot + 1])
+                    ),
+                )
+                if any(n not in drawn for n in neighbours):
+                    return True
+            return False
+
+        def style(slots: List[int]) -> str:
+            styles: list[str] = []
+            fill = ""
+            if gradients is not None and scale != 0:
+                magnitude = log1p(max(abs(gradients[s]) for s in slots)) / scale
+                styles.append("filled")
+                fill = f', fillcolor="0.000 {magnitude:.3f} 1.000"'
+            if partial(slots):
+                styles.append("dashed")
+            return (f', style="{",".join(styles)}"' if styles else "") + fill
+
+        stream.write(f"digraph {{\n  rankdir={self.rankdir};\n")
+        for prefix, members in clusters.items():
+            slots = members[1:]
+            label = _quote(f"{prefix}.* ({len(slots)} nodes)")
+            stream.write(f"  c{members[0]} [label={label}, shape=box3d{style(slots)}];\n")
+        for slot in selected:
+            if names[slot][0] == "c":
+                continue
+            ident = tape.idents[slot]
+            lines = [identities.label(ident) or str(ident)]
+            if tape.codes[slot] != OpCode.VARIABLE:
+                lines[0] += f" = {decode(tape.codes[slot], tape.params[slot])!s}"
+            if values is not None and gradients is not None:
+                lines.append(f"value = {values[slot]:.4g}, grad = {gradients[slot]:.4g}")
+            shape = "box" if tape.codes[slot] == OpCode.VARIABLE else "ellipse"
+            stream.write(f"  {names[slot]} [label={_quote(*lines)}, shape={shape}{style([slot])}];\n")
+
+        edges: set[Tuple[str, str]] = set()
+        for slot in selected:
+            for k in range(tape.offsets[slot], tape.offsets[slot + 1]):
+                operand = tape.operands[k]
+                if operand in drawn:
+                    edge = (names[operand], names[slot])
+                    if edge[0] != edge[1] and edge not in edges:
+                        edges.add(edge)
+                        stream.write(f"  {edge[0]} -> {edge[1]};\n")
+        stream.write("}\n")
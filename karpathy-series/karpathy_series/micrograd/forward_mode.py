@@ -0,0 +1,69 @@
+from dataclasses import dataclass
+from typing import Mapping, Sequence
+
+import numpy as np
+from numpy.typing import ArrayLike
+from typing_extensions import Self
+
+from .assignment import Assignment
+from .valuation import DualValuation, FloatArray, Valuation
+from .value import Value
+from .value_type import Operator
+
+
+# Forward mode differentiation, carrying a block of tangents along with each value so
+# that a single walk of the graph gives the derivatives of every node along each of
+# the seeded directions. This costs a walk per block of directions rather than one per
+# root, which pays off for graphs with few variables and many roots.
+@dataclass(frozen=True)
+class ForwardValuation:
+    assignment: Assignment
+    assigned: dict[int, DualValuation]
+
+    def forward(self) -> None:
+        for node in self.assignment.graph.topological():
+            model = node.data
+            if isinstance(model, Operator):
+                operands = tuple(self.assigned[p.ident] for p in node.pred)
+                value = model.forward(tuple(Valuation(op.value) for op in operands))
+                result = DualValuation(value.value, self.assigned[node.ident].tangent)
+                result.tangent = model.jvp(result, operands)
+                self.assigned[node.ident] = result
+
+    def value(self, v: Value) -> float:
+        return self.assigned[v.node.ident].value
+
+    def tangent(self, v: Value) -> FloatArray:
+        return self.assigned[v.node.ident].tangent
+
+    @classmethod
+    def initialize(cls, assignment: Assignment, seeds: Mapping[int, ArrayLike], directions: int) -> Self:
+        zeros = np.zeros(directions)
+        assigned: dict[int, DualValuation] = {}
+        for node in assignment.graph.nodes():
+            seed = seeds.get(node.ident)
+            tangent = zeros if seed is None else np.asarray(seed, dtype=np.float64)
+            assert tangent.shape == (directions,)
+            assigned[node.ident] = DualValuation(assignment.assigned.get(node.ident, 0), tangent)
+        return cls(assignment, assigned)
+
+    @classmethod
+    def jvp(cls, assignment: Assignment, seeds: Mapping[Value, ArrayLike]) -> Self:
+        """
+        Evaluate the graph along with the Jacobian-vector products for the given
+        seeds, which give each variable its entries in one or more directions,
+        so that `tangent(v)[k]` is the derivative of `v` along direction `k`.
+        Variables without a seed have no component in any direction.
+        """
+        arrays = {v.node.ident: np.atleast_1d(np.asarray(seed, dtype=np.float64)) for v, seed in seeds.items()}
+        directions = frozenset(len(a) for a in arrays.values())
+        assert len(directions) <= 1
+        fv = cls.initialize(assignment, arrays, next(iter(directions), 1))
+        fv.forward()
+        return fv
+
+    @classmethod
+    def jacobian(cls, assignment: Assignment, wrt: Sequence[Value]) -> Self:
+        """Seed one direction per variable of `wrt`, so tangents are rows of the Jacobian"""
+        identity = np.eye(len(wrt))
+        return cls.jvp(assignment, {v: identity[k] for k, v in enumerate(wrt)})
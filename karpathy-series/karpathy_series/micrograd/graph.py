@@ -1,16 +1,22 @@
+import gc
+from contextlib import contextmanager
 from dataclasses import dataclass, field
-from typing import Generic, Iterable, Optional, Set, Tuple, TypeVar, override
+from typing import FrozenSet, Generic, Iterable, Iterator, Optional, Set, Tuple, TypeAlias, TypeVar, override
 
 from typing_extensions import Self
 
-from .ident import HasIdentities, IdentManager
+from .ident import HasIdentities, IdentManager, Label
 
 D = TypeVar("D")
 
+# The identities used, the number of nodes, and the generation of the roots of a graph
+Revision: TypeAlias = Tuple[int, int, int]
+
 
 # This should not be constructed directly, but rather through a Dag which manages node identity
 # In order for the node to remain frozen, the `data` field should be a reference or static
-@dataclass(frozen=True)
+# Since the Dag manages identity, nodes are equal when they are the same node of the same graph
+@dataclass(frozen=True, slots=True, eq=False)
 class DagNode(Generic[D]):
     ident: int
     graph: HasIdentities
@@ -21,7 +27,7 @@ class DagNode(Generic[D]):
     # Here, we can assume `x` is a reference to the same node.
     pred: Tuple["DagNode[D]", ...] = ()
 
-    def set_label(self: Self, label: str) -> Self:
+    def set_label(self: Self, label: Label) -> Self:
         self.graph.identities.set_label(self.ident, label)
         return self
 
@@ -31,12 +37,29 @@ class DagNode(Generic[D]):
     def pred_values(self) -> Tuple[D, ...]:
         return tuple(p.data for p in self.pred)
 
+    @override
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, DagNode) and self.ident == other.ident and self.graph is other.graph
+
+    @override
+    def __hash__(self) -> int:
+        return hash((self.ident, id(self.graph)))
+
     @override
     def __str__(self) -> str:
         data_str = str(self.data)
         return f"Node({self.ident, data_str})"
 
 
+# The state of a graph to roll back to, where nodes are identified in order of creation,
+# so those added since are the ones from `start` on
+@dataclass(frozen=True)
+class Checkpoint:
+    start: int
+    size: int
+    roots: FrozenSet[int]
+
+
 # This is a forumlation of a Dag that can be a Dag by construction
 # Because the DagNode type has a fixed tuple of predecessors, these
 # must be defined earlier, hence a topological order. This can be defeated
@@ -47,11 +70,31 @@ class Dag(Generic[D], HasIdentities):
     label_table: dict[int, str] = field(default_factory=dict)
     identities: IdentManager = field(default_factory=IdentManager)
 
+    # When hash consing, building a node with the same data and the same predecessors
+    # as an existing one returns the existing node. Nodes without predecessors are
+    # always distinct, since they stand for independent entries.
+    hash_cons: bool = False
+
     # As the graph is built, keep track of roots
     _roots: Set[int] = field(default_factory=set)
     _entries: Set[int] = field(default_factory=set)
+    _cons_table: dict[Tuple[D, Tuple[int, ...]], DagNode[D]] = field(default_factory=dict)
+
+    # While building in bulk, the first identity added in bulk, as roots and entries
+    # are only worked out for the nodes added once the bulk is done
+    _bulk: Optional[int] = None
+    # Counts the changes to the roots that come without adding or dropping nodes
+    _generation: int = 0
+
+    def node(self, data: D, *pred: DagNode[D], label: Optional[Label] = None) -> DagNode[D]:
+        if self.hash_cons and len(pred) != 0:
+            key = (data, tuple(p.ident for p in pred))
+            existing = self._cons_table.get(key)
+            if existing is not None:
+                if label is not None and existing.label() is None:
+                    _ = existing.set_label(label)
+                return existing
 
-    def node(self, data: D, *pred: DagNode[D], label: Optional[str] = None) -> DagNode[D]:
         new_node_ident = self.identities.use()
         new_node = DagNode(new_node_ident, self, data, tuple(pred))
         self.node_table[new_node_ident] = new_node
@@ -59,6 +102,11 @@ class Dag(Generic[D], HasIdentities):
         if label is not None:
             _ = new_node.set_label(label)
 
+        if self.hash_cons and len(pred) != 0:
+            self._cons_table[(data, tuple(p.ident for p in pred))] = new_node
+        if self._bulk is not None:
+            return new_node
+
         # New node is an entry when it has no predecessors
         if len(pred) == 0:
             self._entries.add(new_node_ident)
@@ -67,9 +115,120 @@ class Dag(Generic[D], HasIdentities):
         self._roots.add(new_node.ident)
 
         # Predecessors can now no longer be roots
-        self._roots -= set(p.ident for p in pred)
+        self._roots.difference_update(p.ident for p in pred)
         return new_node
 
+    @contextmanager
+    def bulk(self, pause_gc: bool = False) -> Iterator[Self]:
+        """
+        Build many nodes at once, deferring the roots and entries of the graph to
+        a single pass over the nodes added when the bulk is done, so they are not
+        to be relied on until then. With `pause_gc`, garbage collection is held
+        off meanwhile, as nodes are only ever added, never released, while
+        building, though this holds it off for the whole process. Within another
+        bulk, the outermost one decides.
+        """
+        if self._bulk is not None:
+            yield self
+            return
+        collecting = pause_gc and gc.isenabled()
+        if collecting:
+            gc.disable()
+        self._bulk = self.identities.ident_source
+        try:
+            yield self
+        finally:
+            start, self._bulk = self._bulk, None
+            self._settle(start)
+            if collecting:
+                gc.enable()
+
+    # Work out the roots and entries of the graph given the nodes from identity `start` on
+    def _settle(self, start: int) -> None:
+        table = self.node_table
+        added = [node for ident in range(start, self.identities.ident_source) if (node := table.get(ident)) is not None]
+        self._roots.update(node.ident for node in added)
+        self._roots.difference_update(p.ident for node in added for p in node.pred)
+        self._entries.update(node.ident for node in added if len(node.pred) == 0)
+        self._generation += 1
+
+    def extend(self, items: Iterable[Tuple[D, Tuple[DagNode[D], ...], Optional[Label]]]) -> list[DagNode[D]]:
+        """
+        Add nodes in order, each given as its data, predecessors and label, as
+        built by `node` but within a bulk and without going through it per node
+        """
+        with self.bulk():
+            if self.hash_cons:
+                return [self.node(data, *pred, label=label) for data, pred, label in items]
+            table, use, set_label = self.node_table, self.identities.use, self.identities.set_label
+            added: list[DagNode[D]] = []
+            for data, pred, label in items:
+                ident = use()
+                node = table[ident] = DagNode(ident, self, data, pred)
+                if label is not None:
+                    set_label(ident, label)
+                added.append(node)
+            return added
+
+    def mark(self) -> Checkpoint:
+        assert self._bulk is None
+        return Checkpoint(self.identities.ident_source, self.size(), frozenset(self._roots))
+
+    def rollback(self, checkpoint: Checkpoint) -> None:
+        """
+        Drop every node added since the checkpoint, along with their labels, and
+        restore the roots and entries as they were. Identities are not reused,
+        so the revision of the graph still changes, and values of the dropped
+        nodes must not be used anymore.
+        """
+        assert self._bulk is None
+        table = self.node_table
+        dropped: list[DagNode[D]] = []
+        for ident in reversed(table):
+            if ident < checkpoint.start:
+                break
+            dropped.append(table[ident])
+        if self.size() - len(dropped) != checkpoint.size:
+            raise ValueError("Nodes from before the checkpoint have already been dropped")
+
+        for node in dropped:
+            del table[node.ident]
+            self._entries.discard(node.ident)
+            if self.hash_cons and len(node.pred) != 0:
+                key = (node.data, tuple(p.ident for p in node.pred))
+                if self._cons_table.get(key) is node:
+                    del self._cons_table[key]
+        self._roots = set(checkpoint.roots)
+        self._generation += 1
+        self.identities.release(checkpoint.start)
+
+    @contextmanager
+    def arena(self) -> Iterator[Self]:
+        """
+        Build nodes that only live within the context, e.g. the loss of a single
+        sample over the parameters of a model built beforehand
+        """
+        checkpoint = self.mark()
+        try:
+            yield self
+        finally:
+            self.rollback(checkpoint)
+
+    @contextmanager
+    def aside(self) -> Iterator[Self]:
+        """
+        Build nodes that are left out of the roots of the graph, keeping the
+        roots as they were even when the new nodes consume them, e.g. nodes
+        derived from a model that are not to be seeded along with it
+        """
+        assert self._bulk is None
+        roots = set(self._roots)
+        try:
+            yield self
+        finally:
+            self._roots = roots
+            self._generation += 1
+
     def is_root(self, node: DagNode[D]) -> bool:
         return node.ident in self._roots
 
@@ -82,6 +241,18 @@ class Dag(Generic[D], HasIdentities):
     def nodes(self) -> Iterable[DagNode[D]]:
         return self.node_table.values()
 
+    def __getitem__(self, ident: int) -> DagNode[D]:
+        return self.node_table[ident]
+
+    def size(self) -> int:
+        return len(self.node_table)
+
+    # Changes whenever nodes are added to or removed from the graph, or its roots
+    # are worked out again, so structures derived from the graph can be cached against it
+    @property
+    def revision(self) -> Revision:
+        return self.identities.ident_source, self.size(), self._generation
+
     @override
     def __hash__(self) -> int:
         return hash(self.identities)
@@ -92,3 +263,19 @@ class Dag(Generic[D], HasIdentities):
     def topological(self, reverse: bool = False) -> Iterable[DagNode[D]]:
         forward = self.node_table.values()
         return reversed(forward) if reverse else forward
+
+    # The identities of the given nodes and of every node they depend on
+    def ancestors(self, nodes: Iterable[DagNode[D]]) -> FrozenSet[int]:
+        reached = {n.ident for n in nodes}
+        for node in self.topological(reverse=True):
+            if node.ident in reached:
+                reached.update(p.ident for p in node.pred)
+        return frozenset(reached)
+
+    # The identities of the given nodes and of every node depending on them
+    def descendants(self, nodes: Iterable[DagNode[D]]) -> FrozenSet[int]:
+        reached = {n.ident for n in nodes}
+        for node in self.topological():
+            if node.ident not in reached and any(p.ident in reached for p in node.pred):
+                reached.add(node.ident)
+        return frozenset(reached)
@@ -0,0 +1,114 @@
+from dataclasses import dataclass
+from typing import Mapping, Optional, Sequence
+
+import numpy as np
+from numpy.typing import ArrayLike
+from typing_extensions import Self
+
+from .assignment import Assignment
+from .valuation import FloatArray, SecondOrderValuation, Valuation
+from .value import Value
+from .value_type import Operator
+
+
+# Forward over reverse mode: a forward pass carrying tangents along some directions v,
+# followed by a backward pass differentiating the gradient of a root along them too.
+# The tangent of the gradient of a variable is then its row of the Hessian of the root
+# applied to v, at the cost of about two gradient evaluations per block of directions.
+@dataclass(frozen=True)
+class HessianValuation:
+    assignment: Assignment
+    assigned: dict[int, SecondOrderValuation]
+
+    def forward(self) -> None:
+        for node in self.assignment.graph.topological():
+            model = node.data
+            if isinstance(model, Operator):
+                operands = tuple(self.assigned[p.ident] for p in node.pred)
+                value = model.forward(tuple(Valuation(op.value) for op in operands))
+                result = SecondOrderValuation(value.value, self.assigned[node.ident].tangent)
+                result.tangent = model.jvp(result, operands)
+                self.assigned[node.ident] = result
+
+    def backward(self, root: int) -> None:
+        self.assigned[root].gradient = 1
+        for node in self.assignment.graph.topological(reverse=True):
+            model = node.data
+            if isinstance(model, Operator):
+                model.backward_dual(self.assigned[node.ident], tuple(self.assigned[p.ident] for p in node.pred))
+
+    def value(self, v: Value) -> float:
+        return self.assigned[v.node.ident].value
+
+    def gradient(self, v: Value) -> float:
+        return self.assigned[v.node.ident].gradient
+
+    # The Hessian-vector products of the root for the row of the variable `v`
+    def hvp(self, v: Value) -> FloatArray:
+        return self.assigned[v.node.ident].gradient_tangent
+
+    @classmethod
+    def initialize(cls, assignment: Assignment, vectors: Mapping[int, FloatArray], directions: int) -> Self:
+        zeros = np.zeros(directions)
+        assigned: dict[int, SecondOrderValuation] = {}
+        for node in assignment.graph.nodes():
+            tangent = vectors.get(node.ident, zeros)
+            assert tangent.shape == (directions,)
+            assigned[node.ident] = SecondOrderValuation(assignment.assigned.get(node.ident, 0), tangent)
+        return cls(assignment, assigned)
+
+    @classmethod
+    def run(cls, assignment: Assignment, root: Value, vectors: Mapping[Value, ArrayLike]) -> Self:
+        """
+        Differentiate `root` to second order along the given vectors, which give
+        each variable its entries in one or more directions, so that `hvp(v)[k]`
+        is the entry for `v` of the Hessian of the root applied to direction `k`
+        """
+        arrays = {v.node.ident: np.atleast_1d(np.asarray(seed, dtype=np.float64)) for v, seed in vectors.items()}
+        directions = frozenset(len(a) for a in arrays.values())
+        assert len(directions) <= 1
+        hv = cls.initialize(assignment, arrays, next(iter(directions), 1))
+        hv.forward()
+        hv.backward(root.node.ident)
+        return hv
+
+
+def hessian(assignment: Assignment, root: Value, wrt: Sequence[Value]) -> FloatArray:
+    """The full Hessian of `root` with respect to `wrt`, seeding a direction per variable"""
+    identity = np.eye(len(wrt))
+    hv = HessianValuation.run(assignment, root, {v: identity[k] for k, v in enumerate(wrt)})
+    return np.array([hv.hvp(v) for v in wrt])
+
+
+def newton_direction(
+    assignment: Assignment,
+    root: Value,
+    wrt: Sequence[Value],
+    iterations: Optional[int] = None,
+    tolerance: float = 1e-10,
+) -> FloatArray:
+    """
+    Solve H d = -g for the Newton direction d of `root` with respect to `wrt` by
+    conjugate gradients, which only needs a Hessian-vector product per iteration
+    rather than the Hessian itself, assuming H is positive definite
+    """
+
+    def product(direction: FloatArray) -> tuple[FloatArray, FloatArray]:
+        hv = HessianValuation.run(assignment, root, {v: direction[k] for k, v in enumerate(wrt)})
+        return np.array([hv.gradient(v) for v in wrt]), np.array([hv.hvp(v)[0] for v in wrt])
+
+    gradient, _ = product(np.zeros(len(wrt)))
+    solution = np.zeros(len(wrt))
+    residual = -gradient
+    direction = residual.copy()
+    error = float(residual @ residual)
+    for _ in range(iterations or len(wrt)):
+        if error <= tolerance**2:
+            break
+        _, applied = product(direction)
+        step = error / float(direction @ applied)
+        solution += step * direction
+        residual -= step * applied
+        error, previous = float(residual @ residual), error
+        direction = residual + (error / previous) * direction
+    return solution
@@ -1,27 +1,103 @@
 from abc import ABCMeta
+from bisect import bisect_right
 from dataclasses import dataclass, field
-from typing import Dict, FrozenSet, Optional, override
+from typing import Dict, FrozenSet, Iterator, Optional, Tuple, TypeAlias, override
 
 
-# Manages a labeled collection of identifiers
+# A hierarchical name, kept as a reference to its enclosing scope, so that the names
+# in a scope share it, and only formatted as a dotted path when read
+@dataclass(frozen=True, slots=True)
+class Scope:
+    name: str
+    parent: Optional["Scope"] = None
+
+    def __truediv__(self, name: str) -> "Scope":
+        return Scope(name, self)
+
+    @override
+    def __str__(self) -> str:
+        return self.name if self.parent is None else f"{self.parent}.{self.name}"
+
+
+Label: TypeAlias = str | Scope
+
+
+# The labels of a run of consecutive identities, where identity `start + k` is labeled
+# `<scope>.<role>k`, so a whole run costs a single entry
+@dataclass(frozen=True, slots=True)
+class ScopedRun:
+    start: int
+    stop: int
+    scope: Scope
+    role: str
+
+    def label(self, ident: int) -> str:
+        return f"{self.scope}.{self.role}{ident - self.start}"
+
+    def labels(self) -> Iterator[Tuple[int, str]]:
+        return ((ident, self.label(ident)) for ident in range(self.start, self.stop))
+
+
+# Manages a labeled collection of identifiers. Labels are either strings, scopes,
+# or runs of scoped labels, the last two only being formatted when read.
 @dataclass
 class IdentManager:
     ident_source: int = 0
     label_table: Dict[int, str] = field(default_factory=dict)
+    scope_table: Dict[int, Scope] = field(default_factory=dict)
+    # Runs are of identities not labeled otherwise, in order and disjoint
+    runs: list[ScopedRun] = field(default_factory=list)
 
     def use(self) -> int:
         new_ident = self.ident_source
         self.ident_source += 1
         return new_ident
 
-    def set_label(self, item: int, label: str) -> None:
-        self.label_table[item] = label
+    def set_label(self, item: int, label: Label) -> None:
+        if isinstance(label, Scope):
+            self.scope_table[item] = label
+            _ = self.label_table.pop(item, None)
+        else:
+            self.label_table[item] = label
+            _ = self.scope_table.pop(item, None)
+
+    # Label the identities from `start` up to `stop`, which must not be labeled yet, in a scope
+    def set_run(self, start: int, stop: int, scope: Scope, role: str = "") -> None:
+        assert len(self.runs) == 0 or self.runs[-1].stop <= start
+        if start < stop:
+            self.runs.append(ScopedRun(start, stop, scope, role))
+
+    # Forget the labels of the identities from `start` on, which are not used again
+    def release(self, start: int) -> None:
+        for ident in range(start, self.ident_source):
+            _ = self.label_table.pop(ident, None)
+            _ = self.scope_table.pop(ident, None)
+        runs = self.runs
+        while len(runs) != 0 and runs[-1].stop > start:
+            run = runs.pop()
+            if run.start < start:
+                runs.append(ScopedRun(run.start, start, run.scope, run.role))
 
     def label(self, ident: int) -> Optional[str]:
-        return self.label_table.get(ident)
+        label = self.label_table.get(ident)
+        if label is not None:
+            return label
+        scope = self.scope_table.get(ident)
+        if scope is not None:
+            return str(scope)
+        runs = self.runs
+        k = bisect_right(runs, ident, key=lambda run: run.start) - 1
+        return runs[k].label(ident) if k >= 0 and ident < runs[k].stop else None
+
+    # Every label, by identity, formatting them all
+    def labeled(self) -> Dict[int, str]:
+        labeled = {ident: label for run in self.runs for ident, label in run.labels()}
+        labeled.update((ident, str(scope)) for ident, scope in self.scope_table.items())
+        labeled.update(self.label_table)
+        return labeled
 
     def labels(self) -> FrozenSet[str]:
-        return frozenset(self.label_table.values())
+        return frozenset(self.labeled().values())
 
     @override
     def __str__(self) -> str:
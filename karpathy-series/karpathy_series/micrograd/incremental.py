@@ -0,0 +1,85 @@
+from dataclasses import dataclass
+from typing import Iterable, Mapping, Sequence
+
+from .assignment import Assignment
+from .tape import OpCode, TapeValuation
+
+
+# A tape valuation which, after a full run, keeps itself up to date as variables
+# change, recomputing only what depends on the changed values.
+#
+# A change to some variables dirties their downstream cone, whose values are
+# recomputed. The gradient of a node only changes if it feeds some dirty node,
+# since otherwise every local derivative on its paths to the roots is unchanged.
+# Those gradients are recomputed by pulling from the consumers of each node, in
+# reverse order, so that the unchanged consumers need not be revisited.
+@dataclass(frozen=True)
+class IncrementalValuation(TapeValuation):
+    def update(self, changes: Mapping[int, float], gradients: bool = True) -> Sequence[int]:
+        """Assign new values to variables by identity, returning the slots that were recomputed"""
+        slots = self.tape.slots
+        changed: list[int] = []
+        for ident, value in changes.items():
+            slot = slots[ident]
+            assert self.tape.codes[slot] == OpCode.VARIABLE
+            if self.values[slot] != value:
+                self.values[slot] = value
+                changed.append(slot)
+
+        if len(changed) == 0:
+            return []
+
+        dirty = self.tape.descendants(changed)
+        self.forward(dirty)
+        if gradients:
+            self.pull(reversed(self.tape.ancestors(dirty)))
+        return dirty
+
+    def reassign(self, assignment: Assignment) -> Sequence[int]:
+        assert assignment.graph.revision == self.tape.revision
+        return self.update(assignment.assigned)
+
+    def pull(self, slots: Iterable[int]) -> None:
+        """Recompute the gradients of the given slots, in reverse topological order, from their consumers"""
+        successors = self.tape.successors
+        offsets, edges, consumers = successors.offsets, successors.edges, successors.consumers
+        gradients = self.gradients
+        for slot in slots:
+            start, end = offsets[slot], offsets[slot + 1]
+            # Roots are the nodes without consumers
+            gradient = 1.0 if start == end else 0.0
+            for k in range(start, end):
+                edge = edges[k]
+                consumer = consumers[edge]
+                gradient += gradients[consumer] * self.partial(consumer, edge)
+            gradients[slot] = gradient
+
+    def partial(self, slot: int, edge: int) -> float:
+        """The derivative of the node in `slot` with respect to its operand at position `edge`"""
+        tape, values = self.tape, self.values
+        match tape.codes[slot]:
+            case OpCode.SUM:
+                return 1
+            case OpCode.PROD:
+                value = values[tape.operands[edge]]
+                if value != 0:
+                    return values[slot] / value
+                others = tape.params[slot]
+                for k in range(tape.offsets[slot], tape.offsets[slot + 1]):
+                    if k != edge:
+                        others *= values[tape.operands[k]]
+                return others
+            case OpCode.POW:
+                exponent = tape.params[slot]
+                return 0 if exponent == 0 else exponent * values[tape.operands[edge]] ** (exponent - 1)
+            case OpCode.TANH:
+                return 1 - values[slot] ** 2
+            case OpCode.EXP:
+                return values[slot]
+            case OpCode.AFFINE:
+                start = tape.offsets[slot]
+                position = edge - start - (tape.offsets[slot + 1] - start) % 2
+                if position < 0:
+                    return 1
+                return values[tape.operands[edge + 1 if position % 2 == 0 else edge - 1]]
+        raise ValueError(f"Slot {slot} does not consume operands")
@@ -0,0 +1,113 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from os import cpu_count
+from types import TracebackType
+from typing import Iterable, Mapping, Optional, Sequence, Tuple, Type
+
+from typing_extensions import Self
+
+from .assignment import Assignment
+from .tape import OpCode, Tape, TapeValuation
+from .value import Value, ValueDag
+
+# The tape installed in each worker process when it starts
+_tape: Optional[Tape] = None
+
+
+def _install(tape: Tape) -> None:
+    global _tape
+    _tape = tape
+
+
+# Runs a shard of samples in a worker, returning the root values of each sample and
+# the gradients of the requested slots summed over the shard
+def _run_shard(shard: Sequence[Mapping[int, float]], wrt: Sequence[int]) -> Tuple[list[list[float]], list[float]]:
+    assert _tape is not None
+    roots: list[list[float]] = []
+    gradients = [0.0] * len(wrt)
+    for assigned in shard:
+        tv = TapeValuation.of(_tape, assigned)
+        tv.forward()
+        tv.backward()
+        roots.append([tv.values[r] for r in _tape.roots])
+        for k, slot in enumerate(wrt):
+            gradients[k] += tv.gradients[slot]
+    return roots, gradients
+
+
+# The result of a data-parallel run: the values of the graph roots for each sample in
+# order, and the gradients of each variable summed over all samples
+@dataclass(frozen=True)
+class Reduction:
+    roots: Tuple[int, ...]
+    values: list[Tuple[float, ...]]
+    gradients: dict[int, float]
+
+    def value(self, sample: int, root: Value) -> float:
+        return self.values[sample][self.roots.index(root.node.ident)]
+
+    def gradient(self, v: Value) -> float:
+        return self.gradients[v.node.ident]
+
+
+# Evaluates many assignments of one graph over a pool of worker processes. The graph is
+# compiled to a tape once and handed to each worker as it starts, so that tasks only
+# carry the assigned values of their shard of samples.
+class DataParallel:
+    graph: ValueDag
+    tape: Tape
+    workers: int
+    executor: Executor
+
+    def __init__(self, graph: ValueDag, workers: Optional[int] = None) -> None:
+        self.graph = graph
+        self.tape = Tape.compile(graph)
+        self.workers = workers or cpu_count() or 1
+        self.executor = ProcessPoolExecutor(self.workers, initializer=_install, initargs=(self.tape,))
+
+    def run(
+        self, assignments: Iterable[Assignment], wrt: Optional[Iterable[Value]] = None, shards: Optional[int] = None
+    ) -> Reduction:
+        """
+        Evaluate and differentiate the graph for each assignment, summing the gradients
+        with respect to `wrt` (all the variables by default) over the assignments. The
+        assignments are split into `shards` contiguous tasks, a few per worker by default.
+        """
+        if self.graph.revision != self.tape.revision:
+            raise ValueError("The graph has changed since the workers were started")
+        samples = [dict(a.assigned) for a in assignments]
+        idents = (
+            tuple(self.tape.idents[s] for s in range(len(self.tape)) if self.tape.codes[s] == OpCode.VARIABLE)
+            if wrt is None
+            else tuple(w.node.ident for w in wrt)
+        )
+        wrt_slots = tuple(self.tape.slot(ident) for ident in idents)
+
+        count = max(1, min(len(samples), shards or 4 * self.workers))
+        size = max(1, -(-len(samples) // count))
+        futures = [
+            self.executor.submit(_run_shard, samples[k : k + size], wrt_slots) for k in range(0, len(samples), size)
+        ]
+
+        values: list[Tuple[float, ...]] = []
+        gradients = [0.0] * len(wrt_slots)
+        for future in futures:
+            roots, shard_gradients = future.result()
+            values.extend(tuple(r) for r in roots)
+            for k, g in enumerate(shard_gradients):
+                gradients[k] += g
+        return Reduction(tuple(self.tape.idents[r] for r in self.tape.roots), values, dict(zip(idents, gradients)))
+
+    def close(self) -> None:
+        self.executor.shutdown()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
@@ -1,25 +1,34 @@
-from functools import reduce
 from typing import Callable, Tuple
 
+import numpy as np
+
 from .assignment import Assignment
+from .batch import BatchAssignment
+from .ident import Scope
 from .value import Value, ValueDag, ValueGraph
 
 
+# The nodes of a neuron are labeled in its scope, e.g. `layer.n3.w2` for the weight of its
+# third input, `layer.n3.bias` and `layer.n3.linear`, its output being labeled `layer.n3`
 class Neuron:
-    name: str
+    scope: Scope
     graph: ValueDag
     weights: Tuple[Value, ...]
     bias: Value
     output: Value
 
-    def __init__(self, name: str, graph: ValueGraph, inputs: Tuple[Value, ...]) -> None:
+    def __init__(self, name: str | Scope, graph: ValueGraph, inputs: Tuple[Value, ...]) -> None:
         assert len(inputs) != 0
-        self.name = name
+        self.scope = scope = name if isinstance(name, Scope) else Scope(name)
         self.graph = inputs[0].graph
-        self.weights = tuple(graph(f"{name}.w{k}") for k, _ in enumerate(inputs))
-        self.bias = graph(f"{name}.bias")
-        linear = graph.sum(self.bias, *((w * x) for w, x in zip(self.weights, inputs))) | f"{name}.linear"
-        self.output = linear.tanh() | name
+        self.weights = graph.variables(len(inputs), scope, "w")
+        self.bias = graph(scope / "bias")
+        linear = graph.affine(self.weights, inputs, offset=self.bias) | scope / "linear"
+        self.output = linear.tanh() | scope
+
+    @property
+    def name(self) -> str:
+        return str(self.scope)
 
     def assign(self, *weights: float) -> Assignment:
         w = tuple(weights)
@@ -29,19 +38,65 @@ class Neuron:
     def assign_from(self, weighting: Callable[[], float]) -> Assignment:
         return self.assign(*(weighting() for _ in range(len(self.weights))))
 
+    def parameters(self) -> Tuple[Value, ...]:
+        return self.weights + (self.bias,)
+
 
 class Layer:
-    name: str
+    scope: Scope
     graph: ValueDag
     neurons: Tuple[Neuron, ...]
     outputs: Tuple[Value, ...]
 
-    def __init__(self, name: str, graph: ValueGraph, n: int, inputs: Tuple[Value, ...]) -> None:
+    def __init__(self, name: str | Scope, graph: ValueGraph, n: int, inputs: Tuple[Value, ...]) -> None:
         assert len(inputs) != 0
-        self.name = name
+        self.scope = scope = name if isinstance(name, Scope) else Scope(name)
         self.graph = inputs[0].graph
-        self.neurons = tuple(Neuron(f"{name}.n{k}", graph, inputs) for k in range(n))
+        with graph.bulk():
+            self.neurons = tuple(Neuron(scope / f"n{k}", graph, inputs) for k in range(n))
         self.outputs = tuple(neuron.output for neuron in self.neurons)
 
+    @property
+    def name(self) -> str:
+        return str(self.scope)
+
     def assign_from(self, weighting: Callable[[], float]) -> Assignment:
-        return reduce(lambda a, b: a | b, (neuron.assign_from(weighting) for neuron in self.neurons))
+        return Assignment.merge(self.graph, (neuron.assign_from(weighting) for neuron in self.neurons))
+
+    def parameters(self) -> Tuple[Value, ...]:
+        return tuple(p for neuron in self.neurons for p in neuron.parameters())
+
+
+# A layer of `n` neurons over inputs of `width` entries as a handful of array nodes,
+#     tanh(x @ W + b)
+# for inputs x of shape (width,), or (samples, width) for a batch, where column k of the
+# weights W of shape (width, n) and entry k of the bias b are those of neuron k
+class TensorLayer:
+    scope: Scope
+    graph: ValueDag
+    width: int
+    n: int
+    weights: Value
+    bias: Value
+    output: Value
+
+    def __init__(self, name: str | Scope, graph: ValueGraph, n: int, inputs: Value, width: int) -> None:
+        self.scope = scope = name if isinstance(name, Scope) else Scope(name)
+        self.graph = inputs.graph
+        self.width, self.n = width, n
+        self.weights = graph.tensor((width, n), scope / "weights")
+        self.bias = graph.tensor((n,), scope / "bias")
+        linear = inputs @ self.weights + self.bias | scope / "linear"
+        self.output = linear.tanh() | scope
+
+    @property
+    def name(self) -> str:
+        return str(self.scope)
+
+    # Drawing the weights neuron by neuron, as a Layer does
+    def assign_from(self, weighting: Callable[[], float]) -> BatchAssignment:
+        weights = np.array([[weighting() for _ in range(self.width)] for _ in range(self.n)]).T
+        return BatchAssignment.create(self.graph, {self.weights: weights, self.bias: np.zeros(self.n)})
+
+    def parameters(self) -> Tuple[Value, ...]:
+        return self.weights, self.bias
@@ -0,0 +1,128 @@
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Literal, Optional, TypeAlias
+
+from typing_extensions import Self
+
+from .value import ValueDag, ValueNode
+
+Phase: TypeAlias = Literal["forward", "backward"]
+
+
+@dataclass
+class Timing:
+    count: int = 0
+    forward: float = 0
+    backward: float = 0
+
+    def add(self, phase: Phase, seconds: float) -> None:
+        if phase == "forward":
+            self.count += 1
+            self.forward += seconds
+        else:
+            self.backward += seconds
+
+    def total(self) -> float:
+        return self.forward + self.backward
+
+
+# Where evaluation time goes, by operator type and by label prefix, where the prefix
+# keeps the first `depth` dotted components of the labels, so with 2, every node of
+# a Neuron labeled `layer.n3` is counted under `layer.n3`. Unlabeled nodes are counted
+# under the empty prefix.
+@dataclass
+class Profile:
+    depth: int = 2
+    operators: dict[str, Timing] = field(default_factory=dict)
+    prefixes: dict[str, Timing] = field(default_factory=dict)
+
+    def prefix(self, label: Optional[str]) -> str:
+        return "" if label is None else ".".join(label.split(".")[: self.depth])
+
+    def record(self, phase: Phase, node: ValueNode, seconds: float) -> None:
+        operator = type(node.data).__name__
+        timing = self.operators.get(operator)
+        if timing is None:
+            timing = self.operators[operator] = Timing()
+        timing.add(phase, seconds)
+
+        prefix = self.prefix(node.label())
+        timing = self.prefixes.get(prefix)
+        if timing is None:
+            timing = self.prefixes[prefix] = Timing()
+        timing.add(phase, seconds)
+
+    def as_dict(self) -> dict[str, dict[str, dict[str, float]]]:
+        return {
+            "operators": {k: vars(t).copy() for k, t in self.operators.items()},
+            "prefixes": {k: vars(t).copy() for k, t in self.prefixes.items()},
+        }
+
+    def report(self) -> str:
+        lines: list[str] = []
+        for title, table in (("operator", self.operators), ("prefix", self.prefixes)):
+            lines.append(f"{title:<24} {'count':>8} {'forward ms':>12} {'backward ms':>12} {'total ms':>12}")
+            for name, t in sorted(table.items(), key=lambda item: item[1].total(), reverse=True):
+                lines.append(
+                    f"{name or '(unlabeled)':<24} {t.count:>8} "
+                    f"{1e3 * t.forward:>12.3f} {1e3 * t.backward:>12.3f} {1e3 * t.total():>12.3f}"
+                )
+            lines.append("")
+        return "\n".join(lines)
+
+
+# The shape of a graph: its nodes by operator type, its depth (the longest path from an
+# entry) and width (the most nodes at any one depth), and the distribution of fan-in
+# (operand counts) and fan-out (consumer counts) over its nodes
+@dataclass(frozen=True)
+class GraphStatistics:
+    nodes: int
+    roots: int
+    entries: int
+    depth: int
+    width: int
+    operators: dict[str, int]
+    fan_in: dict[int, int]
+    fan_out: dict[int, int]
+
+    @classmethod
+    def of(cls, dag: ValueDag) -> Self:
+        depths: dict[int, int] = {}
+        fan_out: Counter[int] = Counter()
+        operators: Counter[str] = Counter()
+        fan_in: Counter[int] = Counter()
+        for node in dag.topological():
+            depths[node.ident] = max((depths[p.ident] + 1 for p in node.pred), default=0)
+            fan_out.update(p.ident for p in node.pred)
+            operators[type(node.data).__name__] += 1
+            fan_in[len(node.pred)] += 1
+        levels = Counter(depths.values())
+        return cls(
+            nodes=len(depths),
+            roots=sum(1 for _ in dag.roots()),
+            entries=sum(1 for _ in dag.entries()),
+            depth=max(levels, default=0),
+            width=max(levels.values(), default=0),
+            operators=dict(operators.most_common()),
+            fan_in=dict(sorted(fan_in.items())),
+            fan_out=dict(sorted(Counter(fan_out.get(n, 0) for n in depths).items())),
+        )
+
+    def as_dict(self) -> dict[str, object]:
+        return vars(self).copy()
+
+    def report(self) -> str:
+        lines = [
+            f"nodes    {self.nodes}",
+            f"roots    {self.roots}",
+            f"entries  {self.entries}",
+            f"depth    {self.depth}",
+            f"width    {self.width}",
+            "operators",
+            *(f"  {name:<10} {count}" for name, count in self.operators.items()),
+            "fan-in",
+            *(f"  {k:<10} {count}" for k, count in self.fan_in.items()),
+            "fan-out",
+            *(f"  {k:<10} {count}" for k, count in self.fan_out.items()),
+        ]
+        return "\n".join(lines)
@@ -0,0 +1,51 @@
+from dataclasses import dataclass
+from typing import Callable, Generic, Iterable, Mapping, TypeVar
+
+from .graph import Dag, DagNode
+
+D = TypeVar("D")
+X = TypeVar("X")
+
+
+# The result of rewriting a graph into a new one, where every node of the source
+# is mapped to the node of the new graph that stands for it
+@dataclass(frozen=True)
+class Rewrite(Generic[D]):
+    source: Dag[D]
+    graph: Dag[D]
+    mapping: dict[int, DagNode[D]]
+
+    def node(self, node: DagNode[D]) -> DagNode[D]:
+        return self.mapping[node.ident]
+
+    # The rewrite of the source by this rewrite followed by `then`, keeping only the nodes surviving both
+    def compose(self, then: "Rewrite[D]") -> "Rewrite[D]":
+        assert then.source is self.graph
+        mapping = {s: then.mapping[n.ident] for s, n in self.mapping.items() if n.ident in then.mapping}
+        return Rewrite(self.source, then.graph, mapping)
+
+    # Carry anything keyed by the identities of source nodes (e.g. assigned values) over to the new graph
+    def translate(self, table: Mapping[int, X]) -> dict[int, X]:
+        return {self.mapping[ident].ident: x for ident, x in table.items()}
+
+
+# Rebuild the graph with hash consing, so that structurally identical sub-expressions
+# become a single node. Merged nodes keep the first label found among them.
+def eliminate_common_subexpressions(dag: Dag[D]) -> Rewrite[D]:
+    graph: Dag[D] = Dag(hash_cons=True)
+    mapping: dict[int, DagNode[D]] = {}
+    for node in dag.topological():
+        mapping[node.ident] = graph.node(node.data, *(mapping[p.ident] for p in node.pred), label=node.label())
+    graph.hash_cons = dag.hash_cons
+    return Rewrite(dag, graph, mapping)
+
+
+# Copy only the given roots, the nodes to `keep` regardless, and what they depend on
+def prune(dag: Dag[D], roots: Iterable[DagNode[D]], keep: Callable[[DagNode[D]], bool]) -> Rewrite[D]:
+    live = dag.ancestors([*roots, *(node for node in dag.nodes() if keep(node))])
+    graph: Dag[D] = Dag(hash_cons=dag.hash_cons)
+    mapping: dict[int, DagNode[D]] = {}
+    for node in dag.topological():
+        if node.ident in live:
+            mapping[node.ident] = graph.node(node.data, *(mapping[p.ident] for p in node.pred), label=node.label())
+    return Rewrite(dag, graph, mapping)
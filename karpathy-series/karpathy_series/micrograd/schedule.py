@@ -0,0 +1,186 @@
+from dataclasses import dataclass
+from typing import Sequence, Tuple, TypeAlias
+from weakref import WeakKeyDictionary
+
+import numpy as np
+from numpy.typing import NDArray
+from typing_extensions import Self
+
+from .assignment import Assignment
+from .calculation import GraphValuation
+from .tape import OpCode, Tape
+from .valuation import FloatArray, Valuation
+from .value import ValueDag
+
+IndexArray: TypeAlias = NDArray[np.int64]
+
+
+# A group of nodes with the same op code and arity at the same depth, which can be
+# evaluated together since none of them depends on another
+@dataclass(frozen=True)
+class Kernel:
+    code: OpCode
+    slots: IndexArray
+    operands: IndexArray
+    params: FloatArray
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def forward(self, values: FloatArray) -> None:
+        match self.code:
+            case OpCode.SUM:
+                values[self.slots] = values[self.operands].sum(axis=1) + self.params
+            case OpCode.PROD:
+                values[self.slots] = values[self.operands].prod(axis=1) * self.params
+            case OpCode.POW:
+                values[self.slots] = np.power(values[self.operands[:, 0]], self.params)
+            case OpCode.TANH:
+                values[self.slots] = np.tanh(values[self.operands[:, 0]])
+            case OpCode.EXP:
+                values[self.slots] = np.exp(values[self.operands[:, 0]])
+            case OpCode.AFFINE:
+                operands = values[self.operands]
+                start = operands.shape[1] % 2
+                pairs = operands[:, start::2] * operands[:, start + 1 :: 2]
+                values[self.slots] = self.params + operands[:, :start].sum(axis=1) + pairs.sum(axis=1)
+
+    def backward(self, values: FloatArray, gradients: FloatArray) -> None:
+        if self.operands.shape[1] == 0:
+            return
+
+        head = gradients[self.slots]
+        match self.code:
+            case OpCode.SUM:
+                np.add.at(gradients, self.operands, head[:, None])
+            case OpCode.PROD:
+                # Products of the other positions from exclusive prefix and suffix products,
+                # which stay correct when an operand vanishes
+                operands = values[self.operands]
+                ones = np.ones((len(self), 1))
+                prefix = np.cumprod(np.hstack([ones, operands[:, :-1]]), axis=1)
+                suffix = np.cumprod(np.hstack([ones, operands[:, :0:-1]]), axis=1)[:, ::-1]
+                others = prefix * suffix * self.params[:, None]
+                np.add.at(gradients, self.operands, head[:, None] * others)
+            case OpCode.POW:
+                operand = values[self.operands[:, 0]]
+                active = self.params != 0
+                derivative = np.zeros_like(operand)
+                derivative[active] = self.params[active] * np.power(operand[active], self.params[active] - 1)
+                np.add.at(gradients, self.operands[:, 0], head * derivative)
+            case OpCode.TANH:
+                result = values[self.slots]
+                np.add.at(gradients, self.operands[:, 0], head * (1 - result**2))
+            case OpCode.EXP:
+                np.add.at(gradients, self.operands[:, 0], head * values[self.slots])
+            case OpCode.AFFINE:
+                operands = values[self.operands]
+                start = operands.shape[1] % 2
+                derivatives = np.ones_like(operands)
+                derivatives[:, start::2] = operands[:, start + 1 :: 2]
+                derivatives[:, start + 1 :: 2] = operands[:, start::2]
+                np.add.at(gradients, self.operands, head[:, None] * derivatives)
+
+
+# A tape partitioned into levels of nodes at the same depth, where the depth of a node
+# is one more than the deepest of its operands and variables sit at depth zero, so that
+# operators without operands (constants) make up the first level along with others
+@dataclass(frozen=True)
+class Schedule:
+    tape: Tape
+    levels: Tuple[Tuple[Kernel, ...], ...]
+    roots: IndexArray
+
+    @staticmethod
+    def depths(tape: Tape) -> Sequence[int]:
+        depths = [0] * len(tape)
+        offsets, operands = tape.offsets, tape.operands
+        for slot in range(len(tape)):
+            if tape.codes[slot] != OpCode.VARIABLE:
+                start, end = offsets[slot], offsets[slot + 1]
+                depths[slot] = 1 + max((depths[operands[k]] for k in range(start, end)), default=0)
+        return depths
+
+    @classmethod
+    def of(cls, tape: Tape) -> Self:
+        groups: dict[Tuple[int, int, int], list[int]] = {}
+        depths = cls.depths(tape)
+        for slot, depth in enumerate(depths):
+            code = tape.codes[slot]
+            if code != OpCode.VARIABLE:
+                arity = tape.offsets[slot + 1] - tape.offsets[slot]
+                groups.setdefault((depth, code, arity), []).append(slot)
+
+        levels: list[list[Kernel]] = [[] for _ in range(max(depths, default=0))]
+        for (depth, code, arity), slots in sorted(groups.items()):
+            operands = [tape.operands[tape.offsets[s] : tape.offsets[s] + arity] for s in slots]
+            levels[depth - 1].append(
+                Kernel(
+                    OpCode(code),
+                    np.array(slots, dtype=np.int64),
+                    np.array(operands, dtype=np.int64).reshape(len(slots), arity),
+                    np.array([tape.params[s] for s in slots], dtype=np.float64),
+                )
+            )
+        return cls(tape, tuple(tuple(level) for level in levels), np.array(tape.roots, dtype=np.int64))
+
+    @classmethod
+    def compile(cls, graph: ValueDag) -> "Schedule":
+        tape = Tape.compile(graph)
+        schedule = _schedules.get(graph)
+        if schedule is None or schedule.tape is not tape:
+            schedule = cls.of(tape)
+            _schedules[graph] = schedule
+        return schedule
+
+
+_schedules: WeakKeyDictionary[ValueDag, Schedule] = WeakKeyDictionary()
+
+
+# Runs a schedule level by level, one vectorized kernel per group of nodes
+@dataclass(frozen=True)
+class LevelValuation:
+    schedule: Schedule
+    values: FloatArray
+    gradients: FloatArray
+
+    def forward(self) -> None:
+        for level in self.schedule.levels:
+            for kernel in level:
+                kernel.forward(self.values)
+
+    def backward(self) -> None:
+        self.gradients[self.schedule.roots] = 1
+        for level in reversed(self.schedule.levels):
+            for kernel in level:
+                kernel.backward(self.values, self.gradients)
+
+    def valuation(self, ident: int) -> Valuation:
+        slot = self.schedule.tape.slot(ident)
+        return Valuation(float(self.values[slot]), float(self.gradients[slot]))
+
+    def graph_valuation(self, assignment: Assignment) -> GraphValuation:
+        return GraphValuation(
+            assignment,
+            {
+                ident: Valuation(float(v), float(g))
+                for ident, v, g in zip(self.schedule.tape.idents, self.values, self.gradients)
+            },
+        )
+
+    @classmethod
+    def initialize(cls, assignment: Assignment) -> Self:
+        schedule = Schedule.compile(assignment.graph)
+        size = len(schedule.tape)
+        values = np.zeros(size)
+        slots = schedule.tape.slots
+        for ident, value in assignment.assigned.items():
+            values[slots[ident]] = value
+        return cls(schedule, values, np.zeros(size))
+
+    @classmethod
+    def run(cls, assignment: Assignment) -> Self:
+        lv = cls.initialize(assignment)
+        lv.forward()
+        lv.backward()
+        return lv
@@ -0,0 +1,236 @@
+import mmap
+import struct
+import sys
+from array import array
+from pathlib import Path
+from types import TracebackType
+from typing import BinaryIO, Iterable, Literal, Mapping, Optional, Sequence, Tuple, Type, TypeAlias
+
+from typing_extensions import Self
+
+from .calculation import GraphValuation
+from .compact import CompactDag
+from .tape import Tape, TapeValuation
+from .value import ValueDag
+
+MAGIC = b"MGRD"
+VERSION = 1
+
+# Magic, version, then the number of nodes, operands, roots and labels, the length of
+# the label text, and flags, padded so the sections that follow stay aligned. Numbers
+# are little-endian throughout, in the header as in the sections.
+_HEADER = struct.Struct("<4sIQQQQQB7x")
+_HAS_VALUATION = 1
+
+ItemCode: TypeAlias = Literal["q", "d", "B"]
+
+
+# The layout of a graph file, after the header, as (name, type code, length) in order.
+# Sections of 8-byte items come first so each section is aligned within the file.
+def _layout(
+    nodes: int, operands: int, roots: int, labels: int, text: int, valuation: bool
+) -> list[Tuple[str, ItemCode, int]]:
+    layout: list[Tuple[str, ItemCode, int]] = [
+        ("idents", "q", nodes),
+        ("params", "d", nodes),
+        ("offsets", "q", nodes + 1),
+        ("operands", "q", operands),
+        ("roots", "q", roots),
+        ("label_slots", "q", labels),
+        ("label_offsets", "q", labels + 1),
+    ]
+    if valuation:
+        layout += [("values", "d", nodes), ("gradients", "d", nodes)]
+    return layout + [("codes", "B", nodes), ("text", "B", text)]
+
+
+def _encode(code: ItemCode, items: Iterable[int] | Iterable[float]) -> bytes:
+    encoded = array(code, items)
+    if sys.byteorder == "big":
+        encoded.byteswap()
+    return encoded.tobytes()
+
+
+# A section as stored, which on big-endian hosts is copied out of the file in host order
+def _decode(code: ItemCode, stored: memoryview) -> memoryview:
+    if sys.byteorder == "little":
+        return stored
+    decoded = array(code, stored.tobytes())
+    decoded.byteswap()
+    return memoryview(decoded.tobytes())
+
+
+def write(stream: BinaryIO, graph: ValueDag, valuation: Optional[TapeValuation | GraphValuation] = None) -> None:
+    """
+    Write a graph as its tape, along with its labels and optionally a valuation
+    of it. Nodes are stored by slot, and their original identities are kept.
+    """
+    # Compact graphs are already laid out as a tape
+    tape = graph.tape() if isinstance(graph, CompactDag) else Tape.compile(graph)
+    identities = graph.identities
+    labeled = [(slot, name) for slot, ident in enumerate(tape.idents) if (name := identities.label(ident)) is not None]
+    encoded = [label.encode() for _, label in labeled]
+    label_offsets = [0]
+    for text in encoded:
+        label_offsets.append(label_offsets[-1] + len(text))
+
+    sections: dict[str, bytes] = {
+        "idents": _encode("q", tape.idents),
+        "params": _encode("d", tape.params),
+        "offsets": _encode("q", tape.offsets),
+        "operands": _encode("q", tape.operands),
+        "roots": _encode("q", tape.roots),
+        "label_slots": _encode("q", (slot for slot, _ in labeled)),
+        "label_offsets": _encode("q", label_offsets),
+        "codes": _encode("B", tape.codes),
+        "text": b"".join(encoded),
+    }
+    if isinstance(valuation, TapeValuation):
+        assert valuation.tape.revision == tape.revision and len(valuation.values) == len(tape)
+        sections["values"] = _encode("d", valuation.values)
+        sections["gradients"] = _encode("d", valuation.gradients)
+    elif isinstance(valuation, GraphValuation):
+        assigned = valuation.assigned
+        sections["values"] = _encode("d", (assigned[n].value for n in tape.idents))
+        sections["gradients"] = _encode("d", (assigned[n].gradient for n in tape.idents))
+
+    stream.write(
+        _HEADER.pack(
+            MAGIC,
+            VERSION,
+            len(tape),
+            len(tape.operands),
+            len(tape.roots),
+            len(labeled),
+            len(sections["text"]),
+            _HAS_VALUATION if valuation is not None else 0,
+        )
+    )
+    for name, _, _ in _layout(0, 0, 0, 0, 0, valuation is not None):
+        stream.write(sections[name])
+
+
+def save(path: Path, graph: ValueDag, valuation: Optional[TapeValuation | GraphValuation] = None) -> None:
+    with path.open("wb") as stream:
+        write(stream, graph, valuation)
+
+
+# A graph file mapped into memory. The arrays are views of the mapped file on little-endian
+# hosts, so opening it costs nothing per node, and nodes are only created through the graph rebuilt from
+# it, which copies the arrays without creating any node either.
+class Stored:
+    path: Path
+    # The sections of integers and of floats
+    sections: "dict[str, memoryview[int]]"
+    floats: "dict[str, memoryview[float]]"
+    _file: BinaryIO
+    _map: mmap.mmap
+    _view: memoryview
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._file = path.open("rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.sections, self.floats = {}, {}
+        view = self._view = memoryview(self._map)
+        if len(view) < _HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is not a graph file")
+        magic, version, nodes, operands, roots, labels, text, flags = _HEADER.unpack_from(view)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a graph file")
+        if version != VERSION:
+            self.close()
+            raise ValueError(f"{path} has format version {version}, expected {VERSION}")
+
+        position = _HEADER.size
+        for name, code, length in _layout(nodes, operands, roots, labels, text, flags & _HAS_VALUATION != 0):
+            end = position + length * struct.calcsize(code)
+            if end > len(view):
+                self.close()
+                raise ValueError(f"{path} is truncated")
+            stored = _decode(code, view[position:end])
+            if code == "d":
+                self.floats[name] = stored.cast(code)
+            else:
+                self.sections[name] = stored.cast(code)
+            position = end
+
+    def __len__(self) -> int:
+        return len(self.sections["codes"])
+
+    def has_valuation(self) -> bool:
+        return "values" in self.floats
+
+    @property
+    def idents(self) -> Sequence[int]:
+        return self.sections["idents"]
+
+    @property
+    def values(self) -> Sequence[float]:
+        return self.floats["values"]
+
+    @property
+    def gradients(self) -> Sequence[float]:
+        return self.floats["gradients"]
+
+    def labels(self) -> Mapping[int, str]:
+        slots, offsets, text = self.sections["label_slots"], self.sections["label_offsets"], self.sections["text"]
+        return {slot: bytes(text[offsets[k] : offsets[k + 1]]).decode() for k, slot in enumerate(slots)}
+
+    # The stored tape, reading the mapped arrays, with slots as identities. It is only
+    # valid while the file is open, and should be let go of before closing it.
+    def tape(self) -> Tape:
+        s = self.sections
+        return Tape(
+            (len(self), len(self), 0),
+            range(len(self)),
+            s["codes"],
+            self.floats["params"],
+            s["offsets"],
+            s["operands"],
+            s["roots"],
+        )
+
+    def graph(self) -> CompactDag:
+        """
+        Rebuild the graph, where the node in slot `s` has identity `s`, and its
+        original identity is `idents[s]`. The graph comes with its tape compiled.
+        """
+        s = self.sections
+        graph = CompactDag.of_arrays(
+            s["codes"], self.floats["params"], s["offsets"], s["operands"], s["roots"], self.labels()
+        )
+        graph.tape().attach(graph)
+        return graph
+
+    # The stored valuation, copied out of the file, for the graph rebuilt from it
+    def valuation(self, graph: CompactDag) -> TapeValuation:
+        assert self.has_valuation() and graph.size() == len(self)
+        return TapeValuation(Tape.compile(graph), list(self.values), list(self.gradients))
+
+    def close(self) -> None:
+        for section in self.sections.values():
+            section.release()
+        for floats in self.floats.values():
+            floats.release()
+        self.sections, self.floats = {}, {}
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+
+def load(path: Path) -> Stored:
+    return Stored(path)
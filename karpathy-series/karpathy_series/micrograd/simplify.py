@@ -0,0 +1,172 @@
+from collections import Counter
+from typing import Iterable, Optional, Sequence, Tuple
+
+from .rewrite import Rewrite, prune
+from .valuation import Valuation
+from .value import ValueDag, ValueNode
+from .value_type import Operator, Pow, Prod, Sum, ValueType, Variable
+
+
+# Constants are represented as sums without operands, i.e. only a bias
+def constant(node: ValueNode) -> Optional[float]:
+    match node.data:
+        case Sum(bias) if len(node.pred) == 0:
+            return bias
+        case Prod(coefficient) if len(node.pred) == 0:
+            return coefficient
+    return None
+
+
+def _base(node: ValueNode) -> Tuple[ValueNode, float]:
+    match node.data:
+        case Pow(exponent):
+            return node.pred[0], exponent
+    return node, 1
+
+
+# A single bottom-up pass of the local rewrites, building a new graph from the source
+class _Pass:
+    source: ValueDag
+    graph: ValueDag
+    mapping: dict[int, ValueNode]
+    # Source nodes referenced by exactly one operand position
+    single: frozenset[int]
+    # New nodes built for exactly one source node, which may be merged into its consumer
+    owner: dict[int, int]
+
+    def __init__(self, source: ValueDag) -> None:
+        self.source = source
+        self.graph = ValueDag(hash_cons=source.hash_cons)
+        self.mapping = {}
+        uses = Counter(p.ident for n in source.nodes() for p in n.pred)
+        self.single = frozenset(n for n, k in uses.items() if k == 1)
+        self.owner = {}
+
+    def run(self) -> Rewrite[ValueType]:
+        for node in self.source.topological():
+            self.mapping[node.ident] = self.rewrite(node)
+        return Rewrite(self.source, self.graph, self.mapping)
+
+    def fresh(self, source: ValueNode, data: ValueType, *pred: ValueNode) -> ValueNode:
+        node = self.graph.node(data, *pred, label=source.label())
+        self.owner[node.ident] = source.ident
+        return node
+
+    def alias(self, source: ValueNode, node: ValueNode) -> ValueNode:
+        label = source.label()
+        if label is not None and node.label() is None:
+            _ = node.set_label(label)
+        return node
+
+    def mergeable(self, source_pred: ValueNode, pred: ValueNode) -> bool:
+        return source_pred.ident in self.single and self.owner.get(pred.ident) == source_pred.ident
+
+    def rewrite(self, node: ValueNode) -> ValueNode:
+        pred = tuple(self.mapping[p.ident] for p in node.pred)
+        match node.data:
+            case Variable():
+                return self.fresh(node, node.data)
+            case Operator() as op if len(pred) != 0 and all(constant(p) is not None for p in pred):
+                folded = op.forward(tuple(Valuation(constant(p) or 0) for p in pred))
+                return self.fresh(node, Sum(folded.value))
+            case Sum(bias):
+                return self.sum(node, bias, pred)
+            case Prod(coefficient):
+                return self.prod(node, coefficient, pred)
+            case Pow(exponent) if exponent == 1:
+                return self.alias(node, pred[0])
+            case Pow(exponent) if exponent == 0:
+                return self.fresh(node, Sum(1))
+        return self.fresh(node, node.data, *pred)
+
+    def sum(self, node: ValueNode, bias: float, pred: Sequence[ValueNode]) -> ValueNode:
+        operands: list[ValueNode] = []
+        for source_pred, p in zip(node.pred, pred):
+            c = constant(p)
+            if c is not None:
+                bias += c
+            elif isinstance(p.data, Sum) and self.mergeable(source_pred, p):
+                bias += p.data.bias
+                operands.extend(p.pred)
+            else:
+                operands.append(p)
+
+        if len(operands) == 1 and bias == 0:
+            return self.alias(node, operands[0])
+        return self.fresh(node, Sum(bias), *operands)
+
+    def prod(self, node: ValueNode, coefficient: float, pred: Sequence[ValueNode]) -> ValueNode:
+        operands: list[ValueNode] = []
+        for source_pred, p in zip(node.pred, pred):
+            c = constant(p)
+            if c is not None:
+                coefficient *= c
+            elif isinstance(p.data, Prod) and self.mergeable(source_pred, p):
+                coefficient *= p.data.coefficient
+                operands.extend(p.pred)
+            else:
+                operands.append(p)
+
+        if coefficient == 0:
+            return self.fresh(node, Sum(0))
+
+        operands = self.combine_powers(operands)
+        if len(operands) == 0:
+            return self.fresh(node, Sum(coefficient))
+        if len(operands) == 1 and coefficient == 1:
+            return self.alias(node, operands[0])
+        return self.fresh(node, Prod(coefficient), *operands)
+
+    def combine_powers(self, operands: Sequence[ValueNode]) -> list[ValueNode]:
+        """
+        Collect the factors of a product by base, so that for instance
+            x * x^-1 = 1
+            x^2 * x^-1 = x
+        assuming every base is non-zero where the product is evaluated
+        """
+        exponents: dict[int, float] = {}
+        bases: dict[int, ValueNode] = {}
+        for operand in operands:
+            base, exponent = _base(operand)
+            bases[base.ident] = base
+            exponents[base.ident] = exponents.get(base.ident, 0) + exponent
+        if len(bases) == len(operands):
+            return list(operands)
+
+        combined: list[ValueNode] = []
+        for ident, exponent in exponents.items():
+            if exponent == 1:
+                combined.append(bases[ident])
+            elif exponent != 0:
+                combined.append(self.graph.node(Pow(exponent), bases[ident]))
+        return combined
+
+
+def simplify(dag: ValueDag, passes: int = 8, roots: Optional[Iterable[ValueNode]] = None) -> Rewrite[ValueType]:
+    """
+    Rewrite the graph into an equivalent smaller one by flattening nested sums
+    and products, folding constants into biases and coefficients, combining the
+    powers of a common base within products, and eliminating identities such as
+        Sum(0)(x) = Prod(1)(x) = Pow(1)(x) = x
+    Each pass drops the nodes no longer contributing to the roots, which can
+    be given in place of those of the graph, e.g. to keep gradients built
+    aside from them, and passes are repeated until the graph stops shrinking. Variables always survive,
+    so assignments carry over through `Rewrite.translate`, and surviving nodes
+    keep their labels.
+    """
+    rewrite = _step(dag, dag.roots() if roots is None else roots)
+    for _ in range(passes - 1):
+        step = _step(rewrite.graph, rewrite.graph.roots())
+        if step.graph.size() >= rewrite.graph.size():
+            break
+        rewrite = rewrite.compose(step)
+    return rewrite
+
+
+def _step(dag: ValueDag, roots: Iterable[ValueNode]) -> Rewrite[ValueType]:
+    rewrite = _Pass(dag).run()
+    return rewrite.compose(prune(rewrite.graph, (rewrite.node(r) for r in roots), _is_variable))
+
+
+def _is_variable(node: ValueNode) -> bool:
+    return isinstance(node.data, Variable)
@@ -0,0 +1,116 @@
+from typing import Callable, Iterable, Iterator, Mapping, Optional, Tuple, override
+
+import numpy as np
+from numpy.typing import ArrayLike
+from typing_extensions import Self
+
+from .assignment import Assignment
+from .calculation import GraphValuation
+from .tape import TapeValuation
+from .valuation import FloatArray
+from .value import Value, ValueDag, ValueGraph
+from .value_type import Variable
+
+
+# The values of some variables of a graph held in a single contiguous array, with a slot
+# per variable. It is a mapping from identities to values, so it can be handed to an
+# Assignment as is, which then sees any update made in place, e.g. a gradient step
+#     store -= rate * store.gradients(valuation)
+class ParameterStore(Mapping[int, float]):
+    graph: ValueDag
+    idents: Tuple[int, ...]
+    slots: dict[int, int]
+    data: FloatArray
+
+    def __init__(self, graph: ValueDag, idents: Iterable[int], data: Optional[ArrayLike] = None) -> None:
+        self.graph = graph
+        self.idents = tuple(idents)
+        self.slots = {ident: slot for slot, ident in enumerate(self.idents)}
+        assert len(self.slots) == len(self.idents)
+        self.data = np.zeros(len(self.idents)) if data is None else np.array(data, dtype=np.float64)
+        assert self.data.shape == (len(self.idents),)
+
+    @override
+    def __getitem__(self, ident: int) -> float:
+        return float(self.data[self.slots[ident]])
+
+    @override
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.idents)
+
+    @override
+    def __len__(self) -> int:
+        return len(self.idents)
+
+    def __setitem__(self, ident: int, value: float) -> None:
+        self.data[self.slots[ident]] = value
+
+    def __iadd__(self, delta: ArrayLike) -> Self:
+        self.data += np.asarray(delta, dtype=np.float64)
+        return self
+
+    def __isub__(self, delta: ArrayLike) -> Self:
+        self.data -= np.asarray(delta, dtype=np.float64)
+        return self
+
+    def initialize(self, weighting: Callable[[], float]) -> Self:
+        self.data[:] = np.fromiter((weighting() for _ in self.idents), dtype=np.float64, count=len(self.idents))
+        return self
+
+    def assignment(self, other: Optional[Assignment] = None) -> Assignment:
+        """
+        An assignment reading the parameters from the store without copying them,
+        along with the values of `other` (e.g. the inputs of a sample) if given
+        """
+        if other is None:
+            return Assignment(self.graph, self)
+        assert other.graph == self.graph
+        return Assignment(self.graph, _Overlay(dict(other.assigned), self))
+
+    # The gradients of the stored variables, in the order of their slots
+    def gradients(self, valuation: GraphValuation | TapeValuation) -> FloatArray:
+        if isinstance(valuation, TapeValuation):
+            slots, gradients = valuation.tape.slots, valuation.gradients
+            return np.fromiter((gradients[slots[n]] for n in self.idents), dtype=np.float64, count=len(self))
+        assigned = valuation.assigned
+        return np.fromiter((assigned[n].gradient for n in self.idents), dtype=np.float64, count=len(self))
+
+    @classmethod
+    def create(cls, graph_like: ValueDag | ValueGraph, variables: Optional[Iterable[Value]] = None) -> Self:
+        """
+        A store of zeros for the given variables, which defaults to all the variables
+        of the graph
+        """
+        graph = graph_like.graph if isinstance(graph_like, ValueGraph) else graph_like
+        if variables is None:
+            return cls(graph, (n.ident for n in graph.entries() if isinstance(n.data, Variable)))
+        idents: list[int] = []
+        for v in variables:
+            assert v.graph == graph
+            assert v.node.data == Variable()
+            idents.append(v.node.ident)
+        return cls(graph, idents)
+
+
+# The values of `top` over those of `store`, neither being copied
+class _Overlay(Mapping[int, float]):
+    top: Mapping[int, float]
+    store: ParameterStore
+
+    def __init__(self, top: Mapping[int, float], store: ParameterStore) -> None:
+        self.top = top
+        self.store = store
+
+    @override
+    def __getitem__(self, ident: int) -> float:
+        value = self.top.get(ident)
+        return self.store[ident] if value is None else value
+
+    @override
+    def __iter__(self) -> Iterator[int]:
+        yield from self.top
+        yield from (ident for ident in self.store if ident not in self.top)
+
+    @override
+    def __len__(self) -> int:
+        return len(self.top) + sum(1 for ident in self.store if ident not in self.top)
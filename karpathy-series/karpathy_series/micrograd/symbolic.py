@@ -0,0 +1,103 @@
+from typing import FrozenSet, Optional, Sequence, Tuple
+
+from .value import Value, ValueDag, ValueNode
+from .value_type import Affine, Exp, Pow, Prod, Sum, Tanh, Variable
+
+# A contribution to the gradient of a node, where None stands for the constant 1, which
+# is the gradient of the root itself and what passes through sums from it unchanged
+Term = Optional[ValueNode]
+
+
+# The terms `head * D[x_k]f` for the operands of a node that are `live`, as new nodes of the graph
+def _terms(graph: ValueDag, node: ValueNode, head: Term, live: FrozenSet[int]) -> list[Tuple[ValueNode, Term]]:
+    pred = node.pred
+    scaled = () if head is None else (head,)
+
+    def times(coefficient: float, *factors: ValueNode) -> Term:
+        if len(factors) + len(scaled) == 0:
+            return None if coefficient == 1 else graph.node(Sum(coefficient))
+        if coefficient == 1 and len(factors) + len(scaled) == 1:
+            return factors[0] if head is None else head
+        return graph.node(Prod(coefficient), *scaled, *factors)
+
+    match node.data:
+        case Sum():
+            return [(p, head) for p in pred if p.ident in live]
+        case Prod(coefficient):
+            return [(p, times(coefficient, *pred[:k], *pred[k + 1 :])) for k, p in enumerate(pred) if p.ident in live]
+        case Pow(exponent) if exponent == 0:
+            return []
+        case Pow(exponent) if exponent == 1:
+            return [(pred[0], head)]
+        case Pow(exponent):
+            return [(pred[0], times(exponent, graph.node(Pow(exponent - 1), pred[0])))]
+        case Tanh():
+            # 1 - y^2 with y the result
+            return [(pred[0], times(1, graph.node(Sum(1), graph.node(Prod(-1), node, node))))]
+        case Exp():
+            return [(pred[0], times(1, node))]
+        case Affine():
+            start = Affine.offset(pred)
+            terms = [(p, head) for p in pred[:start] if p.ident in live]
+            for k in range(start, len(pred), 2):
+                a, b = pred[k], pred[k + 1]
+                if a.ident in live:
+                    terms.append((a, times(1, b)))
+                if b.ident in live:
+                    terms.append((b, times(1, a)))
+            return terms
+    raise ValueError(f"Cannot differentiate {node.data!s}")
+
+
+# The sum of the terms, where those standing for 1 are counted into the bias
+def _accumulate(graph: ValueDag, terms: Sequence[Term]) -> Term:
+    nodes = [t for t in terms if t is not None]
+    ones = len(terms) - len(nodes)
+    if ones == 0 and len(nodes) == 1:
+        return nodes[0]
+    if ones == 1 and len(nodes) == 0:
+        return None
+    return graph.node(Sum(ones), *nodes)
+
+
+def grad(root: Value, wrt: Sequence[Value]) -> Tuple[Value, ...]:
+    """
+    Append the gradient of `root` with respect to the variables of `wrt` to the
+    graph, as ordinary nodes built by the chain rule in reverse, so that
+        D[V]f = Sum k: n . D[x_k]f D[V]x_k
+    becomes a Sum over Prod nodes of the derivative rules of each operator. Only
+    the nodes between the root and the variables are differentiated. The
+    gradients are then values of the graph like any other, to be evaluated,
+    simplified or compiled, labeled `d<root>/d<variable>` where both are labeled.
+    They are built aside from the roots of the graph, which stay as they were,
+    so they are evaluated by passing them as roots to what runs the graph.
+    """
+    graph = root.graph
+    assert all(v.graph is graph and isinstance(v.node.data, Variable) for v in wrt)
+    live = graph.ancestors((root.node,)) & graph.descendants(v.node for v in wrt)
+    nodes = [n for n in graph.topological(reverse=True) if n.ident in live]
+    with graph.aside():
+        # The terms of the gradient of each node, complete by the time the node is reached in reverse
+        terms: dict[int, list[Term]] = {root.node.ident: [None]}
+        gradients: dict[int, Term] = {}
+        for node in nodes:
+            head = _accumulate(graph, terms.pop(node.ident, []))
+            gradients[node.ident] = head
+            if isinstance(node.data, Variable):
+                continue
+            for p, term in _terms(graph, node, head, live):
+                terms.setdefault(p.ident, []).append(term)
+
+        results: list[Value] = []
+        for v in wrt:
+            if v.node.ident in gradients:
+                g = gradients[v.node.ident]
+                node = graph.node(Sum(1)) if g is None else g
+            else:
+                node = graph.node(Sum(0))
+            result = Value(graph, node)
+            root_label, label = root.label(), v.label()
+            if root_label is not None and label is not None and node.label() is None:
+                result = result | f"d{root_label}/d{label}"
+            results.append(result)
+        return tuple(results)
@@ -0,0 +1,312 @@
+from array import array
+from dataclasses import dataclass
+from enum import IntEnum
+from functools import cached_property
+from math import exp, pow, tanh
+from typing import Iterable, Mapping, Optional, Sequence, Tuple
+from weakref import WeakKeyDictionary
+
+from typing_extensions import Self
+
+from .assignment import Assignment
+from .calculation import GraphValuation
+from .graph import Revision
+from .valuation import Valuation
+from .value import ValueDag
+from .value_type import Affine, Exp, Pow, Prod, Sum, Tanh, ValueType, Variable
+
+
+class OpCode(IntEnum):
+    VARIABLE = 0
+    SUM = 1
+    PROD = 2
+    POW = 3
+    TANH = 4
+    EXP = 5
+    AFFINE = 6
+
+
+# Plain integers for the interpreter loops, avoiding enum attribute lookups per node
+_VARIABLE, _SUM, _PROD, _POW, _TANH, _EXP, _AFFINE = (int(code) for code in OpCode)
+
+
+# Each value type is lowered to an op code and a single numeric parameter
+def encode(value_type: ValueType) -> Tuple[OpCode, float]:
+    match value_type:
+        case Variable(shape=()):
+            return OpCode.VARIABLE, 0
+        case Sum(bias):
+            return OpCode.SUM, bias
+        case Prod(coefficient):
+            return OpCode.PROD, coefficient
+        case Pow(exponent):
+            return OpCode.POW, exponent
+        case Tanh():
+            return OpCode.TANH, 0
+        case Exp():
+            return OpCode.EXP, 0
+        case Affine(bias):
+            return OpCode.AFFINE, bias
+    raise ValueError(f"Cannot lower {value_type!s} onto a tape")
+
+
+def decode(code: int, param: float) -> ValueType:
+    match OpCode(code):
+        case OpCode.VARIABLE:
+            return Variable()
+        case OpCode.SUM:
+            return Sum(param)
+        case OpCode.PROD:
+            return Prod(param)
+        case OpCode.POW:
+            return Pow(param)
+        case OpCode.TANH:
+            return Tanh()
+        case OpCode.EXP:
+            return Exp()
+        case OpCode.AFFINE:
+            return Affine(param)
+
+
+# A ValueDag lowered into flat arrays indexed by slot, where slots follow the
+# topological order of the graph. The operands of the node in slot `s` are the
+# slots `operands[offsets[s]:offsets[s + 1]]`, which always precede `s`.
+@dataclass(frozen=True)
+class Tape:
+    revision: Revision
+    idents: Sequence[int]
+    codes: Sequence[int]
+    params: Sequence[float]
+    offsets: Sequence[int]
+    operands: Sequence[int]
+    roots: Sequence[int]
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @cached_property
+    def slots(self) -> dict[int, int]:
+        return {ident: slot for slot, ident in enumerate(self.idents)}
+
+    def slot(self, ident: int) -> int:
+        return self.slots[ident]
+
+    @cached_property
+    def successors(self) -> "Successors":
+        return Successors.of(self)
+
+    # All the slots reachable from the given ones through consumers, including themselves, in order
+    def descendants(self, slots: Iterable[int]) -> list[int]:
+        offsets, edges, consumers = self.successors.offsets, self.successors.edges, self.successors.consumers
+        reached = set(slots)
+        frontier = list(reached)
+        while frontier:
+            slot = frontier.pop()
+            for k in range(offsets[slot], offsets[slot + 1]):
+                consumer = consumers[edges[k]]
+                if consumer not in reached:
+                    reached.add(consumer)
+                    frontier.append(consumer)
+        return sorted(reached)
+
+    # All the slots the given ones depend on through operands, excluding themselves unless reached, in order
+    def ancestors(self, slots: Iterable[int]) -> list[int]:
+        offsets, operands = self.offsets, self.operands
+        reached: set[int] = set()
+        frontier = list(slots)
+        while frontier:
+            slot = frontier.pop()
+            for k in range(offsets[slot], offsets[slot + 1]):
+                operand = operands[k]
+                if operand not in reached:
+                    reached.add(operand)
+                    frontier.append(operand)
+        return sorted(reached)
+
+    @classmethod
+    def lower(cls, graph: ValueDag) -> Self:
+        slots: dict[int, int] = {}
+        idents, codes, params = array("q"), array("B"), array("d")
+        offsets, operands = array("q", [0]), array("q")
+        for node in graph.topological():
+            code, param = encode(node.data)
+            slot = len(idents)
+            slots[node.ident] = slot
+            idents.append(node.ident)
+            codes.append(code)
+            params.append(param)
+            for p in node.pred:
+                operand = slots[p.ident]
+                assert operand < slot
+                operands.append(operand)
+            offsets.append(len(operands))
+
+        roots = array("q", sorted(slots[n.ident] for n in graph.roots()))
+        return cls(graph.revision, idents, codes, params, offsets, operands, roots)
+
+    # Makes this the compiled tape of a graph it was not lowered from, but which has the
+    # same nodes in the same slots, such as a graph loaded along with its tape
+    def attach(self, graph: ValueDag) -> None:
+        assert self.revision == graph.revision and len(self) == graph.size()
+        _tapes[graph] = self
+
+    @classmethod
+    def compile(cls, graph: ValueDag) -> "Tape":
+        tape = _tapes.get(graph)
+        if tape is None or tape.revision != graph.revision:
+            tape = cls.lower(graph)
+            _tapes[graph] = tape
+        return tape
+
+
+# The reverse index of a tape's operands. The edges consuming the value in slot `s` are
+# `edges[offsets[s]:offsets[s + 1]]`, where an edge is a position in `Tape.operands`
+# and `consumers` gives the slot owning each such position.
+@dataclass(frozen=True)
+class Successors:
+    offsets: Sequence[int]
+    edges: Sequence[int]
+    consumers: Sequence[int]
+
+    @classmethod
+    def of(cls, tape: Tape) -> Self:
+        counts = [0] * (len(tape) + 1)
+        for operand in tape.operands:
+            counts[operand + 1] += 1
+        offsets = array("q", counts)
+        for slot in range(len(tape)):
+            offsets[slot + 1] += offsets[slot]
+
+        fill = array("q", offsets[:-1])
+        edges = array("q", bytes(8 * len(tape.operands)))
+        consumers = array("q", bytes(8 * len(tape.operands)))
+        for slot in range(len(tape)):
+            for k in range(tape.offsets[slot], tape.offsets[slot + 1]):
+                consumers[k] = slot
+                operand = tape.operands[k]
+                edges[fill[operand]] = k
+                fill[operand] += 1
+        return cls(offsets, edges, consumers)
+
+
+# Lowering is only repeated when the graph has changed since it was last compiled
+_tapes: WeakKeyDictionary[ValueDag, Tape] = WeakKeyDictionary()
+
+
+# Runs a compiled tape over contiguous value and gradient buffers
+@dataclass(frozen=True)
+class TapeValuation:
+    tape: Tape
+    values: list[float]
+    gradients: list[float]
+
+    # Evaluates the given slots in order, which defaults to the whole tape
+    def forward(self, slots: Optional[Iterable[int]] = None) -> None:
+        codes, params, offsets, operands = self.tape.codes, self.tape.params, self.tape.offsets, self.tape.operands
+        values = self.values
+        for slot in range(len(codes)) if slots is None else slots:
+            code = codes[slot]
+            if code == _VARIABLE:
+                continue
+            start, end = offsets[slot], offsets[slot + 1]
+            if code == _SUM:
+                acc = params[slot]
+                for k in range(start, end):
+                    acc += values[operands[k]]
+                values[slot] = acc
+            elif code == _PROD:
+                acc = params[slot]
+                for k in range(start, end):
+                    acc *= values[operands[k]]
+                values[slot] = acc
+            elif code == _POW:
+                values[slot] = pow(values[operands[start]], params[slot])
+            elif code == _TANH:
+                values[slot] = tanh(values[operands[start]])
+            elif code == _EXP:
+                values[slot] = exp(values[operands[start]])
+            elif code == _AFFINE:
+                acc = params[slot]
+                if (end - start) % 2 == 1:
+                    acc += values[operands[start]]
+                    start += 1
+                for k in range(start, end, 2):
+                    acc += values[operands[k]] * values[operands[k + 1]]
+                values[slot] = acc
+
+    def backward(self) -> None:
+        codes, params, offsets, operands = self.tape.codes, self.tape.params, self.tape.offsets, self.tape.operands
+        values, gradients = self.values, self.gradients
+        for root in self.tape.roots:
+            gradients[root] = 1
+        for slot in range(len(codes) - 1, -1, -1):
+            code = codes[slot]
+            head = gradients[slot]
+            if code == _VARIABLE or head == 0:
+                continue
+            start, end = offsets[slot], offsets[slot + 1]
+            if code == _SUM:
+                for k in range(start, end):
+                    gradients[operands[k]] += head
+            elif code == _PROD:
+                result = values[slot]
+                for k in range(start, end):
+                    operand = operands[k]
+                    value = values[operand]
+                    if value != 0:
+                        gradients[operand] += head * result / value
+                    else:
+                        # Product of the other operand positions when this one vanishes
+                        others = params[slot]
+                        for j in range(start, end):
+                            if j != k:
+                                others *= values[operands[j]]
+                        gradients[operand] += head * others
+            elif code == _POW:
+                exponent = params[slot]
+                if exponent != 0:
+                    operand = operands[start]
+                    gradients[operand] += head * exponent * values[operand] ** (exponent - 1)
+            elif code == _TANH:
+                result = values[slot]
+                gradients[operands[start]] += head * (1 - result * result)
+            elif code == _EXP:
+                gradients[operands[start]] += head * values[slot]
+            elif code == _AFFINE:
+                if (end - start) % 2 == 1:
+                    gradients[operands[start]] += head
+                    start += 1
+                for k in range(start, end, 2):
+                    a, b = operands[k], operands[k + 1]
+                    gradients[a] += head * values[b]
+                    gradients[b] += head * values[a]
+
+    def valuation(self, ident: int) -> Valuation:
+        slot = self.tape.slot(ident)
+        return Valuation(self.values[slot], self.gradients[slot])
+
+    def graph_valuation(self, assignment: Assignment) -> GraphValuation:
+        return GraphValuation(
+            assignment,
+            {ident: Valuation(v, g) for ident, v, g in zip(self.tape.idents, self.values, self.gradients)},
+        )
+
+    # Starts from the values assigned to node identities, without needing the graph
+    @classmethod
+    def of(cls, tape: Tape, assigned: Mapping[int, float]) -> Self:
+        values = [0.0] * len(tape)
+        slots = tape.slots
+        for ident, value in assigned.items():
+            values[slots[ident]] = value
+        return cls(tape, values, [0.0] * len(tape))
+
+    @classmethod
+    def initialize(cls, assignment: Assignment) -> Self:
+        return cls.of(Tape.compile(assignment.graph), assignment.assigned)
+
+    @classmethod
+    def run(cls, assignment: Assignment) -> Self:
+        tv = cls.initialize(assignment)
+        tv.forward()
+        tv.backward()
+        return tv
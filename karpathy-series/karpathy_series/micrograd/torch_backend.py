@@ -0,0 +1,208 @@
+from dataclasses import dataclass, field
+from typing import Optional, Sequence, Tuple, override
+from weakref import WeakKeyDictionary
+
+import torch
+from typing_extensions import Self
+
+from .assignment import Assignment
+from .calculation import GraphValuation, Plan
+from .profiling import Profile
+from .tape import OpCode, Tape
+from .valuation import Valuation
+from .value import ValueDag
+
+
+# Nodes of a level with the same op code and number of operands, evaluated as one torch
+# operation on the matrix of their operands, with a row per node. The operands are
+# gathered from each of the earlier levels they lie in, then put back in order.
+@dataclass(frozen=True)
+class _Group:
+    code: int
+    arity: int
+    params: torch.Tensor
+    sources: Tuple[Tuple[int, torch.Tensor], ...]
+    order: Optional[torch.Tensor]
+
+    def operands(self, levels: Sequence[torch.Tensor]) -> torch.Tensor:
+        n = len(self.params)
+        if self.arity == 0:
+            return self.params.new_zeros((n, 0))
+        gathered = torch.cat([levels[level][index] for level, index in self.sources])
+        if self.order is not None:
+            gathered = gathered[self.order]
+        return gathered.view(n, self.arity)
+
+    def evaluate(self, levels: Sequence[torch.Tensor]) -> torch.Tensor:
+        x = self.operands(levels)
+        match OpCode(self.code):
+            case OpCode.SUM:
+                return x.sum(dim=1) + self.params
+            case OpCode.PROD:
+                return x.prod(dim=1) * self.params
+            case OpCode.POW:
+                return torch.pow(x[:, 0], self.params)
+            case OpCode.TANH:
+                return torch.tanh(x[:, 0])
+            case OpCode.EXP:
+                return torch.exp(x[:, 0])
+            case OpCode.AFFINE:
+                start = self.arity % 2
+                return x[:, :start].sum(dim=1) + (x[:, start::2] * x[:, start + 1 :: 2]).sum(dim=1) + self.params
+        raise ValueError(f"Cannot evaluate op code {self.code} in torch")
+
+
+# A tape laid out by levels, where the variables make up the first level, and each
+# node lies in the level after the last of its operands
+@dataclass(frozen=True)
+class TorchProgram:
+    tape: Tape
+    variables: torch.Tensor
+    levels: Tuple[Tuple[_Group, ...], ...]
+    # The position of each slot in the concatenation of the levels
+    positions: torch.Tensor
+    roots: torch.Tensor
+
+    @classmethod
+    def of(cls, tape: Tape) -> Self:
+        codes, offsets, operands = tape.codes, tape.offsets, tape.operands
+        depth = [0] * len(tape)
+        where: list[Tuple[int, int]] = [(0, 0)] * len(tape)
+        variables: list[int] = []
+        grouped: list[dict[Tuple[int, int], list[int]]] = [{}]
+        for slot in range(len(tape)):
+            start, end = offsets[slot], offsets[slot + 1]
+            if codes[slot] == OpCode.VARIABLE:
+                where[slot] = (0, len(variables))
+                variables.append(slot)
+                continue
+            level = depth[slot] = 1 + max((depth[operands[k]] for k in range(start, end)), default=0)
+            if level == len(grouped):
+                grouped.append({})
+            grouped[level].setdefault((codes[slot], end - start), []).append(slot)
+
+        # Slots are placed in a level group by group
+        for level, groups in enumerate(grouped[1:], 1):
+            position = 0
+            for slots in groups.values():
+                for slot in slots:
+                    where[slot] = (level, position)
+                    position += 1
+
+        levels: list[Tuple[_Group, ...]] = []
+        for groups in grouped[1:]:
+            built: list[_Group] = []
+            for (code, arity), slots in groups.items():
+                refs = [where[operands[k]] for slot in slots for k in range(offsets[slot], offsets[slot + 1])]
+                sources: dict[int, list[int]] = {}
+                for level, position in refs:
+                    sources.setdefault(level, []).append(position)
+                # The gathered operands come level by level, in order within each
+                gathered = sorted(range(len(refs)), key=lambda k: refs[k][0])
+                order = torch.empty(len(refs), dtype=torch.long)
+                order[torch.tensor(gathered, dtype=torch.long)] = torch.arange(len(refs))
+                in_order = len(sources) <= 1
+                built.append(
+                    _Group(
+                        code,
+                        arity,
+                        torch.tensor([tape.params[slot] for slot in slots], dtype=torch.float64),
+                        tuple((level, torch.tensor(sources[level], dtype=torch.long)) for level in sorted(sources)),
+                        None if in_order else order,
+                    )
+                )
+            levels.append(tuple(built))
+
+        sizes = [len(variables)] + [sum(len(g.params) for g in level) for level in levels]
+        starts = [sum(sizes[:level]) for level in range(len(sizes))]
+        positions = torch.tensor([starts[level] + position for level, position in where], dtype=torch.long)
+        return cls(
+            tape,
+            torch.tensor(variables, dtype=torch.long),
+            tuple(levels),
+            positions,
+            positions[torch.tensor(list(tape.roots), dtype=torch.long)],
+        )
+
+    def forward(self, values: torch.Tensor) -> list[torch.Tensor]:
+        """
+        Evaluate the levels from the values of the variables, in the order of their slots,
+        keeping track of gradients through them when required
+        """
+        levels = [values]
+        for groups in self.levels:
+            results = [group.evaluate(levels) for group in groups]
+            levels.append(results[0] if len(results) == 1 else torch.cat(results))
+        return levels
+
+    # The program is rebuilt when the graph has changed since
+    @classmethod
+    def compile(cls, graph: ValueDag) -> "TorchProgram":
+        tape = Tape.compile(graph)
+        program = _programs.get(graph)
+        if program is None or program.tape is not tape:
+            program = _programs[graph] = cls.of(tape)
+        return program
+
+
+_programs: WeakKeyDictionary[ValueDag, TorchProgram] = WeakKeyDictionary()
+
+
+# A GraphValuation evaluated by torch, differentiating with autograd rather than the
+# backward rules of the operators. Whole passes are always run, as with a plan only
+# the roots of the plan are seeded, the values and gradients of every node being set.
+@dataclass(frozen=True)
+class TorchValuation(GraphValuation):
+    # The levels of the last forward pass, through which autograd runs
+    levels: list[torch.Tensor] = field(default_factory=list)
+
+    @override
+    def forward(self, plan: Optional[Plan] = None) -> None:
+        program = TorchProgram.compile(self.assignment.graph)
+        tape, assigned = program.tape, self.assignment.assigned
+        values = torch.tensor(
+            [assigned.get(tape.idents[s], 0) for s in program.variables.tolist()], dtype=torch.float64
+        )
+        self.levels[:] = program.forward(values.requires_grad_())
+        by_slot = torch.cat(self.levels).detach()[program.positions].tolist()
+        self.assigned.update((ident, Valuation(value)) for ident, value in zip(tape.idents, by_slot))
+
+    @override
+    def backward(self, plan: Optional[Plan] = None) -> None:
+        program = TorchProgram.compile(self.assignment.graph)
+        assert len(self.levels) == len(program.levels) + 1
+        if plan is None:
+            roots = program.roots
+        else:
+            roots = program.positions[torch.tensor([program.tape.slot(r) for r in plan.roots], dtype=torch.long)]
+        gradients = torch.autograd.grad(torch.cat(self.levels)[roots].sum(), self.levels, allow_unused=True)
+        flat = torch.cat([torch.zeros_like(level) if g is None else g for level, g in zip(self.levels, gradients)])
+        assigned = self.assigned
+        for ident, gradient in zip(program.tape.idents, flat[program.positions].tolist()):
+            assigned[ident].gradient = gradient
+
+    # Valuations are only created by the forward pass
+    @override
+    @classmethod
+    def initialize(cls, assignment: Assignment, plan: Optional[Plan] = None, profile: Optional[Profile] = None) -> Self:
+        return cls(assignment, {}, profile)
+
+
+def cross_check(assignment: Assignment, tolerance: float = 1e-9) -> dict[int, Tuple[Valuation, Valuation]]:
+    """
+    Compare the values and gradients computed by the backward rules of the
+    operators against those of torch autograd, returning the nodes where they
+    differ by more than the tolerance, relative to their magnitude, as the
+    micrograd valuation along with the torch one
+    """
+    expected, actual = GraphValuation.run(assignment), TorchValuation.run(assignment)
+
+    def close(x: float, y: float) -> bool:
+        return abs(x - y) <= tolerance * max(1, abs(x), abs(y))
+
+    return {
+        ident: (valuation, actual.assigned[ident])
+        for ident, valuation in expected.assigned.items()
+        if not close(valuation.value, actual.assigned[ident].value)
+        or not close(valuation.gradient, actual.assigned[ident].gradient)
+    }
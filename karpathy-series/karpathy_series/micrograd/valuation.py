@@ -1,5 +1,11 @@
-from dataclasses import dataclass
-from typing import override
+from dataclasses import dataclass, field
+from typing import TypeAlias, override
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+from typing_extensions import Self
+
+FloatArray: TypeAlias = NDArray[np.float64]
 
 
 @dataclass
@@ -10,3 +16,83 @@ class Valuation:
     @override
     def __str__(self) -> str:
         return f"value = {self.value}, grad = {self.gradient}"
+
+
+# The array counterpart of a Valuation, where the value may be broadcast against
+# the other operands of an operator (e.g. a batch of samples against a shared parameter).
+# A batched value carries the samples along a leading dimension, which is kept apart
+# from the dimensions of each sample when broadcasting.
+@dataclass(eq=False)
+class ArrayValuation:
+    value: FloatArray
+    gradient: FloatArray = field(default_factory=lambda: np.zeros(()))
+    batched: bool = False
+
+    def __post_init__(self) -> None:
+        if self.gradient.shape != self.value.shape:
+            self.gradient = np.zeros_like(self.value)
+
+    @property
+    def rank(self) -> int:
+        """The number of dimensions of each sample"""
+        return self.value.ndim - self.batched
+
+    def aligned(self, rank: int) -> FloatArray:
+        """
+        The value with the dimensions of each sample padded up to `rank`, so that it
+        broadcasts against unbatched values of up to that rank, which numpy aligns
+        from the last dimension, without the samples meeting their dimensions
+        """
+        if not self.batched or self.rank >= rank:
+            return self.value
+        return self.value.reshape(self.value.shape[:1] + (1,) * (rank - self.rank) + self.value.shape[1:])
+
+    def accumulate(self, gradient: FloatArray) -> None:
+        """
+        Add a gradient computed at the broadcast shape of an operation, summing
+        over the dimensions along which this value was broadcast, which for a
+        batched value are those following the samples
+        """
+        extra = gradient.ndim - self.value.ndim
+        if extra > 0:
+            gradient = gradient.sum(axis=tuple(range(self.batched, self.batched + extra)))
+        stretched = tuple(k for k, n in enumerate(self.value.shape) if n == 1 and gradient.shape[k] != 1)
+        if stretched:
+            gradient = gradient.sum(axis=stretched, keepdims=True)
+        self.gradient = self.gradient + gradient
+
+    @classmethod
+    def of(cls, value: ArrayLike, batched: bool = False) -> Self:
+        return cls(np.asarray(value, dtype=np.float64), batched=batched)
+
+    @override
+    def __str__(self) -> str:
+        return f"value = {self.value}, grad = {self.gradient}"
+
+
+# A value carried along with tangents, i.e. its derivatives along one or more directions
+# in the space of variables, one direction per entry of the tangent
+@dataclass(eq=False)
+class DualValuation:
+    value: float
+    tangent: FloatArray
+
+    @override
+    def __str__(self) -> str:
+        return f"value = {self.value}, tangent = {self.tangent}"
+
+
+# A dual valuation also carrying a gradient along with its tangent, i.e. the derivative
+# of the gradient along each direction, as computed by forward over reverse mode
+@dataclass(eq=False)
+class SecondOrderValuation(DualValuation):
+    gradient: float = 0
+    gradient_tangent: FloatArray = field(default_factory=lambda: np.zeros(()))
+
+    def __post_init__(self) -> None:
+        if self.gradient_tangent.shape != self.tangent.shape:
+            self.gradient_tangent = np.zeros_like(self.tangent)
+
+    @override
+    def __str__(self) -> str:
+        return f"value = {self.value}, grad = {self.gradient}, tangent = {self.tangent}"
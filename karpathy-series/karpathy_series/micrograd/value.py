@@ -1,10 +1,12 @@
+from contextlib import contextmanager
 from dataclasses import dataclass, field
-from typing import Iterable, Optional, TypeAlias, override
+from typing import Iterable, Iterator, Optional, Sequence, Tuple, TypeAlias, override
 
 from typing_extensions import Self
 
 from .graph import Dag, DagNode
-from .value_type import Exp, Pow, Prod, Sum, Tanh, ValueType, Variable
+from .ident import Label, Scope
+from .value_type import Affine, Exp, MatMul, Pow, Prod, Reduce, Sum, Tanh, ValueType, Variable
 
 ValueNode: TypeAlias = DagNode[ValueType]
 ValueDag: TypeAlias = Dag[ValueType]
@@ -25,7 +27,7 @@ class Value:
     def node_like(self: Self, value: ValueType, *pred: ValueNode) -> Self:
         return self.__class__(self.graph, self.graph.node(value, *pred))
 
-    def __or__(self: Self, label: str) -> Self:
+    def __or__(self: Self, label: Label) -> Self:
         _ = self.node.set_label(label)
         return self
 
@@ -49,6 +51,13 @@ class Value:
     def __pow__(self: Self, exponent: int | float) -> Self:
         return self.node_like(Pow(exponent), self.node)
 
+    # Of array values
+    def __matmul__(self: Self, other: Self) -> Self:
+        return self.node_like(MatMul(), self.node, other.node)
+
+    def sum(self: Self, axis: Optional[int] = None) -> Self:
+        return self.node_like(Reduce(axis), self.node)
+
     # Derived
     def __radd__(self: Self, other: Self | float) -> Self:
         return self.__add__(other)
@@ -80,11 +89,48 @@ class Value:
 class ValueGraph:
     graph: ValueDag = field(default_factory=Dag[ValueType])
 
-    def __call__(self, label: Optional[str] = None) -> Value:
+    def __call__(self, label: Optional[Label] = None) -> Value:
         return Value(self.graph, self.graph.node(Variable(), label=label))
 
+    # A variable holding an array of the given shape
+    def tensor(self, shape: Tuple[int, ...], label: Optional[Label] = None) -> Value:
+        return Value(self.graph, self.graph.node(Variable(tuple(shape)), label=label))
+
     def __getitem__(self, labels: tuple[str, ...]) -> Iterable[Value]:
         return (self(label) for label in labels)
 
+    # Many variables at once, built in bulk, labeled `<scope>.<role>k` when in a scope
+    def variables(self, count: int, scope: Optional[Scope] = None, role: str = "") -> Tuple[Value, ...]:
+        graph = self.graph
+        nodes = graph.extend((Variable(), (), None) for _ in range(count))
+        if scope is not None and count != 0:
+            start, stop = nodes[0].ident, nodes[-1].ident + 1
+            assert stop - start == count
+            graph.identities.set_run(start, stop, scope, role)
+        return tuple(Value(graph, node) for node in nodes)
+
+    @contextmanager
+    def bulk(self, pause_gc: bool = False) -> Iterator[Self]:
+        with self.graph.bulk(pause_gc):
+            yield self
+
+    @contextmanager
+    def arena(self) -> Iterator[Self]:
+        with self.graph.arena():
+            yield self
+
     def sum(self, *values: Value) -> Value:
         return Value(self.graph, self.graph.node(Sum(), *(value.node for value in values)))
+
+    # The single node for `offset + bias + Sum k . weights[k] * inputs[k]`
+    def affine(
+        self,
+        weights: Sequence[Value],
+        inputs: Sequence[Value],
+        offset: Optional[Value] = None,
+        bias: float = 0,
+    ) -> Value:
+        assert len(weights) == len(inputs)
+        pairs = (value.node for pair in zip(weights, inputs) for value in pair)
+        pred = pairs if offset is None else (offset.node, *pairs)
+        return Value(self.graph, self.graph.node(Affine(bias), *pred))
@@ -4,9 +4,11 @@ from dataclasses import dataclass
 from functools import reduce
 from math import exp
 from operator import mul
-from typing import ClassVar, Sequence, TypeAlias, override
+from typing import ClassVar, Optional, Sequence, Tuple, TypeAlias, override
 
-from .valuation import Valuation
+import numpy as np
+
+from .valuation import ArrayValuation, DualValuation, FloatArray, SecondOrderValuation, Valuation
 
 
 @dataclass(frozen=True)
@@ -14,9 +16,11 @@ class ValueTypeBase:
     pass
 
 
+# A variable holds a scalar, or an array of the given shape, which is only evaluated
+# by the array valuations
 @dataclass(frozen=True)
 class Variable(ValueTypeBase):
-    pass
+    shape: Tuple[int, ...] = ()
 
 
 @dataclass(frozen=True)
@@ -40,6 +44,62 @@ class Operator(ValueTypeBase, ABC):
         """
         ...
 
+    # Vectorized counterparts of `forward` and `backward`, where operands broadcast
+    # against each other and gradients are reduced back to each operand's shape
+    @abstractmethod
+    def forward_array(self, operands: Sequence[ArrayValuation]) -> ArrayValuation: ...
+
+    @abstractmethod
+    def backward_array(self, result: ArrayValuation, operands: Sequence[ArrayValuation]) -> None: ...
+
+    @abstractmethod
+    def jvp(self, result: DualValuation, operands: Sequence[DualValuation]) -> FloatArray:
+        """
+        Forward mode pushes the differential along instead, so with the tangents
+        t_k = D[v]x_k of the operands along some direction v, the tangent is
+            D[v]f = Sum k: n . D[x_k]f t_k
+        where `result` holds the value of f
+        """
+        ...
+
+    @abstractmethod
+    def dual_partials(
+        self, result: DualValuation, operands: Sequence[DualValuation]
+    ) -> Sequence[Tuple[float, FloatArray]]:
+        """
+        The derivatives D[x_k]f along with their own tangents, which are
+            D[v]D[x_k]f = Sum j: n . D[x_j]D[x_k]f t_j
+        so that only the second order derivatives along the tangents are needed
+        """
+        ...
+
+    def backward_dual(self, result: SecondOrderValuation, operands: Sequence[SecondOrderValuation]) -> None:
+        """
+        Back prop the gradient as well as its tangent, for which differentiating
+            head * D[x_k]f
+        along v gives
+            D[v]head * D[x_k]f + head * D[v]D[x_k]f
+        """
+        head, head_tangent = result.gradient, result.gradient_tangent
+        for op, (partial, partial_tangent) in zip(operands, self.dual_partials(result, operands)):
+            op.gradient += head * partial
+            op.gradient_tangent = op.gradient_tangent + head_tangent * partial + head * partial_tangent
+
+
+def _product(values: Sequence[FloatArray], coefficient: float) -> FloatArray:
+    return reduce(np.multiply, values, np.asarray(coefficient, dtype=np.float64))
+
+
+# The values of the operands padded to the largest rank of a sample among them, so that
+# batched and unbatched operands broadcast sample by sample
+def _aligned(operands: Sequence[ArrayValuation]) -> list[FloatArray]:
+    rank = max((op.rank for op in operands), default=0)
+    return [op.aligned(rank) for op in operands]
+
+
+def _batched(operands: Sequence[ArrayValuation]) -> bool:
+    return any(op.batched for op in operands)
+
 
 @dataclass(frozen=True)
 class Sum(Operator):
@@ -65,6 +125,27 @@ class Sum(Operator):
         for op in operands:
             op.gradient += result.gradient
 
+    @override
+    def forward_array(self, operands: Sequence[ArrayValuation]) -> ArrayValuation:
+        value = reduce(np.add, _aligned(operands), np.asarray(self.bias, dtype=np.float64))
+        return ArrayValuation(value, batched=_batched(operands))
+
+    @override
+    def backward_array(self, result: ArrayValuation, operands: Sequence[ArrayValuation]) -> None:
+        for op in operands:
+            op.accumulate(result.gradient)
+
+    @override
+    def jvp(self, result: DualValuation, operands: Sequence[DualValuation]) -> FloatArray:
+        return sum((op.tangent for op in operands), np.zeros_like(result.tangent))
+
+    @override
+    def dual_partials(
+        self, result: DualValuation, operands: Sequence[DualValuation]
+    ) -> Sequence[Tuple[float, FloatArray]]:
+        zero = np.zeros_like(result.tangent)
+        return [(1, zero) for _ in operands]
+
 
 @dataclass(frozen=True)
 class Prod(Operator):
@@ -87,13 +168,70 @@ class Prod(Operator):
         the derivative is
             D[x_k]f = c * (Prod j: n . x_j) / x_k
                 where x_k != 0
-        when x_k is 0, there is not an easy out aside from taking the product of the other values
+        when x_k is 0, there is not an easy out aside from taking the product of the other positions
         """
-        for op in operands:
+        for k, op in enumerate(operands):
             if op.value != 0:
                 op.gradient += result.gradient * result.value / op.value
             else:
-                op.gradient += result.gradient * reduce(mul, (op2.value for op2 in operands if op != op2), 1)
+                others = (op2.value for j, op2 in enumerate(operands) if j != k)
+                op.gradient += result.gradient * reduce(mul, others, self.coefficient)
+
+    @override
+    def forward_array(self, operands: Sequence[ArrayValuation]) -> ArrayValuation:
+        return ArrayValuation(_product(_aligned(operands), self.coefficient), batched=_batched(operands))
+
+    @override
+    def backward_array(self, result: ArrayValuation, operands: Sequence[ArrayValuation]) -> None:
+        # Products of the other positions avoid dividing by operand entries that vanish
+        values = _aligned(operands)
+        for k, op in enumerate(operands):
+            op.accumulate(result.gradient * _product(values[:k] + values[k + 1 :], self.coefficient))
+
+    @override
+    def jvp(self, result: DualValuation, operands: Sequence[DualValuation]) -> FloatArray:
+        # Products of the other positions, built from prefix and suffix products
+        values = [op.value for op in operands]
+        suffix = [1.0] * (len(values) + 1)
+        for k in range(len(values) - 1, -1, -1):
+            suffix[k] = suffix[k + 1] * values[k]
+        tangent, prefix = np.zeros_like(result.tangent), self.coefficient
+        for k, op in enumerate(operands):
+            tangent = tangent + prefix * suffix[k + 1] * op.tangent
+            prefix *= values[k]
+        return tangent
+
+    @override
+    def dual_partials(
+        self, result: DualValuation, operands: Sequence[DualValuation]
+    ) -> Sequence[Tuple[float, FloatArray]]:
+        """
+        The derivative along an operand is the product of the other positions,
+            D[x_k]f = c Prod j: n, j != k . x_j
+        which is differentiated along with the prefix and suffix products of
+        dual numbers it is built from
+        """
+        n = len(operands)
+        suffix: list[Tuple[float, FloatArray]] = [(1, np.zeros_like(result.tangent))] * (n + 1)
+        for k in range(n - 1, -1, -1):
+            value, tangent = suffix[k + 1]
+            op = operands[k]
+            suffix[k] = (value * op.value, tangent * op.value + value * op.tangent)
+        partials: list[Tuple[float, FloatArray]] = []
+        prefix, prefix_tangent = float(self.coefficient), np.zeros_like(result.tangent)
+        for k, op in enumerate(operands):
+            value, tangent = suffix[k + 1]
+            partials.append((prefix * value, prefix_tangent * value + prefix * tangent))
+            prefix, prefix_tangent = prefix * op.value, prefix_tangent * op.value + prefix * op.tangent
+        return partials
+
+
+# The tangent c x^p t, where x^p diverges at 0 for a negative p, to an infinite tangent
+# along the directions the tangent moves in, and none along the others
+def _power_tangent(c: float, x: float, p: float, tangent: FloatArray) -> FloatArray:
+    if x != 0 or p >= 0:
+        return c * math.pow(x, p) * tangent
+    return np.where(tangent == 0, 0.0, np.copysign(math.inf, c * tangent))
 
 
 @dataclass(frozen=True)
@@ -126,6 +264,46 @@ class Pow(Operator):
         operand = operands[0]
         operand.gradient += result.gradient * self.exponent * operand.value ** (self.exponent - 1)
 
+    @override
+    def forward_array(self, operands: Sequence[ArrayValuation]) -> ArrayValuation:
+        assert len(operands) == 1
+        return ArrayValuation(np.power(operands[0].value, self.exponent), batched=operands[0].batched)
+
+    @override
+    def backward_array(self, result: ArrayValuation, operands: Sequence[ArrayValuation]) -> None:
+        if self.exponent == 0:
+            return
+
+        assert len(operands) == 1
+        operand = operands[0]
+        operand.accumulate(result.gradient * self.exponent * np.power(operand.value, self.exponent - 1))
+
+    @override
+    def jvp(self, result: DualValuation, operands: Sequence[DualValuation]) -> FloatArray:
+        assert len(operands) == 1
+        if self.exponent == 0:
+            return np.zeros_like(result.tangent)
+        operand = operands[0]
+        return _power_tangent(self.exponent, operand.value, self.exponent - 1, operand.tangent)
+
+    @override
+    def dual_partials(
+        self, result: DualValuation, operands: Sequence[DualValuation]
+    ) -> Sequence[Tuple[float, FloatArray]]:
+        """
+        The second derivative is
+            D[x]D[x]x^q = q (q - 1) x^(q-2)
+        which diverges at 0 for q < 2, as the first does for q < 1
+        """
+        assert len(operands) == 1
+        operand, q = operands[0], self.exponent
+        if q == 0:
+            return [(0, np.zeros_like(result.tangent))]
+        if q == 1:
+            return [(1, np.zeros_like(result.tangent))]
+        partial = q * operand.value ** (q - 1) if operand.value != 0 or q > 1 else math.inf
+        return [(partial, _power_tangent(q * (q - 1), operand.value, q - 2, operand.tangent))]
+
 
 @dataclass(frozen=True)
 class Tanh(Operator):
@@ -148,6 +326,32 @@ class Tanh(Operator):
         operand = operands[0]
         operand.gradient += result.gradient * (1 - result.value**2)
 
+    @override
+    def forward_array(self, operands: Sequence[ArrayValuation]) -> ArrayValuation:
+        assert len(operands) == 1
+        return ArrayValuation(np.tanh(operands[0].value), batched=operands[0].batched)
+
+    @override
+    def backward_array(self, result: ArrayValuation, operands: Sequence[ArrayValuation]) -> None:
+        assert len(operands) == 1
+        operands[0].accumulate(result.gradient * (1 - result.value**2))
+
+    @override
+    def jvp(self, result: DualValuation, operands: Sequence[DualValuation]) -> FloatArray:
+        assert len(operands) == 1
+        return (1 - result.value**2) * operands[0].tangent
+
+    @override
+    def dual_partials(
+        self, result: DualValuation, operands: Sequence[DualValuation]
+    ) -> Sequence[Tuple[float, FloatArray]]:
+        """
+        With y = tanh(x), the derivative is 1 - y^2, whose tangent is
+            D[v](1 - y^2) = -2 y D[v]y
+        """
+        assert len(operands) == 1
+        return [(1 - result.value**2, -2 * result.value * result.tangent)]
+
 
 @dataclass(frozen=True)
 class Exp(Operator):
@@ -169,5 +373,245 @@ class Exp(Operator):
         operand = operands[0]
         operand.gradient += result.gradient * result.value
 
+    @override
+    def forward_array(self, operands: Sequence[ArrayValuation]) -> ArrayValuation:
+        assert len(operands) == 1
+        return ArrayValuation(np.exp(operands[0].value), batched=operands[0].batched)
+
+    @override
+    def backward_array(self, result: ArrayValuation, operands: Sequence[ArrayValuation]) -> None:
+        assert len(operands) == 1
+        operands[0].accumulate(result.gradient * result.value)
+
+    @override
+    def jvp(self, result: DualValuation, operands: Sequence[DualValuation]) -> FloatArray:
+        assert len(operands) == 1
+        return result.value * operands[0].tangent
+
+    @override
+    def dual_partials(
+        self, result: DualValuation, operands: Sequence[DualValuation]
+    ) -> Sequence[Tuple[float, FloatArray]]:
+        assert len(operands) == 1
+        return [(result.value, result.tangent)]
+
+
+@dataclass(frozen=True)
+class Affine(Operator):
+    glyph: ClassVar[str] = "·"
+    bias: float = 0
+
+    @override
+    def __str__(self) -> str:
+        return str(self.glyph) if self.bias == 0 else f"{self.glyph} {self.bias}"
+
+    @staticmethod
+    def offset(operands: Sequence[object]) -> int:
+        """The number of leading offset operands, which is one when the operands are odd in number"""
+        return len(operands) % 2
+
+    @override
+    def forward(self, operands: Sequence[Valuation]) -> Valuation:
+        start = self.offset(operands)
+        value = self.bias + sum(v.value for v in operands[:start])
+        for k in range(start, len(operands), 2):
+            value += operands[k].value * operands[k + 1].value
+        return Valuation(value)
+
+    @override
+    def backward(self, result: Valuation, operands: Sequence[Valuation]) -> None:
+        """
+        For the affine combination of an optional offset c and pairs (a_k, b_k)
+            f(c, a_1, b_1, ..., a_n, b_n) = bias + c + Sum k: n . a_k b_k
+        the derivatives are
+            D[c]f = 1
+            D[a_k]f = b_k
+            D[b_k]f = a_k
+        """
+        start = self.offset(operands)
+        for op in operands[:start]:
+            op.gradient += result.gradient
+        for k in range(start, len(operands), 2):
+            a, b = operands[k], operands[k + 1]
+            a.gradient += result.gradient * b.value
+            b.gradient += result.gradient * a.value
+
+    @override
+    def forward_array(self, operands: Sequence[ArrayValuation]) -> ArrayValuation:
+        start, values = self.offset(operands), _aligned(operands)
+        value = reduce(np.add, values[:start], np.asarray(self.bias, dtype=np.float64))
+        for k in range(start, len(operands), 2):
+            value = value + values[k] * values[k + 1]
+        return ArrayValuation(value, batched=_batched(operands))
+
+    @override
+    def backward_array(self, result: ArrayValuation, operands: Sequence[ArrayValuation]) -> None:
+        start, values = self.offset(operands), _aligned(operands)
+        for op in operands[:start]:
+            op.accumulate(result.gradient)
+        for k in range(start, len(operands), 2):
+            operands[k].accumulate(result.gradient * values[k + 1])
+            operands[k + 1].accumulate(result.gradient * values[k])
+
+    @override
+    def jvp(self, result: DualValuation, operands: Sequence[DualValuation]) -> FloatArray:
+        start = self.offset(operands)
+        tangent = sum((op.tangent for op in operands[:start]), np.zeros_like(result.tangent))
+        for k in range(start, len(operands), 2):
+            a, b = operands[k], operands[k + 1]
+            tangent = tangent + b.value * a.tangent + a.value * b.tangent
+        return tangent
+
+    @override
+    def dual_partials(
+        self, result: DualValuation, operands: Sequence[DualValuation]
+    ) -> Sequence[Tuple[float, FloatArray]]:
+        start = self.offset(operands)
+        partials: list[Tuple[float, FloatArray]] = [(1, np.zeros_like(result.tangent)) for _ in operands[:start]]
+        for k in range(start, len(operands), 2):
+            a, b = operands[k], operands[k + 1]
+            partials += [(b.value, b.tangent), (a.value, a.tangent)]
+        return partials
+
+
+# The operands as stacks of matrices, where vectors are promoted as matmul does, to a row
+# on the left and a column on the right, with batched ones padded so that the samples
+# broadcast as a dimension of their own
+def _matrices(a: ArrayValuation, b: ArrayValuation) -> Tuple[FloatArray, FloatArray]:
+    rank = max(a.rank, b.rank, 2)
+    ma = ArrayValuation(a.value[..., np.newaxis, :], batched=a.batched) if a.rank == 1 else a
+    mb = ArrayValuation(b.value[..., np.newaxis], batched=b.batched) if b.rank == 1 else b
+    return ma.aligned(rank), mb.aligned(rank)
+
+
+@dataclass(frozen=True)
+class MatMul(Operator):
+    glyph: ClassVar[str] = "@"
+
+    @override
+    def __str__(self) -> str:
+        return self.glyph
+
+    # On scalars, the product of the two operands
+    @override
+    def forward(self, operands: Sequence[Valuation]) -> Valuation:
+        a, b = operands
+        return Valuation(a.value * b.value)
+
+    @override
+    def backward(self, result: Valuation, operands: Sequence[Valuation]) -> None:
+        a, b = operands
+        a.gradient += result.gradient * b.value
+        b.gradient += result.gradient * a.value
+
+    @override
+    def forward_array(self, operands: Sequence[ArrayValuation]) -> ArrayValuation:
+        a, b = operands
+        if a.rank == 0 or b.rank == 0:
+            va, vb = _aligned(operands)
+            return ArrayValuation(va * vb, batched=_batched(operands))
+        value = np.matmul(*_matrices(a, b))
+        # Dropping the dimensions the vectors were promoted with
+        if b.rank == 1:
+            value = value[..., 0]
+        if a.rank == 1:
+            value = value[..., 0] if b.rank == 1 else value[..., 0, :]
+        return ArrayValuation(value, batched=_batched(operands))
+
+    @override
+    def backward_array(self, result: ArrayValuation, operands: Sequence[ArrayValuation]) -> None:
+        """
+        For the product of matrices
+            f(A, B)_ij = Sum k . A_ik B_kj
+        the derivatives against the head G are
+            Sum ij . G_ij D[A_ik]f_ij = (G B^T)_ik
+            Sum ij . G_ij D[B_kj]f_ij = (A^T G)_kj
+        over the last two dimensions, with the leading ones broadcast as batches
+        """
+        a, b = operands
+        if a.rank == 0 or b.rank == 0:
+            va, vb = _aligned(operands)
+            a.accumulate(result.gradient * vb)
+            b.accumulate(result.gradient * va)
+            return
+        ma, mb = _matrices(a, b)
+        g = result.gradient
+        if b.rank == 1:
+            g = g[..., np.newaxis]
+        if a.rank == 1:
+            g = g[..., np.newaxis, :]
+        da = np.matmul(g, np.swapaxes(mb, -1, -2))
+        db = np.matmul(np.swapaxes(ma, -1, -2), g)
+        a.accumulate(da[..., 0, :] if a.rank == 1 else da)
+        b.accumulate(db[..., 0] if b.rank == 1 else db)
+
+    @override
+    def jvp(self, result: DualValuation, operands: Sequence[DualValuation]) -> FloatArray:
+        a, b = operands
+        return b.value * a.tangent + a.value * b.tangent
+
+    @override
+    def dual_partials(
+        self, result: DualValuation, operands: Sequence[DualValuation]
+    ) -> Sequence[Tuple[float, FloatArray]]:
+        a, b = operands
+        return [(b.value, b.tangent), (a.value, a.tangent)]
+
+
+# The sum of the entries of an array along an axis, or of all of them. Axes count the
+# dimensions of a sample, so in a batch each sample is summed on its own.
+@dataclass(frozen=True)
+class Reduce(Operator):
+    glyph: ClassVar[str] = "Σ"
+    axis: Optional[int] = None
+
+    @override
+    def __str__(self) -> str:
+        return self.glyph if self.axis is None else f"{self.glyph} {self.axis}"
+
+    # The axes of an operand to sum over, past the dimension of the samples in a batch
+    def axes(self, operand: ArrayValuation) -> Optional[int | Tuple[int, ...]]:
+        if not operand.batched:
+            return self.axis
+        if self.axis is None:
+            return tuple(range(1, operand.value.ndim))
+        return self.axis + 1 if self.axis >= 0 else self.axis
+
+    # On scalars, there is nothing to sum
+    @override
+    def forward(self, operands: Sequence[Valuation]) -> Valuation:
+        return Valuation(operands[0].value)
+
+    @override
+    def backward(self, result: Valuation, operands: Sequence[Valuation]) -> None:
+        operands[0].gradient += result.gradient
+
+    @override
+    def forward_array(self, operands: Sequence[ArrayValuation]) -> ArrayValuation:
+        op = operands[0]
+        return ArrayValuation(np.asarray(np.sum(op.value, axis=self.axes(op))), batched=op.batched)
+
+    @override
+    def backward_array(self, result: ArrayValuation, operands: Sequence[ArrayValuation]) -> None:
+        """
+        Each entry contributes to a single entry of the sum, so
+            D[x_i]f_j = 1 when j is i without the axis summed over
+        and the head is spread back along that axis
+        """
+        op = operands[0]
+        axes = self.axes(op)
+        head = result.gradient if axes is None else np.expand_dims(result.gradient, axes)
+        op.accumulate(np.broadcast_to(head, op.value.shape))
+
+    @override
+    def jvp(self, result: DualValuation, operands: Sequence[DualValuation]) -> FloatArray:
+        return operands[0].tangent
+
+    @override
+    def dual_partials(
+        self, result: DualValuation, operands: Sequence[DualValuation]
+    ) -> Sequence[Tuple[float, FloatArray]]:
+        return [(1, np.zeros_like(result.tangent))]
+
 
 ValueType: TypeAlias = Variable | Operator
@@ -0,0 +1,230 @@
+from typing import Mapping
+
+import numpy as np
+from numpy.typing import ArrayLike
+from pytest import approx
+
+from karpathy_series.micrograd.assignment import Assignment
+from karpathy_series.micrograd.batch import BatchAssignment, BatchValuation
+from karpathy_series.micrograd.calculation import GraphValuation
+from karpathy_series.micrograd.perceptron import Layer, TensorLayer
+from karpathy_series.micrograd.value import Value, ValueGraph
+
+
+def test_create_batch_assignment() -> None:
+    G = ValueGraph()
+    x, w = G["x", "w"]
+    _ = x * w | "v"
+
+    a = BatchAssignment.create(G, {x: [1, 2, 3], w: 0.5})
+    assert a.is_complete()
+    assert a.size() == 3
+    assert a.assigned[w.node.ident].shape == ()
+
+
+def test_forward_backward() -> None:
+    G = ValueGraph()
+    x, w, b = G["x", "w", "b"]
+    v = (x * w + b).tanh() | "v"
+
+    bv = BatchValuation.run(BatchAssignment.create(G, {x: [0.5, -1, 2], w: 0.3, b: 0.1}))
+    for k, xk in enumerate([0.5, -1, 2]):
+        gv = GraphValuation.run(Assignment.create(G, {x: xk, w: 0.3, b: 0.1}))
+        assert bv.value(v)[k] == approx(gv.assigned[v.node.ident].value)
+        assert bv.gradient(x)[k] == approx(gv.assigned[x.node.ident].gradient)
+
+    # Shared parameters collect the gradient of the whole batch
+    assert bv.gradient(w).shape == ()
+    expected = sum(
+        GraphValuation.run(Assignment.create(G, {x: xk, w: 0.3, b: 0.1})).assigned[w.node.ident].gradient
+        for xk in [0.5, -1, 2]
+    )
+    assert float(bv.gradient(w)) == approx(expected)
+
+
+def test_prod_with_zero_entries() -> None:
+    G = ValueGraph()
+    x, y = G["x", "y"]
+    _ = x * y * 2 | "v"
+
+    bv = BatchValuation.run(BatchAssignment.create(G, {x: [0, 1], y: [3, 0]}))
+    assert list(bv.gradient(x)) == [6, 0]
+    assert list(bv.gradient(y)) == [0, 2]
+
+
+def test_stack_layer() -> None:
+    G = ValueGraph()
+    inputs = tuple(G[("x0", "x1")])
+    layer = Layer("layer", G, 3, inputs)
+    params = layer.assign_from(lambda: 0.2)
+    samples = [Assignment.create(G, {inputs[0]: k, inputs[1]: -k}) for k in range(4)]
+
+    bv = BatchValuation.run(BatchAssignment.stack(samples, params))
+    expected = [GraphValuation.run(params | sample) for sample in samples]
+    for output in layer.outputs:
+        assert list(bv.value(output)) == approx([gv.assigned[output.node.ident].value for gv in expected])
+    for weight in layer.neurons[0].weights:
+        assert float(bv.gradient(weight)) == approx(sum(gv.assigned[weight.node.ident].gradient for gv in expected))
+    assert bv.gradient(inputs[0]).shape == (4,)
+
+
+def test_affine() -> None:
+    G = ValueGraph()
+    x0, x1, w0, w1, b = G["x0", "x1", "w0", "w1", "b"]
+    v = G.affine((w0, w1), (x0, x1), offset=b) | "v"
+
+    bv = BatchValuation.run(BatchAssignment.create(G, {x0: [1, 2], x1: [3, -1], w0: 0.5, w1: 2, b: 1}))
+    assert list(bv.value(v)) == [7.5, 0]
+    assert float(bv.gradient(w0)) == 3
+    assert float(bv.gradient(w1)) == 2
+    assert float(bv.gradient(b)) == 2
+    assert list(bv.gradient(x1)) == [2, 2]
+
+
+def test_matmul_and_reduce() -> None:
+    G = ValueGraph()
+    A, B, v = G.tensor((2, 3)), G.tensor((3, 4)), G.tensor((3,))
+    f = (A @ B).sum(axis=0) | "f"
+    g = (A @ v).tanh().sum() | "g"
+    h = (v @ B) * (v @ v) | "h"
+
+    rng = np.random.default_rng(0)
+    a, b, x = rng.normal(size=(2, 3)), rng.normal(size=(3, 4)), rng.normal(size=3)
+    bv = BatchValuation.run(BatchAssignment.create(G, {A: a, B: b, v: x}))
+    assert bv.value(f) == approx((a @ b).sum(axis=0))
+    assert bv.value(g) == approx(np.tanh(a @ x).sum())
+    assert bv.value(h) == approx((x @ b) * (x @ x))
+
+    # The gradients of the sum of the roots
+    sech = 1 - np.tanh(a @ x) ** 2
+    assert bv.gradient(A) == approx(np.outer(np.ones(2), b.sum(axis=1)) + np.outer(sech, x))
+    assert bv.gradient(B) == approx(np.outer(a.sum(axis=0), np.ones(4)) + np.outer(x, np.ones(4)) * (x @ x))
+    assert bv.gradient(v) == approx(a.T @ sech + b.sum(axis=1) * (x @ x) + 2 * x * (x @ b).sum())
+
+
+# Runs the batch as a whole and sample by sample, checking that every root has the
+# values of each sample, and that batched variables have the gradients of each sample
+# while shared ones collect them
+def _matches_samples(G: ValueGraph, shared: Mapping[Value, ArrayLike], batched: Mapping[Value, ArrayLike]) -> None:
+    bv = BatchValuation.run(BatchAssignment.create(G, {**shared, **batched}))
+    size = len(np.asarray(next(iter(batched.values()))))
+    runs = [
+        BatchValuation.run(BatchAssignment.create(G, {**shared, **{v: np.asarray(x)[k] for v, x in batched.items()}}))
+        for k in range(size)
+    ]
+    for root in G.graph.roots():
+        for k, run in enumerate(runs):
+            assert bv.assigned[root.ident].value[k] == approx(run.assigned[root.ident].value)
+    for v in batched:
+        for k, run in enumerate(runs):
+            assert bv.gradient(v)[k] == approx(run.gradient(v))
+    for v in shared:
+        assert bv.gradient(v) == approx(sum(run.gradient(v) for run in runs))
+
+
+def test_batched_matmul() -> None:
+    G = ValueGraph()
+    A, M, v, u, w = G.tensor((2, 3)), G.tensor((3, 2)), G.tensor((3,)), G.tensor((3,)), G.tensor((3,))
+    x, y = G["x", "y"]
+    f = A @ v | "f"
+    g = v @ u | "g"
+    h = x @ y | "h"
+    k = (v @ M) * x + v @ w | "k"
+
+    a, m = np.arange(6.0).reshape(2, 3), np.arange(6.0).reshape(3, 2)
+    assign: dict[Value, ArrayLike] = {
+        A: a,
+        M: m,
+        v: np.eye(3),
+        u: np.ones((3, 3)),
+        w: np.ones(3),
+        x: [1, 2, 3],
+        y: [3, 4, 5],
+    }
+    bv = BatchValuation.run(BatchAssignment.create(G, assign))
+    assert bv.value(f) == approx(np.array([[0, 3], [1, 4], [2, 5]]))
+    assert bv.value(g) == approx([1, 1, 1])
+    assert bv.value(h) == approx([3, 8, 15])
+    assert bv.value(k) == approx(m * np.array([[1], [2], [3]]) + 1)
+
+    rng = np.random.default_rng(2)
+    _matches_samples(
+        G,
+        {A: a, M: rng.normal(size=(3, 2)), w: rng.normal(size=3)},
+        {v: rng.normal(size=(4, 3)), u: rng.normal(size=(4, 3)), x: rng.normal(size=4), y: rng.normal(size=4)},
+    )
+
+
+def test_batched_reduce() -> None:
+    G = ValueGraph()
+    t, s = G.tensor((2, 3)), G.tensor((3,))
+    f = t.sum() | "f"
+    g = t.sum(axis=0) * s | "g"
+    h = (t.sum(axis=-1) ** 2).sum() | "h"
+
+    rng = np.random.default_rng(3)
+    samples = rng.normal(size=(5, 2, 3))
+    bv = BatchValuation.run(BatchAssignment.create(G, {t: samples, s: np.ones(3)}))
+    assert bv.value(f) == approx(samples.sum(axis=(1, 2)))
+    assert bv.value(g) == approx(samples.sum(axis=1))
+    assert bv.value(h) == approx((samples.sum(axis=2) ** 2).sum(axis=1))
+
+    _matches_samples(G, {s: rng.normal(size=3)}, {t: samples})
+
+
+def test_tensor_layer_matches_layer() -> None:
+    G, T = ValueGraph(), ValueGraph()
+    inputs = tuple(G[("x0", "x1", "x2")])
+    layer = Layer("layer", G, 4, inputs)
+    x = T.tensor((3,), "x")
+    tensor_layer = TensorLayer("layer", T, 4, x, 3)
+    assert T.graph.size() == 6
+
+    samples = [[0.5, -1, 2], [0.1, 0.2, -0.3]]
+    weights = iter(np.linspace(-1, 1, 12))
+    shared = layer.assign_from(lambda: float(next(weights)))
+    weights = iter(np.linspace(-1, 1, 12))
+    tensor_shared = tensor_layer.assign_from(lambda: float(next(weights)))
+
+    tv = BatchValuation.run(tensor_shared | BatchAssignment.create(T, {x: samples}))
+    for k, sample in enumerate(samples):
+        gv = GraphValuation.run(shared | Assignment.create(G, dict(zip(inputs, sample))))
+        for j, neuron in enumerate(layer.neurons):
+            assert tv.value(tensor_layer.output)[k, j] == approx(gv.assigned[neuron.output.node.ident].value)
+        assert tv.gradient(x)[k] == approx([gv.assigned[i.node.ident].gradient for i in inputs])
+
+    # Parameters collect the gradients of every sample
+    bv = BatchValuation.run(
+        BatchAssignment.stack([shared | Assignment.create(G, dict(zip(inputs, s))) for s in samples])
+    )
+    for j, neuron in enumerate(layer.neurons):
+        assert tv.gradient(tensor_layer.bias)[j] == approx(bv.gradient(neuron.bias).sum())
+        for i, w in enumerate(neuron.weights):
+            assert tv.gradient(tensor_layer.weights)[i, j] == approx(bv.gradient(w).sum())
+
+
+def test_tensor_layer_training() -> None:
+    G = ValueGraph()
+    x, y = G.tensor((2,), "x"), G.tensor((1,), "y")
+    hidden = TensorLayer("hidden", G, 8, x, 2)
+    output = TensorLayer("output", G, 1, hidden.output, 8)
+    loss = ((output.output - y) ** 2).sum() / 64 | "loss"
+
+    rng = np.random.default_rng(1)
+    samples = rng.uniform(-1, 1, size=(64, 2))
+    targets = np.tanh(samples[:, :1] * samples[:, 1:])
+    parameters = hidden.assign_from(lambda: rng.normal(0, 0.5)) | output.assign_from(lambda: rng.normal(0, 0.5))
+    data = BatchAssignment.create(G, {x: samples, y: targets})
+
+    losses = []
+    for _ in range(100):
+        bv = BatchValuation.run(parameters | data)
+        losses.append(float(bv.value(loss).sum()))
+        parameters = BatchAssignment(
+            G.graph,
+            {
+                p.node.ident: parameters.assigned[p.node.ident] - 0.3 * bv.gradient(p)
+                for p in hidden.parameters() + output.parameters()
+            },
+        )
+    assert losses[-1] < losses[0] / 2
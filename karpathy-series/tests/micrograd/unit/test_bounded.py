@@ -0,0 +1,94 @@
+from pytest import approx
+
+from karpathy_series.micrograd.assignment import Assignment
+from karpathy_series.micrograd.bounded import BoundedValuation, MemoryPlan
+from karpathy_series.micrograd.perceptron import Layer
+from karpathy_series.micrograd.tape import TapeValuation
+from karpathy_series.micrograd.value import ValueGraph
+
+
+def test_run_matches_tape_valuation() -> None:
+    G = ValueGraph()
+    x, y = G["x", "y"]
+    w = x + y | "w"
+    u = 2 * x | "u"
+    v = w * u | "v"
+    z = (v + u).exp() / 1000 | "z"
+    h = (z * u).tanh() - x**2 | "h"
+
+    a = Assignment.create(G, {x: 0.5, y: -0.25})
+    expected = TapeValuation.run(a)
+    for recompute in (0, 2, 8):
+        result = BoundedValuation.run(a, recompute=recompute)
+        assert result.value(h.node.ident) == approx(expected.valuation(h.node.ident).value)
+        for n in (x, y):
+            assert result.gradient(n.node.ident) == approx(expected.valuation(n.node.ident).gradient)
+        assert result.values.keys() == {h.node.ident}
+        assert result.gradients.keys() == {x.node.ident, y.node.ident}
+
+
+def test_layer_matches_tape_valuation() -> None:
+    G = ValueGraph()
+    inputs = tuple(G[("x0", "x1", "x2")])
+    layer = Layer("layer", G, 4, inputs)
+    a = layer.assign_from(lambda: 0.1) | Assignment.create(G, {x: k for k, x in enumerate(inputs)})
+
+    expected = TapeValuation.run(a)
+    result = BoundedValuation.run(a, recompute=4)
+    for n in G.graph.entries():
+        assert result.gradient(n.ident) == approx(expected.valuation(n.ident).gradient)
+
+
+def test_sum_chain_runs_in_constant_memory() -> None:
+    G = ValueGraph()
+    x = G("x")
+    y = x
+    for k in range(100):
+        y = y + k
+
+    result = BoundedValuation.run(Assignment.create(G, {x: 0.5}))
+    assert result.value(y.node.ident) == approx(4950.5)
+    assert result.gradient(x.node.ident) == 1
+    assert result.peak <= 3
+
+
+def test_recompute_lowers_peak() -> None:
+    G = ValueGraph()
+    x = G("x")
+    y = x
+    for _ in range(100):
+        y = (y + 0.1).tanh()
+
+    a = Assignment.create(G, {x: 0.3})
+    stored = BoundedValuation.run(a)
+    recomputed = BoundedValuation.run(a, recompute=4)
+    assert recomputed.gradient(x.node.ident) == approx(stored.gradient(x.node.ident))
+    assert recomputed.peak < stored.peak
+    assert len(MemoryPlan.compile(G.graph, recompute=4).recomputed) != 0
+
+
+def test_forward_only_keeps_roots() -> None:
+    G = ValueGraph()
+    x, y = G["x", "y"]
+    u = (x * y).tanh() | "u"
+    v = (x + y).exp() | "v"
+
+    result = BoundedValuation.run(Assignment.create(G, {x: 0.5, y: 2}), backward=False)
+    assert result.values.keys() == {u.node.ident, v.node.ident}
+    assert len(result.gradients) == 0
+
+
+def test_recompute_through_shared_operands() -> None:
+    G = ValueGraph()
+    x = G("x")
+    y = x
+    for _ in range(20):
+        u = y * 0.5
+        y = (u * u + u).tanh()
+
+    a = Assignment.create(G, {x: 0.3})
+    expected = TapeValuation.run(a)
+    for recompute in (1, 3, 6):
+        result = BoundedValuation.run(a, recompute=recompute)
+        assert result.gradient(x.node.ident) == approx(expected.valuation(x.node.ident).gradient)
+        assert result.gradients.keys() == {x.node.ident}
@@ -1,5 +1,7 @@
+from pytest import approx
+
 from karpathy_series.micrograd.assignment import Assignment
-from karpathy_series.micrograd.calculation import GraphValuation
+from karpathy_series.micrograd.calculation import GraphValuation, Plan
 from karpathy_series.micrograd.valuation import Valuation
 from karpathy_series.micrograd.value import ValueGraph
 
@@ -95,3 +97,78 @@ def test_backward_converge() -> None:
         z.node.ident: Valuation(120, 10),
         h.node.ident: Valuation(1200, 1),
     }
+
+
+def test_run_pruned_to_roots() -> None:
+    G = ValueGraph()
+    x, y, z = G["x", "y", "z"]
+    w = x * y | "w"
+    loss = w.tanh() | "loss"
+    aux = (w + z).exp() | "aux"
+
+    a = Assignment.create(G, {x: 0.5, y: 2, z: 1})
+    gv = GraphValuation.run(a, roots=[loss])
+    full = GraphValuation.run(Assignment.create(G, {x: 0.5, y: 2, z: 1}))
+
+    assert aux.node.ident not in gv.assigned
+    assert z.node.ident not in gv.assigned
+    assert gv.assigned[loss.node.ident] == full.assigned[loss.node.ident]
+    assert gv.assigned[y.node.ident].gradient == approx((1 - full.assigned[loss.node.ident].value ** 2) * 0.5)
+
+
+def test_run_pruned_to_variables() -> None:
+    G = ValueGraph()
+    x, y, z = G["x", "y", "z"]
+    u = x * y | "u"
+    h = u * (y + z).exp() | "h"
+
+    a = Assignment.create(G, {x: 0.5, y: 2, z: 1})
+    gv = GraphValuation.run(a, wrt=[x])
+    full = GraphValuation.run(a)
+
+    assert gv.assigned[h.node.ident].value == full.assigned[h.node.ident].value
+    assert gv.assigned[x.node.ident].gradient == full.assigned[x.node.ident].gradient
+    assert gv.assigned[z.node.ident].gradient == 0
+
+
+def test_plan_cached() -> None:
+    G = ValueGraph()
+    x, y = G["x", "y"]
+    u = x * y | "u"
+
+    plan = Plan.compile(G.graph, frozenset([u.node.ident]), None)
+    assert Plan.compile(G.graph, frozenset([u.node.ident]), None) is plan
+    assert plan.forward == (x.node.ident, y.node.ident, u.node.ident)
+
+    _ = u.exp()
+    assert Plan.compile(G.graph, frozenset([u.node.ident]), None) is not plan
+
+
+def test_backward_affine() -> None:
+    G = ValueGraph()
+    b, w0, w1, x0, x1 = G["b", "w0", "w1", "x0", "x1"]
+    u = G.affine((w0, w1), (x0, x1), offset=b, bias=1) | "u"
+
+    gv = GraphValuation.run(Assignment.create(G, {b: 1, w0: 2, w1: 3, x0: 4, x1: 5}))
+    assert gv.assigned == {
+        b.node.ident: Valuation(1, 1),
+        w0.node.ident: Valuation(2, 4),
+        w1.node.ident: Valuation(3, 5),
+        x0.node.ident: Valuation(4, 2),
+        x1.node.ident: Valuation(5, 3),
+        u.node.ident: Valuation(25, 1),
+    }
+
+
+def test_prod_gradient_at_zero() -> None:
+    G = ValueGraph()
+    x, y = G["x", "y"]
+    f = 3 * y | "f"
+    g = x * x * y | "g"
+
+    gv = GraphValuation.run(Assignment.create(G, {x: 0, y: 0}), roots=[f])
+    assert gv.assigned[y.node.ident].gradient == 3
+    gv = GraphValuation.run(Assignment.create(G, {x: 0, y: 2}), roots=[g])
+    assert gv.assigned[x.node.ident].gradient == 0
+    gv = GraphValuation.run(Assignment.create(G, {x: 1, y: 0}), roots=[g])
+    assert gv.assigned[y.node.ident].gradient == 1
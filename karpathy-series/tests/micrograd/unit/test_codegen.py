@@ -0,0 +1,105 @@
+import gc
+from pathlib import Path
+
+from pytest import MonkeyPatch, approx
+
+from karpathy_series.micrograd.assignment import Assignment
+from karpathy_series.micrograd.codegen import Generated, GeneratedValuation, _Emitter, _generated, structural_key
+from karpathy_series.micrograd.perceptron import Layer
+from karpathy_series.micrograd.tape import Tape, TapeValuation
+from karpathy_series.micrograd.value import ValueGraph
+from karpathy_series.micrograd.value_type import Prod
+
+
+def _layer(G: ValueGraph) -> Assignment:
+    inputs = tuple(G[("x0", "x1", "x2")])
+    layer = Layer("layer", G, 4, inputs)
+    _ = G.sum(*layer.outputs) ** 2 | "loss"
+    return layer.assign_from(lambda: 0.3) | Assignment.create(G, {x: k - 1 for k, x in enumerate(inputs)})
+
+
+def test_run_matches_tape_valuation() -> None:
+    G = ValueGraph()
+    x, y, z = G("x"), G("y"), G("z")
+    w = x + y | "w"
+    u = 2 * x | "u"
+    _ = G.graph.node(Prod(0.5), w.node, u.node, z.node, x.node, y.node)
+    _ = (w * u).exp() / 1000 + G.sum(*(x for _ in range(40))) | "h"
+    _ = (u * z).tanh() - x**2 | "k"
+
+    a = Assignment.create(G, {x: 0.5, y: -0.25, z: 0})
+    expected = TapeValuation.run(a)
+    result = GeneratedValuation.run(a)
+    assert result.values == approx(expected.values)
+    assert result.gradients == approx(expected.gradients)
+
+
+def test_layer_matches_tape_valuation() -> None:
+    G = ValueGraph()
+    a = _layer(G)
+    expected = TapeValuation.run(a)
+    result = GeneratedValuation.run(a)
+    assert result.values == approx(expected.values)
+    assert result.gradients == approx(expected.gradients)
+
+
+def test_shared_by_structure() -> None:
+    first, second = ValueGraph(), ValueGraph()
+    _, _ = _layer(first), _layer(second)
+    assert structural_key(Tape.compile(first.graph)) == structural_key(Tape.compile(second.graph))
+    assert GeneratedValuation.compile(first.graph) is GeneratedValuation.compile(second.graph)
+
+
+def test_cached_on_disk(tmp_path: Path) -> None:
+    G = ValueGraph()
+    x, y = G("x"), G("y")
+    _ = (x * y + 0.125).tanh()
+    tape = Tape.compile(G.graph)
+
+    generated = Generated.of(tape, tmp_path)
+    assert len(list(tmp_path.iterdir())) == 1
+    del _generated[generated.key]
+    loaded = Generated.of(tape, tmp_path)
+    assert loaded is not generated
+
+    tv = TapeValuation.of(tape, {x.node.ident: 2, y.node.ident: 3})
+    loaded.forward(tv.values)
+    loaded.backward(tv.values, tv.gradients)
+    assert tv.gradients[tape.slot(x.node.ident)] == approx(3 * (1 - tv.values[-1] ** 2))
+
+
+def test_run_through_cache(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    _generated.clear()
+    G = ValueGraph()
+    a = _layer(G)
+    expected = TapeValuation.run(a)
+    GeneratedValuation.run(a, cache=tmp_path)
+    assert len(list(tmp_path.iterdir())) == 1
+
+    # A graph of the same structure loads the code from the cache rather than generating it
+    _generated.clear()
+    monkeypatch.setattr(_Emitter, "source", lambda self: "raise AssertionError")
+    H = ValueGraph()
+    gv = GeneratedValuation.run(_layer(H), cache=tmp_path)
+    assert gv.gradients == approx(expected.gradients)
+
+
+def test_pow_without_head() -> None:
+    G = ValueGraph()
+    x, y = G("x"), G("y")
+    _ = x**0.5 * y | "f"
+
+    a = Assignment.create(G, {x: 0, y: 0})
+    assert GeneratedValuation.run(a).gradients == TapeValuation.run(a).gradients
+
+
+def test_released_with_graphs() -> None:
+    G = ValueGraph()
+    x = G("x")
+    f = (x * 0.375).exp() | "f"
+    key = GeneratedValuation.compile(G.graph).key
+    assert key in _generated
+
+    del G, x, f
+    gc.collect()
+    assert key not in _generated
@@ -0,0 +1,63 @@
+from pytest import approx
+
+from karpathy_series.micrograd.assignment import Assignment
+from karpathy_series.micrograd.calculation import GraphValuation
+from karpathy_series.micrograd.compact import CompactDag
+from karpathy_series.micrograd.perceptron import Layer
+from karpathy_series.micrograd.tape import TapeValuation
+from karpathy_series.micrograd.value import ValueGraph
+from karpathy_series.micrograd.value_type import Prod, Sum, Tanh, Variable
+
+
+def test_nodes_are_views() -> None:
+    dag = CompactDag()
+    a = dag.node(Variable(), label="a")
+    b = dag.node(Variable(), label="b")
+    c = dag.node(Prod(2), a, b, a, label="c")
+    d = dag.node(Tanh(), c)
+
+    assert c.data == Prod(2)
+    assert c.pred == (a, b, a)
+    assert c.label() == "c"
+    assert dag[c.ident] == c
+    assert d.pred[0].pred[1].label() == "b"
+    assert dag.size() == 4
+
+
+def test_roots_and_entries() -> None:
+    dag = CompactDag()
+    a = dag.node(Variable(), label="a")
+    b = dag.node(Variable(), label="b")
+    c = dag.node(Sum(), a, b, label="c")
+    _ = dag.node(Sum(), a, c, label="d")
+    _ = dag.node(Prod(), a, label="e")
+
+    assert {r.label() for r in dag.roots()} == {"d", "e"}
+    assert {r.label() for r in dag.entries()} == {"a", "b"}
+    assert dag.is_root(c) is False
+    assert [n.label() for n in dag.topological(reverse=True)] == ["e", "d", "c", "b", "a"]
+
+
+def test_hash_cons() -> None:
+    dag = CompactDag(hash_cons=True)
+    a = dag.node(Variable())
+    b = dag.node(Variable())
+    assert dag.node(Sum(), a, b) is dag.node(Sum(), a, b)
+    assert dag.size() == 3
+
+
+def test_evaluates_like_dag() -> None:
+    G, C = ValueGraph(), ValueGraph(CompactDag())
+    results = []
+    for graph in (G, C):
+        inputs = tuple(graph[("x0", "x1")])
+        layer = Layer("layer", graph, 3, inputs)
+        a = layer.assign_from(lambda: 0.4) | Assignment.create(graph, {inputs[0]: 1, inputs[1]: -2})
+        results.append((GraphValuation.run(a), TapeValuation.run(a).graph_valuation(a)))
+
+    (expected, _), (compact, compact_tape) = results
+    assert expected.assigned.keys() == compact.assigned.keys()
+    for ident, valuation in expected.assigned.items():
+        assert compact.assigned[ident] == valuation
+        assert compact_tape.assigned[ident].value == approx(valuation.value)
+        assert compact_tape.assigned[ident].gradient == approx(valuation.gradient)
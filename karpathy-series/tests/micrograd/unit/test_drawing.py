@@ -0,0 +1,71 @@
+from io import StringIO
+
+from karpathy_series.micrograd.assignment import Assignment
+from karpathy_series.micrograd.calculation import GraphValuation
+from karpathy_series.micrograd.drawing import DotWriter
+from karpathy_series.micrograd.perceptron import Layer
+from karpathy_series.micrograd.value import Value, ValueGraph
+
+
+def _network() -> tuple[ValueGraph, Layer, Value]:
+    G = ValueGraph()
+    layer = Layer("layer", G, 3, (G("x0"), G("x1")))
+    return G, layer, G.sum(*layer.outputs) | "total"
+
+
+def _lines(writer: DotWriter, G: ValueGraph, valuation: GraphValuation | None = None) -> list[str]:
+    stream = StringIO()
+    writer.write(stream, G.graph, valuation)
+    text = stream.getvalue()
+    assert text.startswith("digraph {") and text.endswith("}\n")
+    return text.splitlines()[2:-1]
+
+
+def test_draws_each_node_once() -> None:
+    G, _, _ = _network()
+    lines = _lines(DotWriter(), G)
+    assert sum(1 for line in lines if "->" not in line) == G.graph.size()
+    assert sum(1 for line in lines if "->" in line) == sum(len(n.pred) for n in G.graph.nodes())
+
+
+def test_collapses_neurons() -> None:
+    G, layer, _ = _network()
+    lines = _lines(DotWriter(collapse=2), G)
+    nodes = [line for line in lines if "->" not in line]
+    assert len(nodes) == 2 + len(layer.neurons) + 1
+    assert any('"layer.n0.* (5 nodes)"' in line for line in nodes)
+    assert "  n0 -> c1;" in lines
+
+
+def test_focus_and_limit() -> None:
+    G, layer, total = _network()
+    lines = _lines(DotWriter(focus=total.node.ident, depth=1), G)
+    nodes = [line for line in lines if "->" not in line]
+    assert len(nodes) == 1 + len(layer.neurons)
+    assert all("dashed" in line for line in nodes if "total" not in line)
+
+    limited = _lines(DotWriter(focus=total.node.ident, limit=2), G)
+    assert len([line for line in limited if "->" not in line]) == 2
+
+
+def test_limit_keeps_roots() -> None:
+    G = ValueGraph()
+    x, y = G["x", "y"]
+    _ = x.tanh() | "first"
+    z = y
+    for _ in range(10):
+        z = z * y
+    _ = z | "second"
+
+    nodes = [line for line in _lines(DotWriter(limit=3), G) if "->" not in line]
+    assert len(nodes) == 3
+    assert any('"first' in line for line in nodes) and any('"second' in line for line in nodes)
+
+
+def test_shades_by_gradient() -> None:
+    G, layer, _ = _network()
+    entries = (n for n in G.graph.entries() if n.label() in ("x0", "x1"))
+    a = layer.assign_from(lambda: 0.5) | Assignment(G.graph, {n.ident: 1 for n in entries})
+    nodes = [line for line in _lines(DotWriter(), G, GraphValuation.run(a)) if "->" not in line]
+    assert all("grad = " in line and "filled" in line for line in nodes)
+    assert any('fillcolor="0.000 1.000 1.000"' in line for line in nodes)
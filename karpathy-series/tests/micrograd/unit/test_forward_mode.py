@@ -0,0 +1,62 @@
+import numpy as np
+from pytest import approx
+
+from karpathy_series.micrograd.assignment import Assignment
+from karpathy_series.micrograd.calculation import GraphValuation
+from karpathy_series.micrograd.forward_mode import ForwardValuation
+from karpathy_series.micrograd.value import ValueGraph
+from karpathy_series.micrograd.value_type import Prod
+
+
+def test_jacobian_matches_reverse_mode() -> None:
+    G = ValueGraph()
+    x, y = G("x"), G("y")
+    w = x + y | "w"
+    u = 2 * x | "u"
+    v = w * u | "v"
+    z = (v + u).exp() / 1000 | "z"
+    h = (z * u).tanh() - x**2 + G.affine((x, w), (y, y), offset=u) | "h"
+
+    a = Assignment.create(G, {x: 0.5, y: -0.25})
+    fv = ForwardValuation.jacobian(a, (x, y))
+    gv = GraphValuation.run(a, roots=(h,))
+    assert fv.value(h) == approx(gv.assigned[h.node.ident].value)
+    assert fv.tangent(h) == approx([gv.assigned[x.node.ident].gradient, gv.assigned[y.node.ident].gradient])
+
+
+def test_directional_derivative() -> None:
+    G = ValueGraph()
+    x, y = G("x"), G("y")
+    f = x * x * y | "f"
+
+    fv = ForwardValuation.jvp(Assignment.create(G, {x: 3, y: 2}), {x: 1, y: -1})
+    # D f = (2xy, x^2) . (1, -1) = 12 - 9
+    assert fv.tangent(f) == approx([3])
+
+
+def test_many_roots_in_one_sweep() -> None:
+    G = ValueGraph()
+    x = G("x")
+    roots = [(x * k).tanh() for k in range(1, 6)]
+
+    fv = ForwardValuation.jvp(Assignment.create(G, {x: 0.1}), {x: [1, 2]})
+    for k, r in enumerate(roots, start=1):
+        assert fv.tangent(r) == approx(np.array([1, 2]) * k * (1 - np.tanh(0.1 * k) ** 2))
+
+
+def test_prod_with_zero_operand() -> None:
+    G = ValueGraph()
+    x, y, z = G("x"), G("y"), G("z")
+    p = G.graph.node(Prod(2), x.node, y.node, z.node)
+
+    fv = ForwardValuation.jacobian(Assignment.create(G, {x: 0, y: 3, z: 4}), (x, y, z))
+    assert fv.assigned[p.ident].tangent == approx([24, 0, 0])
+
+
+def test_pow_at_origin() -> None:
+    G = ValueGraph()
+    x, y = G("x"), G("y")
+    f = x**0.5 * y + x**1.5 | "f"
+
+    fv = ForwardValuation.jvp(Assignment.create(G, {x: 0, y: 1}), {x: [1, 0], y: [0, 1]})
+    assert fv.tangent(f) == approx([np.inf, 0])
@@ -1,4 +1,9 @@
+import gc
+
+from pytest import raises
+
 from karpathy_series.micrograd.graph import Dag
+from karpathy_series.micrograd.ident import Scope
 
 
 def _test_graph() -> Dag[None]:
@@ -47,3 +52,105 @@ def test_topological_reverse() -> None:
         "b",
         "a",
     ]
+
+
+def test_ancestors() -> None:
+    graph = _test_graph()
+    d = next(n for n in graph.nodes() if n.label() == "d")
+    e = next(n for n in graph.nodes() if n.label() == "e")
+    assert {graph.identities.label(n) for n in graph.ancestors([d, e])} == {"a", "b", "c", "d", "e"}
+
+
+def test_descendants() -> None:
+    graph = _test_graph()
+    b = next(n for n in graph.nodes() if n.label() == "b")
+    assert {graph.identities.label(n) for n in graph.descendants([b])} == {"b", "c", "d", "g"}
+
+
+def test_hash_cons() -> None:
+    dag: Dag[str] = Dag(hash_cons=True)
+    a = dag.node("x", label="a")
+    b = dag.node("x", label="b")
+    c = dag.node("+", a, b, label="c")
+    d = dag.node("+", a, b, label="d")
+    e = dag.node("+", b, a)
+
+    assert a is not b
+    assert c is d
+    assert c.label() == "c"
+    assert e is not c
+    assert {n.label() for n in dag.roots()} == {"c", None}
+
+
+def test_bulk_settles_roots_and_entries() -> None:
+    dag: Dag[None] = Dag()
+    a = dag.node(None, label="a")
+    with dag.bulk():
+        b = dag.node(None, label="b")
+        c = dag.node(None, a, b, label="c")
+        with dag.bulk():
+            _ = dag.node(None, a, c, label="d")
+        assert dag.is_root(a)
+        e, f = dag.extend([(None, (a,), "e"), (None, (), "f")])
+        _ = dag.node(None, b, f, c, label="g")
+    assert [r.label() for r in dag.topological()] == ["a", "b", "c", "d", "e", "f", "g"]
+    assert e.pred == (a,)
+    assert {r.label() for r in dag.entries()} == {"a", "b", "f"}
+    assert {r.label() for r in dag.roots()} == {"g", "e", "d"}
+
+
+def test_bulk_pauses_gc_on_request() -> None:
+    dag: Dag[None] = Dag()
+    with dag.bulk():
+        assert gc.isenabled()
+    with dag.bulk(pause_gc=True):
+        assert not gc.isenabled()
+        with dag.bulk():
+            _ = dag.node(None)
+        assert not gc.isenabled()
+    assert gc.isenabled()
+
+
+def test_extend_with_hash_cons() -> None:
+    dag: Dag[int] = Dag(hash_cons=True)
+    a, b = dag.extend([(0, (), "a"), (0, (), "b")])
+    c, d = dag.extend([(1, (a, b), "c"), (1, (a, b), "d")])
+    assert a is not b and c is d
+    assert c.label() == "c"
+    assert {r.ident for r in dag.roots()} == {c.ident}
+
+
+def test_rollback() -> None:
+    dag = _test_graph()
+    nodes = {n.label(): n for n in dag.nodes()}
+    checkpoint = dag.mark()
+    revision = dag.revision
+
+    h = dag.node(None, nodes["d"], nodes["e"], label="h")
+    inner = dag.mark()
+    _ = dag.node(None, label="i")
+    dag.identities.set_run(h.ident, h.ident + 1, Scope("scoped"))
+    assert {r.label() for r in dag.roots()} == {"g", "h", "i"}
+
+    dag.rollback(checkpoint)
+    assert dag.size() == 7 and dag.revision != revision
+    assert {r.label() for r in dag.roots()} == {"g", "e", "d"}
+    assert {r.label() for r in dag.entries()} == {"a", "b", "f"}
+    assert dag.identities.labels() == frozenset("abcdefg")
+    assert dag.node(None, label="j").ident == h.ident + 2
+
+    # The checkpoint taken after `h` is gone with it
+    with raises(ValueError):
+        dag.rollback(inner)
+
+
+def test_arena_with_hash_cons() -> None:
+    dag: Dag[int] = Dag(hash_cons=True)
+    a, b = dag.node(0), dag.node(0)
+    c = dag.node(1, a, b)
+    with dag.arena():
+        d = dag.node(2, a, b)
+        assert dag.node(2, a, b) is d and dag.node(1, a, b) is c
+        assert {r.ident for r in dag.roots()} == {c.ident, d.ident}
+    assert dag.node(2, a, b) is not d
+    assert dag.size() == 4
@@ -0,0 +1,66 @@
+import numpy as np
+from pytest import approx
+
+from karpathy_series.micrograd.assignment import Assignment
+from karpathy_series.micrograd.calculation import GraphValuation
+from karpathy_series.micrograd.hessian import HessianValuation, hessian, newton_direction
+from karpathy_series.micrograd.valuation import FloatArray
+from karpathy_series.micrograd.value import Value, ValueGraph
+from karpathy_series.micrograd.value_type import Prod
+
+
+def test_hessian_by_finite_differences() -> None:
+    G = ValueGraph()
+    x, y, z = G("x"), G("y"), G("z")
+    w = x.node_like(Prod(0.5), x.node, y.node, z.node)
+    f = (x * y).tanh() + (x + z).exp() / 10 + y**3 + G.affine((x, y), (z, x), offset=z) + w | "f"
+
+    point = {x: 0.3, y: -0.7, z: 0.2}
+    wrt = (x, y, z)
+    H = hessian(Assignment.create(G, point), f, wrt)
+
+    def gradient(shifted: dict[Value, float]) -> FloatArray:
+        gv = GraphValuation.run(Assignment.create(G, shifted), roots=(f,))
+        return np.array([gv.assigned[v.node.ident].gradient for v in wrt])
+
+    h = 1e-6
+    for k, v in enumerate(wrt):
+        plus = gradient(point | {v: point[v] + h})
+        minus = gradient(point | {v: point[v] - h})
+        assert H[k] == approx((plus - minus) / (2 * h), abs=1e-5)
+    assert H == approx(H.T)
+
+
+def test_gradient_matches_reverse_mode() -> None:
+    G = ValueGraph()
+    x, y = G("x"), G("y")
+    f = (x * y + x**2).exp() - y.tanh() | "f"
+    a = Assignment.create(G, {x: 0.5, y: 1.5})
+
+    hv = HessianValuation.run(a, f, {x: [1, 0], y: [0, 1]})
+    gv = GraphValuation.run(a)
+    for v in (x, y):
+        assert hv.gradient(v) == approx(gv.assigned[v.node.ident].gradient)
+    assert hv.value(f) == approx(gv.assigned[f.node.ident].value)
+
+
+def test_newton_step_solves_quadratic() -> None:
+    G = ValueGraph()
+    x, y = G("x"), G("y")
+    # Minimized at (1, -2)
+    f = 3 * (x - 1) ** 2 + (x - 1) * (y + 2) + 2 * (y + 2) ** 2 | "f"
+
+    direction = newton_direction(Assignment.create(G, {x: 4, y: 5}), f, (x, y))
+    assert direction == approx([-3, -7])
+
+
+def test_pow_at_origin() -> None:
+    G = ValueGraph()
+    x, y = G("x"), G("y")
+    f = x**1.5 + x * y | "f"
+
+    # The second derivative along x diverges at 0, while the others do not
+    hv = HessianValuation.run(Assignment.create(G, {x: 0, y: 2}), f, {x: [1, 0], y: [0, 1]})
+    assert hv.gradient(x) == approx(2)
+    assert hv.hvp(x) == approx([np.inf, 1])
+    assert hv.hvp(y) == approx([1, 0])
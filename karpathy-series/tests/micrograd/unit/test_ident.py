@@ -1,4 +1,6 @@
-from karpathy_series.micrograd.ident import IdentManager
+from karpathy_series.micrograd.ident import IdentManager, Scope
+from karpathy_series.micrograd.perceptron import Layer
+from karpathy_series.micrograd.value import ValueGraph
 
 
 def test_generate_incrementing() -> None:
@@ -20,3 +22,39 @@ def test_labeling() -> None:
     assert im.label(l3) is None
 
     assert im.labels() == frozenset({"l1", "l2"})
+
+
+def test_scoped_labels() -> None:
+    im = IdentManager()
+    layer = Scope("layer")
+    idents = [im.use() for _ in range(6)]
+    im.set_run(idents[0], idents[3], layer / "n0", "w")
+    im.set_label(idents[3], layer / "n0")
+    im.set_label(idents[4], "plain")
+
+    assert [im.label(i) for i in idents] == ["layer.n0.w0", "layer.n0.w1", "layer.n0.w2", "layer.n0", "plain", None]
+    assert im.labels() == frozenset({"layer.n0.w0", "layer.n0.w1", "layer.n0.w2", "layer.n0", "plain"})
+
+    # Labels set later take precedence, whatever their kind
+    im.set_label(idents[1], "renamed")
+    im.set_label(idents[4], layer / "bias")
+    assert im.label(idents[1]) == "renamed" and im.label(idents[4]) == "layer.bias"
+    assert len(im.label_table) == 1 and len(im.scope_table) == 2
+
+
+def test_layer_labels_are_scoped() -> None:
+    G = ValueGraph()
+    inputs = tuple(G[("x0", "x1")])
+    layer = Layer("layer", G, 3, inputs)
+    identities = G.graph.identities
+
+    neuron = layer.neurons[1]
+    assert neuron.name == "layer.n1"
+    assert [w.label() for w in neuron.weights] == ["layer.n1.w0", "layer.n1.w1"]
+    assert neuron.bias.label() == "layer.n1.bias"
+    assert neuron.output.label() == "layer.n1"
+    assert neuron.output.node.pred[0].label() == "layer.n1.linear"
+    # Only the inputs are labeled by string, and each neuron has a single run of weights
+    assert identities.label_table.keys() == {x.node.ident for x in inputs}
+    assert len(identities.runs) == 3
+    assert len(identities.labels()) == G.graph.size()
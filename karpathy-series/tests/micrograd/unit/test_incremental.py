@@ -0,0 +1,72 @@
+from pytest import approx
+
+from karpathy_series.micrograd.assignment import Assignment
+from karpathy_series.micrograd.incremental import IncrementalValuation
+from karpathy_series.micrograd.perceptron import Layer
+from karpathy_series.micrograd.tape import TapeValuation
+from karpathy_series.micrograd.value import ValueGraph
+
+
+def _assert_matches(result: TapeValuation, expected: TapeValuation) -> None:
+    assert result.values == approx(expected.values)
+    assert result.gradients == approx(expected.gradients)
+
+
+def test_update_recomputes_cone() -> None:
+    G = ValueGraph()
+    x, y, z = G["x", "y", "z"]
+    u = (x * y).tanh() | "u"
+    s = z + 1 | "s"
+    v = s.exp() | "v"
+    h = u * v | "h"
+
+    iv = IncrementalValuation.run(Assignment.create(G, {x: 0.5, y: 2, z: -1}))
+    dirty = iv.update({z.node.ident: 0.25})
+
+    tape = iv.tape
+    assert [tape.idents[s] for s in dirty] == [n.node.ident for n in (z, s, v, h)]
+    _assert_matches(iv, TapeValuation.run(Assignment.create(G, {x: 0.5, y: 2, z: 0.25})))
+
+
+def test_unchanged_values_are_skipped() -> None:
+    G = ValueGraph()
+    x, y = G["x", "y"]
+    _ = x * y | "w"
+
+    iv = IncrementalValuation.run(Assignment.create(G, {x: 1, y: 2}))
+    assert iv.update({x.node.ident: 1}) == []
+
+
+def test_reassign_layer() -> None:
+    G = ValueGraph()
+    inputs = tuple(G[("x0", "x1")])
+    layer = Layer("layer", G, 3, inputs)
+    params = layer.assign_from(lambda: 0.2)
+
+    iv = IncrementalValuation.run(params | Assignment.create(G, {inputs[0]: 1, inputs[1]: 0}))
+    for k in range(3):
+        a = params | Assignment.create(G, {inputs[0]: 1, inputs[1]: k / 3})
+        iv.reassign(a)
+        _assert_matches(iv, TapeValuation.run(a))
+
+
+def test_update_with_zero_product_operand() -> None:
+    G = ValueGraph()
+    x, y, z = G["x", "y", "z"]
+    _ = x * y * z | "w"
+
+    iv = IncrementalValuation.run(Assignment.create(G, {x: 1, y: 2, z: 3}))
+    iv.update({x.node.ident: 0})
+    _assert_matches(iv, TapeValuation.run(Assignment.create(G, {x: 0, y: 2, z: 3})))
+
+
+def test_update_affine() -> None:
+    G = ValueGraph()
+    b, w0, w1, x0, x1 = G["b", "w0", "w1", "x0", "x1"]
+    u = G.affine((w0, w1), (x0, x1), offset=b) | "u"
+    _ = G.affine((u, x0), (u, w1)).exp() | "h"
+
+    values = {b: 0.1, w0: 0.5, w1: -0.3, x0: 2, x1: 0.7}
+    iv = IncrementalValuation.run(Assignment.create(G, values))
+    iv.update({w1.node.ident: 0.4, x0.node.ident: -1})
+    _assert_matches(iv, TapeValuation.run(Assignment.create(G, values | {w1: 0.4, x0: -1})))
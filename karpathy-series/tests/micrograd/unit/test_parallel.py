@@ -0,0 +1,49 @@
+from pytest import approx, raises
+
+from karpathy_series.micrograd.assignment import Assignment
+from karpathy_series.micrograd.parallel import DataParallel
+from karpathy_series.micrograd.perceptron import Layer
+from karpathy_series.micrograd.tape import TapeValuation
+from karpathy_series.micrograd.value import ValueGraph
+
+
+def test_gradients_summed_over_samples() -> None:
+    G = ValueGraph()
+    inputs = tuple(G[("x0", "x1")])
+    layer = Layer("layer", G, 3, inputs)
+    params = layer.assign_from(lambda: 0.2)
+    samples = [params | Assignment.create(G, {inputs[0]: k / 10, inputs[1]: 1 - k / 10}) for k in range(10)]
+
+    with DataParallel(G.graph, workers=2) as runner:
+        result = runner.run(samples, wrt=layer.neurons[0].weights, shards=3)
+
+    runs = [TapeValuation.run(a) for a in samples]
+    for w in layer.neurons[0].weights:
+        expected = sum(tv.valuation(w.node.ident).gradient for tv in runs)
+        assert result.gradient(w) == approx(expected)
+    for k, tv in enumerate(runs):
+        for output in layer.outputs:
+            assert result.value(k, output) == approx(tv.valuation(output.node.ident).value)
+
+
+def test_all_variables_by_default() -> None:
+    G = ValueGraph()
+    x, y = G("x"), G("y")
+    _ = (x * y).tanh()
+
+    samples = [Assignment.create(G, {x: k, y: 0.5}) for k in range(4)]
+    with DataParallel(G.graph, workers=1) as runner:
+        result = runner.run(samples)
+        assert result.gradients.keys() == {x.node.ident, y.node.ident}
+        assert len(runner.run([]).values) == 0
+
+
+def test_graph_changed() -> None:
+    G = ValueGraph()
+    x = G("x")
+    _ = x.exp()
+
+    with DataParallel(G.graph, workers=1) as runner:
+        _ = x.tanh()
+        with raises(ValueError):
+            runner.run([Assignment.create(G, {x: 1})])
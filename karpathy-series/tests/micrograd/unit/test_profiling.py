@@ -0,0 +1,64 @@
+from karpathy_series.micrograd.assignment import Assignment
+from karpathy_series.micrograd.calculation import GraphValuation
+from karpathy_series.micrograd.perceptron import Layer
+from karpathy_series.micrograd.profiling import GraphStatistics, Profile
+from karpathy_series.micrograd.value import ValueGraph
+
+
+def test_profile_counts_operators_and_prefixes() -> None:
+    G = ValueGraph()
+    inputs = tuple(G[("x0", "x1", "x2")])
+    layer = Layer("layer", G, 4, inputs)
+    a = layer.assign_from(lambda: 0.1) | Assignment.create(G, dict.fromkeys(inputs, 1))
+
+    profile = Profile()
+    expected = GraphValuation.run(a)
+    profiled = GraphValuation.run(a, profile=profile)
+    assert profiled.assigned.keys() == expected.assigned.keys()
+    for ident, valuation in expected.assigned.items():
+        assert profiled.assigned[ident].value == valuation.value
+        assert profiled.assigned[ident].gradient == valuation.gradient
+
+    nodes = GraphStatistics.of(G.graph).operators
+    assert {name: t.count for name, t in profile.operators.items()} == nodes
+    assert sum(t.count for t in profile.prefixes.values()) == G.graph.size()
+    for k in range(4):
+        timing = profile.prefixes[f"layer.n{k}"]
+        assert timing.count > 0 and timing.forward > 0 and timing.backward > 0
+
+
+def test_profile_with_plan_and_report() -> None:
+    G = ValueGraph()
+    x, y = G["x", "y"]
+    f = (x * y).tanh() | "f"
+    g = (x + y).exp() | "g"
+    a = Assignment.create(G, {x: 0.5, y: 2})
+
+    profile = Profile(depth=1)
+    GraphValuation.run(a, roots=[f], wrt=[x], profile=profile)
+    assert "Exp" not in profile.operators
+    assert profile.operators["Tanh"].count == 1
+    assert g.label() not in profile.prefixes and "f" in profile.prefixes
+
+    report = profile.report().splitlines()
+    assert report[0].startswith("operator")
+    assert "(unlabeled)" in profile.report()
+    assert set(profile.as_dict()["operators"]) == set(profile.operators)
+
+
+def test_graph_statistics() -> None:
+    G = ValueGraph()
+    x, y = G["x", "y"]
+    w = x * y
+    f = (w + x).tanh()
+    g = w.exp()
+
+    stats = GraphStatistics.of(G.graph)
+    assert (stats.nodes, stats.roots, stats.entries) == (6, 2, 2)
+    assert stats.depth == 3 and stats.width == 2
+    assert stats.operators == {"Variable": 2, "Prod": 1, "Sum": 1, "Tanh": 1, "Exp": 1}
+    # x feeds w and the sum, w feeds the sum and exp, y feeds w, the sum feeds tanh
+    assert stats.fan_out == {0: 2, 1: 2, 2: 2}
+    assert stats.fan_in == {0: 2, 1: 2, 2: 2}
+    assert "depth    3" in stats.report()
+    assert {r.ident for r in G.graph.roots()} == {f.node.ident, g.node.ident}
@@ -0,0 +1,50 @@
+from karpathy_series.micrograd.assignment import Assignment
+from karpathy_series.micrograd.calculation import GraphValuation
+from karpathy_series.micrograd.graph import Dag
+from karpathy_series.micrograd.rewrite import eliminate_common_subexpressions, prune
+from karpathy_series.micrograd.value import ValueGraph
+from karpathy_series.micrograd.value_type import ValueType
+
+
+def test_hash_consed_value_graph() -> None:
+    G = ValueGraph(Dag[ValueType](hash_cons=True))
+    x, w = G["x", "w"]
+    u = x * w + x * w | "u"
+    v = x - w
+    _ = v / (x - w)
+
+    assert u.node.pred[0] is u.node.pred[1]
+    assert len(G.graph.node_table) == 8
+
+
+def test_eliminate_common_subexpressions() -> None:
+    G = ValueGraph()
+    x, w = G["x", "w"]
+    u = (x * w).tanh() + (x * w).tanh() | "u"
+    h = u * (x * w) | "h"
+
+    rw = eliminate_common_subexpressions(G.graph)
+    assert len(rw.graph.node_table) == 6
+    assert rw.node(u.node).label() == "u"
+    assert rw.node(u.node).pred[0] is rw.node(u.node).pred[1]
+    assert not rw.graph.hash_cons
+
+    a = Assignment.create(G, {x: 0.5, w: -2})
+    expected = GraphValuation.run(a)
+    result = GraphValuation.run(Assignment(rw.graph, rw.translate(a.assigned)))
+    assert result.assigned[rw.node(h.node).ident] == expected.assigned[h.node.ident]
+    assert result.assigned[rw.node(x.node).ident] == expected.assigned[x.node.ident]
+
+
+def test_prune_keeps_what_kept_nodes_depend_on() -> None:
+    G = ValueGraph()
+    x, y, z = G["x", "y", "z"]
+    f = x * y | "f"
+    g = (y + z).tanh() | "g"
+    _ = f + 1
+    _ = z.exp()
+
+    rw = prune(G.graph, (f.node,), lambda node: node.label() == "g")
+    assert {n.label() for n in rw.graph.nodes()} == {"x", "y", "z", "f", "g", None}
+    assert rw.graph.size() == 6
+    assert rw.node(g.node).pred[0].pred[1] is rw.node(z.node)
@@ -0,0 +1,107 @@
+from pytest import approx
+
+from karpathy_series.micrograd.assignment import Assignment
+from karpathy_series.micrograd.calculation import GraphValuation
+from karpathy_series.micrograd.perceptron import Layer
+from karpathy_series.micrograd.schedule import LevelValuation, Schedule
+from karpathy_series.micrograd.tape import OpCode, Tape
+from karpathy_series.micrograd.value import ValueGraph
+from karpathy_series.micrograd.value_type import Prod, Sum
+
+
+def test_depths() -> None:
+    G = ValueGraph()
+    x, y = G["x", "y"]
+    w = x + y | "w"
+    u = 2 * x | "u"
+    _ = w * u | "v"
+
+    assert list(Schedule.depths(Tape.compile(G.graph))) == [0, 0, 1, 1, 2]
+
+
+def test_constants() -> None:
+    G = ValueGraph()
+    x = G("x")
+    c = x.node_like(Sum(2.0))
+    f = (x * c).tanh() + c | "f"
+
+    tape = Tape.compile(G.graph)
+    assert Schedule.depths(tape)[tape.slot(c.node.ident)] == 1
+    a = Assignment.create(G, {x: 0.3})
+    expected, result = GraphValuation.run(a), LevelValuation.run(a)
+    for v in (x, c, f):
+        assert result.valuation(v.node.ident).value == approx(expected.assigned[v.node.ident].value)
+        assert result.valuation(v.node.ident).gradient == approx(expected.assigned[v.node.ident].gradient)
+
+    H = ValueGraph()
+    d = H.sum()
+    assert LevelValuation.run(Assignment.create(H, {})).valuation(d.node.ident).value == 0
+
+
+def test_layer_groups_kernels() -> None:
+    G = ValueGraph()
+    inputs = tuple(G[("x0", "x1", "x2")])
+    _ = Layer("layer", G, 4, inputs)
+
+    schedule = Schedule.compile(G.graph)
+    assert [[(k.code, len(k)) for k in level] for level in schedule.levels] == [
+        [(OpCode.AFFINE, 4)],
+        [(OpCode.TANH, 4)],
+    ]
+    assert Schedule.compile(G.graph) is schedule
+
+
+def test_run_matches_graph_valuation() -> None:
+    G = ValueGraph()
+    x, y = G["x", "y"]
+    w = x + y | "w"
+    u = 2 * x | "u"
+    v = w * u * y | "v"
+    z = (v + u).exp() / 1000 | "z"
+    _ = (z * u).tanh() - x**2 + y**0 | "h"
+
+    a = Assignment.create(G, {x: 0.5, y: -0.25})
+    expected = GraphValuation.run(a)
+    result = LevelValuation.run(a)
+
+    for ident, valuation in expected.assigned.items():
+        assert result.valuation(ident).value == approx(valuation.value)
+        assert result.valuation(ident).gradient == approx(valuation.gradient)
+
+
+def test_prod_with_zero_operand() -> None:
+    G = ValueGraph()
+    x, y, z = G["x", "y", "z"]
+    _ = G.graph.node(Prod(2), x.node, y.node, z.node)
+
+    lv = LevelValuation.run(Assignment.create(G, {x: 0, y: 3, z: 4}))
+    assert lv.valuation(x.node.ident).gradient == 24
+    assert lv.valuation(y.node.ident).gradient == 0
+
+
+def test_layer_matches_graph_valuation() -> None:
+    G = ValueGraph()
+    inputs = tuple(G[("x0", "x1", "x2")])
+    layer = Layer("layer", G, 5, inputs)
+    a = layer.assign_from(lambda: 0.3) | Assignment.create(G, {x: k - 1 for k, x in enumerate(inputs)})
+
+    expected = GraphValuation.run(a)
+    result = LevelValuation.run(a).graph_valuation(a)
+    for ident, valuation in expected.assigned.items():
+        assert result.assigned[ident].value == approx(valuation.value)
+        assert result.assigned[ident].gradient == approx(valuation.gradient)
+
+
+def test_affine_matches_graph_valuation() -> None:
+    G = ValueGraph()
+    b, w0, w1, x0, x1 = G["b", "w0", "w1", "x0", "x1"]
+    u = G.affine((w0, w1), (x0, x1), offset=b) | "u"
+    v = G.affine((w0, w1), (x1, x0), bias=1) | "v"
+    _ = G.affine((u, x0), (v, v), bias=2).tanh() | "h"
+
+    a = Assignment.create(G, {b: 0.1, w0: 0.5, w1: -0.3, x0: 2, x1: 0.7})
+    expected = GraphValuation.run(a)
+    result = LevelValuation.run(a)
+    for ident, valuation in expected.assigned.items():
+        assert result.valuation(ident).value == approx(valuation.value)
+        assert result.valuation(ident).gradient == approx(valuation.gradient)
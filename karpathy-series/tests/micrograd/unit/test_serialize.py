@@ -0,0 +1,95 @@
+import struct
+import sys
+from pathlib import Path
+
+from pytest import MonkeyPatch, approx, raises
+
+from karpathy_series.micrograd.assignment import Assignment
+from karpathy_series.micrograd.calculation import GraphValuation
+from karpathy_series.micrograd.perceptron import Layer
+from karpathy_series.micrograd.serialize import _HEADER, load, save
+from karpathy_series.micrograd.tape import Tape, TapeValuation
+from karpathy_series.micrograd.value import ValueGraph
+from karpathy_series.micrograd.value_type import Variable
+
+
+def test_round_trip(tmp_path: Path) -> None:
+    G = ValueGraph()
+    inputs = tuple(G[("x0", "x1")])
+    layer = Layer("layer", G, 3, inputs)
+    _ = G.sum(*layer.outputs) ** 2 | "loss"
+    path = tmp_path / "layer.mgrd"
+    save(path, G.graph)
+
+    with load(path) as stored:
+        assert len(stored) == G.graph.size()
+        assert not stored.has_valuation()
+        graph = stored.graph()
+        assert list(stored.idents) == list(Tape.compile(G.graph).idents)
+
+    assert graph.size() == G.graph.size()
+    for node in G.graph.nodes():
+        loaded = graph[Tape.compile(G.graph).slot(node.ident)]
+        assert loaded.data == node.data
+        assert loaded.label() == node.label()
+    assert graph.identities.labels() == G.graph.identities.labels()
+
+
+def test_loaded_graph_evaluates(tmp_path: Path) -> None:
+    G = ValueGraph()
+    x, y = G("x"), G("y")
+    _ = (x * y + x.exp()).tanh() - y**2 | "h"
+    path = tmp_path / "graph.mgrd"
+    save(path, G.graph)
+
+    with load(path) as stored:
+        graph = stored.graph()
+    assert Tape.compile(graph) is Tape.compile(graph)
+    variables = [n for n in graph.entries() if isinstance(n.data, Variable)]
+    loaded = TapeValuation.run(Assignment(graph, {variables[0].ident: 0.5, variables[1].ident: -2}))
+    expected = TapeValuation.run(Assignment.create(G, {x: 0.5, y: -2}))
+    assert loaded.values == approx(expected.values)
+    assert loaded.gradients == approx(expected.gradients)
+
+
+def test_valuation_round_trip(tmp_path: Path) -> None:
+    G = ValueGraph()
+    x, y = G("x"), G("y")
+    _ = (x + 2 * y).tanh() | "h"
+    gv = GraphValuation.run(Assignment.create(G, {x: 0.25, y: 1}))
+    path = tmp_path / "valued.mgrd"
+    save(path, G.graph, gv)
+
+    with load(path) as stored:
+        tv = stored.valuation(stored.graph())
+    for slot, ident in enumerate(Tape.compile(G.graph).idents):
+        assert tv.values[slot] == gv.assigned[ident].value
+        assert tv.gradients[slot] == gv.assigned[ident].gradient
+
+
+def test_rejects_other_files(tmp_path: Path) -> None:
+    path = tmp_path / "other.mgrd"
+    path.write_bytes(b"not a graph file, clearly, but long enough to hold a header of some sort")
+    with raises(ValueError):
+        load(path)
+
+
+def test_little_endian(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    G = ValueGraph()
+    x, y = G["x", "y"]
+    _ = (x * y + 0.5).tanh() | "f"
+    gv = GraphValuation.run(Assignment.create(G, {x: 2, y: -1}))
+    tape = Tape.compile(G.graph)
+    save(tmp_path / "native.mgrd", G.graph, gv)
+
+    data, n = (tmp_path / "native.mgrd").read_bytes(), len(tape)
+    assert list(struct.unpack_from(f"<{n}q", data, _HEADER.size)) == list(tape.idents)
+    assert list(struct.unpack_from(f"<{n}d", data, _HEADER.size + 8 * n)) == list(tape.params)
+
+    # Hosts of the other byte order swap the sections both ways
+    monkeypatch.setattr(sys, "byteorder", "big" if sys.byteorder == "little" else "little")
+    save(tmp_path / "swapped.mgrd", G.graph, gv)
+    with load(tmp_path / "swapped.mgrd") as stored:
+        assert list(stored.idents) == list(tape.idents)
+        assert list(stored.values) == [gv.assigned[n].value for n in tape.idents]
+        assert list(stored.gradients) == [gv.assigned[n].gradient for n in tape.idents]
@@ -0,0 +1,93 @@
+from pytest import approx
+
+from karpathy_series.micrograd.assignment import Assignment
+from karpathy_series.micrograd.calculation import GraphValuation
+from karpathy_series.micrograd.perceptron import Neuron
+from karpathy_series.micrograd.simplify import simplify
+from karpathy_series.micrograd.value import Value, ValueGraph
+from karpathy_series.micrograd.value_type import Pow, Prod, Sum, Tanh, Variable
+
+
+def _evaluate(graph: ValueGraph, root: Value, assign: dict[Value, float]) -> float:
+    a = Assignment.create(graph, assign)
+    return GraphValuation.run(a).assigned[root.node.ident].value
+
+
+def test_flatten_sums() -> None:
+    G = ValueGraph()
+    x, y, z = G["x", "y", "z"]
+    s = G.sum(G.sum(x, y) + 1, z) + 2 | "s"
+
+    rw = simplify(G.graph)
+    node = rw.node(s.node)
+    assert node.data == Sum(3)
+    assert [p.label() for p in node.pred] == ["x", "y", "z"]
+    assert node.label() == "s"
+    assert len(rw.graph.node_table) == 4
+
+
+def test_fold_constants_and_identities() -> None:
+    G = ValueGraph()
+    x, y = G["x", "y"]
+    u = ((x * 2) * 3) ** 1 | "u"
+    v = (y + 0) * 1 - 0 | "v"
+    w = G.sum() + 2
+    h = u * w * v | "h"
+
+    rw = simplify(G.graph)
+    node = rw.node(h.node)
+    assert node.data == Prod(12)
+    assert [p.label() for p in node.pred] == ["x", "y"]
+    assert rw.node(v.node) == rw.node(y.node)
+    assert len(rw.graph.node_table) == 3
+
+
+def test_cancel_powers() -> None:
+    G = ValueGraph()
+    x, y = G["x", "y"]
+    u = (x * y) / x | "u"
+    v = x * x * x / x | "v"
+    _ = u + v | "h"
+
+    rw = simplify(G.graph)
+    assert rw.node(u.node) == rw.node(y.node)
+    assert rw.node(v.node).data == Pow(2)
+    assert rw.node(v.node).pred == (rw.node(x.node),)
+
+
+def test_shared_subexpressions_are_not_flattened() -> None:
+    G = ValueGraph()
+    x, y, z = G["x", "y", "z"]
+    s = x + y | "s"
+    _ = (s + z) * s | "h"
+
+    rw = simplify(G.graph)
+    assert rw.node(s.node).label() == "s"
+    assert len(rw.graph.node_table) == len(G.graph.node_table)
+
+
+def test_preserves_values() -> None:
+    G = ValueGraph()
+    x, y = G["x", "y"]
+    h = ((x - y) / (x * 2 + 0) + (y**1 * 3 - 1).exp()).tanh() | "h"
+
+    rw = simplify(G.graph)
+    assert len(rw.graph.node_table) < len(G.graph.node_table)
+    assert rw.node(h.node).data == Tanh()
+
+    a = Assignment.create(G, {x: 0.7, y: -0.2})
+    expected = GraphValuation.run(a)
+    result = GraphValuation.run(Assignment(rw.graph, rw.translate(a.assigned)))
+    assert result.assigned[rw.node(h.node).ident].value == approx(expected.assigned[h.node.ident].value)
+    assert result.assigned[rw.node(x.node).ident].gradient == approx(expected.assigned[x.node.ident].gradient)
+
+
+def test_neuron_keeps_variables() -> None:
+    G = ValueGraph()
+    x = G("x")
+    neuron = Neuron("n", G, (x,))
+    _ = G("unused")
+
+    rw = simplify(G.graph)
+    assert sum(1 for n in rw.graph.nodes() if n.data == Variable()) == 4
+    assert rw.node(neuron.output.node).label() == "n"
@@ -0,0 +1,67 @@
+from pytest import approx
+
+from karpathy_series.micrograd.assignment import Assignment
+from karpathy_series.micrograd.calculation import GraphValuation
+from karpathy_series.micrograd.perceptron import Layer
+from karpathy_series.micrograd.store import ParameterStore
+from karpathy_series.micrograd.tape import TapeValuation
+from karpathy_series.micrograd.value import ValueGraph
+
+
+def test_assignment_reads_store_in_place() -> None:
+    G = ValueGraph()
+    x, y = G("x"), G("y")
+    _ = x * y
+
+    store = ParameterStore.create(G)
+    assert frozenset(store) == {x.node.ident, y.node.ident}
+    a = store.assignment()
+    assert a.is_complete()
+
+    store[x.node.ident] = 3
+    store += 1
+    assert a.assigned[x.node.ident] == 4
+    assert a.assigned[y.node.ident] == 1
+
+
+def test_gradients_in_slot_order() -> None:
+    G = ValueGraph()
+    x, y, z = G("x"), G("y"), G("z")
+    _ = x * y + z
+
+    store = ParameterStore.create(G, (y, x))
+    store.initialize(iter((2.0, 5.0)).__next__)
+    a = store.assignment(Assignment.create(G, {z: 1}))
+    assert list(store.gradients(GraphValuation.run(a))) == [5, 2]
+    assert list(store.gradients(TapeValuation.run(a))) == [5, 2]
+
+
+def test_gradient_descent() -> None:
+    G = ValueGraph()
+    inputs = tuple(G[("x0", "x1")])
+    layer = Layer("layer", G, 2, inputs)
+    target = G("target")
+    loss = (layer.outputs[0] - target) ** 2 + layer.outputs[1] ** 2
+
+    store = ParameterStore.create(G, layer.parameters())
+    store.initialize(lambda: 0.3)
+    sample = store.assignment(Assignment.create(G, {inputs[0]: 1, inputs[1]: -0.5, target: 0.5}))
+
+    losses = []
+    for _ in range(20):
+        tv = TapeValuation.run(sample)
+        losses.append(tv.valuation(loss.node.ident).value)
+        store -= 0.1 * store.gradients(tv)
+    assert losses[-1] < losses[0] / 10
+
+
+def test_merge_matches_chained_or() -> None:
+    G = ValueGraph()
+    layer = Layer("layer", G, 3, tuple(G[("x0", "x1")]))
+    merged = layer.assign_from(lambda: 0.5)
+    chained = layer.neurons[0].assign_from(lambda: 0.5)
+    for neuron in layer.neurons[1:]:
+        chained = chained | neuron.assign_from(lambda: 0.5)
+    assert merged.assigned == chained.assigned
+    assert frozenset(merged.assigned) == {p.node.ident for p in layer.parameters()}
+    assert merged.assigned[layer.parameters()[0].node.ident] == approx(0.5)
@@ -0,0 +1,79 @@
+from pytest import approx
+
+from karpathy_series.micrograd.assignment import Assignment
+from karpathy_series.micrograd.calculation import GraphValuation
+from karpathy_series.micrograd.perceptron import Layer
+from karpathy_series.micrograd.rewrite import eliminate_common_subexpressions
+from karpathy_series.micrograd.simplify import simplify
+from karpathy_series.micrograd.symbolic import grad
+from karpathy_series.micrograd.tape import TapeValuation
+from karpathy_series.micrograd.value import ValueGraph
+from karpathy_series.micrograd.value_type import Prod
+
+
+def test_grad_matches_backward() -> None:
+    G = ValueGraph()
+    x, y, z = G("x") | "x", G("y") | "y", G("z")
+    w = x + y | "w"
+    u = 2 * x | "u"
+    v = w * u | "v"
+    p = x.node_like(Prod(0.5), x.node, y.node, x.node)
+    f = (v + u).exp() / 1000 + (u * y).tanh() - x**2 + G.affine((x, w), (y, y), offset=u) + p | "f"
+
+    a = Assignment.create(G, {x: 0.5, y: -0.25, z: 3})
+    expected = GraphValuation.run(a)
+    dx, dy, dz = grad(f, (x, y, z))
+    assert dx.label() == "df/dx"
+
+    values = TapeValuation.run(a)
+    assert values.valuation(dx.node.ident).value == approx(expected.assigned[x.node.ident].gradient)
+    assert values.valuation(dy.node.ident).value == approx(expected.assigned[y.node.ident].gradient)
+    assert values.valuation(dz.node.ident).value == 0
+
+
+def test_grad_of_layer_through_rewrites() -> None:
+    G = ValueGraph()
+    inputs = (G("x0"), G("x1"))
+    layer = Layer("layer", G, 3, inputs)
+    loss = G.sum(*layer.outputs) ** 2 | "loss"
+    params = layer.parameters()
+    gradients = grad(loss, params)
+
+    a = layer.assign_from(lambda: 0.3) | Assignment.create(G, {inputs[0]: 1, inputs[1]: -1})
+    expected = GraphValuation.run(a, roots=(loss,))
+    cse = eliminate_common_subexpressions(G.graph)
+    rewrite = cse.compose(simplify(cse.graph, roots=(cse.node(g.node) for g in gradients)))
+
+    result = TapeValuation.run(Assignment(rewrite.graph, rewrite.translate(a.assigned)))
+    for v, g in zip(params, gradients):
+        assert result.valuation(rewrite.node(g.node).ident).value == approx(expected.assigned[v.node.ident].gradient)
+
+
+def test_grad_keeps_roots() -> None:
+    G = ValueGraph()
+    x = G("x") | "x"
+    f = x.tanh() | "f"
+    a = Assignment.create(G, {x: 0.7})
+    before = GraphValuation.run(a).assigned[x.node.ident].gradient
+
+    (dx,) = grad(f, (x,))
+    assert [r.label() for r in G.graph.roots()] == ["f"]
+    assert GraphValuation.run(a).assigned[x.node.ident].gradient == approx(before)
+    assert TapeValuation.run(a).valuation(x.node.ident).gradient == approx(before)
+    assert GraphValuation.run(a, roots=(dx,)).assigned[dx.node.ident].value == approx(before)
+
+
+def test_second_derivative() -> None:
+    G = ValueGraph()
+    x = G("x")
+    f = (x * x * x).tanh()
+    (dx,) = grad(f, (x,))
+    (ddx,) = grad(dx, (x,))
+
+    a = Assignment.create(G, {x: 0.7})
+    values = TapeValuation.run(a)
+    h = 1e-5
+    plus = GraphValuation.run(Assignment.create(G, {x: 0.7 + h}), roots=(dx,))
+    minus = GraphValuation.run(Assignment.create(G, {x: 0.7 - h}), roots=(dx,))
+    numeric = (plus.assigned[dx.node.ident].value - minus.assigned[dx.node.ident].value) / (2 * h)
+    assert values.valuation(ddx.node.ident).value == approx(numeric, rel=1e-5)
@@ -0,0 +1,112 @@
+from pytest import approx
+
+from karpathy_series.micrograd.assignment import Assignment
+from karpathy_series.micrograd.calculation import GraphValuation
+from karpathy_series.micrograd.perceptron import Layer
+from karpathy_series.micrograd.tape import OpCode, Tape, TapeValuation, decode, encode
+from karpathy_series.micrograd.value import ValueGraph
+from karpathy_series.micrograd.value_type import Affine, Exp, Pow, Prod, Sum, Tanh, Variable
+
+
+def test_encode_decode() -> None:
+    for value_type in (Variable(), Sum(), Sum(2.5), Prod(3), Pow(-1), Tanh(), Exp(), Affine(0.5)):
+        assert decode(*encode(value_type)) == value_type
+
+
+def test_lower() -> None:
+    G = ValueGraph()
+    x, y = G["x", "y"]
+    w = x + y | "w"
+    _ = w * x | "v"
+
+    tape = Tape.compile(G.graph)
+    assert list(tape.codes) == [OpCode.VARIABLE, OpCode.VARIABLE, OpCode.SUM, OpCode.PROD]
+    assert list(tape.offsets) == [0, 0, 0, 2, 4]
+    assert list(tape.operands) == [0, 1, 2, 0]
+    assert list(tape.roots) == [3]
+
+
+def test_compile_cached() -> None:
+    G = ValueGraph()
+    x, y = G["x", "y"]
+    w = x * y | "w"
+
+    tape = Tape.compile(G.graph)
+    assert Tape.compile(G.graph) is tape
+
+    _ = w.tanh()
+    grown = Tape.compile(G.graph)
+    assert grown is not tape
+    assert len(grown) == len(tape) + 1
+
+
+def test_compiled_within_bulk() -> None:
+    G = ValueGraph()
+    y = G("y")
+    with G.bulk():
+        f = y.tanh() | "f"
+        within = Tape.compile(G.graph)
+
+    # The roots are only worked out once the bulk is done, which the tape follows
+    assert Tape.compile(G.graph) is not within
+    assert list(Tape.compile(G.graph).roots) == [1]
+    tv = TapeValuation.run(Assignment.create(G, {y: 0.5}))
+    assert tv.valuation(y.node.ident).gradient == approx(1 - tv.valuation(f.node.ident).value ** 2)
+
+
+def test_run_matches_graph_valuation() -> None:
+    G = ValueGraph()
+    x, y = G["x", "y"]
+    w = x + y | "w"
+    u = 2 * x | "u"
+    v = w * u | "v"
+    z = (v + u).exp() / 1000 | "z"
+    _ = (z * u).tanh() - x**2 | "h"
+
+    a = Assignment.create(G, {x: 0.5, y: -0.25})
+    expected = GraphValuation.run(a)
+    result = TapeValuation.run(a)
+
+    for ident, valuation in expected.assigned.items():
+        assert result.valuation(ident).value == approx(valuation.value)
+        assert result.valuation(ident).gradient == approx(valuation.gradient)
+
+
+def test_prod_with_zero_operand() -> None:
+    G = ValueGraph()
+    x, y, z = G["x", "y", "z"]
+    _ = G.graph.node(Prod(2), x.node, y.node, z.node)
+
+    tv = TapeValuation.run(Assignment.create(G, {x: 0, y: 3, z: 4}))
+    assert tv.valuation(x.node.ident).gradient == 24
+    assert tv.valuation(y.node.ident).gradient == 0
+
+
+def test_layer_reuses_tape() -> None:
+    G = ValueGraph()
+    inputs = tuple(G[("x0", "x1", "x2")])
+    layer = Layer("layer", G, 4, inputs)
+    params = layer.assign_from(lambda: 0.1)
+
+    for k in range(3):
+        a = params | Assignment.create(G, {x: k + j for j, x in enumerate(inputs)})
+        expected = GraphValuation.run(a)
+        result = TapeValuation.run(a).graph_valuation(a)
+        assert result.assigned.keys() == expected.assigned.keys()
+        for ident, valuation in expected.assigned.items():
+            assert result.assigned[ident].value == approx(valuation.value)
+            assert result.assigned[ident].gradient == approx(valuation.gradient)
+
+
+def test_affine_matches_graph_valuation() -> None:
+    G = ValueGraph()
+    b, w0, w1, x0, x1 = G["b", "w0", "w1", "x0", "x1"]
+    u = G.affine((w0, w1), (x0, x1), offset=b) | "u"
+    _ = G.affine((u, x0), (u, w1), bias=2).tanh() | "h"
+
+    a = Assignment.create(G, {b: 0.1, w0: 0.5, w1: -0.3, x0: 2, x1: 0.7})
+    expected = GraphValuation.run(a)
+    result = TapeValuation.run(a)
+    for ident, valuation in expected.assigned.items():
+        assert result.valuation(ident).value == approx(valuation.value)
+        assert result.valuation(ident).gradient == approx(valuation.gradient)
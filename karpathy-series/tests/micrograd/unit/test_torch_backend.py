@@ -0,0 +1,75 @@
+from pytest import approx
+
+from karpathy_series.micrograd.assignment import Assignment
+from karpathy_series.micrograd.calculation import GraphValuation
+from karpathy_series.micrograd.perceptron import Layer
+from karpathy_series.micrograd.torch_backend import TorchProgram, TorchValuation, cross_check
+from karpathy_series.micrograd.value import ValueGraph
+
+
+def test_matches_graph_valuation() -> None:
+    G = ValueGraph()
+    x, y, z = G["x", "y", "z"]
+    w = (x * y * z + x**2).tanh() * (y - 3).exp() | "w"
+    v = G.affine([x, y], [z, w], offset=x, bias=0.5) ** 0 + x**3 / (y + 2) | "v"
+    _ = G.sum(v, w, 3 * z) | "u"
+
+    for values in ({x: 0.5, y: 2, z: -1}, {x: 0.5, y: 0, z: 0}):
+        a = Assignment.create(G, values)
+        expected, actual = GraphValuation.run(a), TorchValuation.run(a)
+        assert actual.assigned.keys() == expected.assigned.keys()
+        for ident, valuation in expected.assigned.items():
+            assert actual.assigned[ident].value == approx(valuation.value)
+            assert actual.assigned[ident].gradient == approx(valuation.gradient)
+
+
+def test_layers_by_level() -> None:
+    G = ValueGraph()
+    inputs = tuple(G[("x0", "x1", "x2")])
+    first = Layer("first", G, 4, inputs)
+    second = Layer("second", G, 2, first.outputs)
+    total = G.sum(*second.outputs, *inputs) | "total"
+
+    # Affine, tanh, then the same again, then the sum over two levels
+    program = TorchProgram.compile(G.graph)
+    assert [[(g.code, g.arity) for g in level] for level in program.levels] == [
+        [(6, 7)],
+        [(4, 1)],
+        [(6, 9)],
+        [(4, 1)],
+        [(1, 5)],
+    ]
+    assert len(program.levels[-1][0].sources) == 2
+
+    a = first.assign_from(lambda: 0.3) | second.assign_from(lambda: -0.2)
+    a = a | Assignment.create(G, {x: k - 1 for k, x in enumerate(inputs)})
+    assert cross_check(a) == {}
+    assert TorchValuation.run(a).assigned[total.node.ident].gradient == 1
+
+
+def test_restricted_roots() -> None:
+    G = ValueGraph()
+    x, y = G["x", "y"]
+    f = (x * y).tanh() | "f"
+    g = (x + y).exp() | "g"
+    a = Assignment.create(G, {x: 0.5, y: 2})
+
+    expected = GraphValuation.run(a, roots=[f], wrt=[x])
+    actual = TorchValuation.run(a, roots=[f], wrt=[x])
+    assert actual.assigned[x.node.ident].gradient == approx(expected.assigned[x.node.ident].gradient)
+    assert actual.assigned[f.node.ident].value == approx(expected.assigned[f.node.ident].value)
+    # Every node is still evaluated, only f being differentiated
+    assert actual.assigned[g.node.ident].gradient == 0
+
+
+def test_program_follows_graph_changes() -> None:
+    G = ValueGraph()
+    x = G("x")
+    f = x.tanh() | "f"
+    program = TorchProgram.compile(G.graph)
+    assert TorchProgram.compile(G.graph) is program
+
+    g = f * x | "g"
+    assert TorchProgram.compile(G.graph) is not program
+    tv = TorchValuation.run(Assignment.create(G, {x: 0.5}))
+    assert tv.assigned[g.node.ident].value == approx(0.5 * 0.46211715726000974)
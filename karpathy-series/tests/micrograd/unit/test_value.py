@@ -1,5 +1,9 @@
+from karpathy_series.micrograd.assignment import Assignment
+from karpathy_series.micrograd.calculation import GraphValuation
+from karpathy_series.micrograd.perceptron import Layer
+from karpathy_series.micrograd.store import ParameterStore
 from karpathy_series.micrograd.value import ValueGraph
-from karpathy_series.micrograd.value_type import Prod, Sum, Variable
+from karpathy_series.micrograd.value_type import Affine, Prod, Sum, Variable
 
 
 def test_construct_inputs() -> None:
@@ -38,3 +42,40 @@ def test_construct_binop_with_const() -> None:
 
     assert v.value_type == Prod(5)
     assert v.label() == "v"
+
+
+def test_construct_affine() -> None:
+    graph = ValueGraph()
+    w0, w1, x0, x1, b = graph["w0", "w1", "x0", "x1", "b"]
+    u = graph.affine((w0, w1), (x0, x1)) | "u"
+    v = graph.affine((w0, w1), (x0, x1), offset=b, bias=2) | "v"
+
+    assert u.value_type == Affine()
+    assert u.node.pred == (w0.node, x0.node, w1.node, x1.node)
+    assert v.value_type == Affine(2)
+    assert v.node.pred == (b.node, w0.node, x0.node, w1.node, x1.node)
+
+
+def test_arena_per_sample_loss() -> None:
+    G = ValueGraph()
+    inputs = tuple(G[("x0", "x1")])
+    layer = Layer("layer", G, 2, inputs)
+    store = ParameterStore.create(G, layer.parameters())
+    store.initialize(lambda: 0.3)
+    size, labels = G.graph.size(), G.graph.identities.labels()
+
+    samples = [((1, -0.5), 0.5), ((0.2, 0.4), -0.3), ((-1, 1), 0.1)]
+    losses: list[float] = []
+    for _ in range(10):
+        total = 0.0
+        for (x0, x1), y in samples:
+            with G.arena():
+                loss = (layer.outputs[0] - y) ** 2 + layer.outputs[1] ** 2 | "loss"
+                gv = GraphValuation.run(store.assignment(Assignment.create(G, {inputs[0]: x0, inputs[1]: x1})), [loss])
+                total += gv.assigned[loss.node.ident].value
+                store -= 0.1 * store.gradients(gv)
+            assert G.graph.size() == size
+        losses.append(total)
+    assert G.graph.identities.labels() == labels
+    assert {r.ident for r in G.graph.roots()} == {o.node.ident for o in layer.outputs}
+    assert losses[-1] < losses[0] / 2